@@ -14,6 +14,8 @@
 const ChakraAssessment = require('../models/chakraAssessment')
 const Appointment = require('../models/appointment')
 const axios = require('axios')
+// Conditional GET (ETag / 304) for rarely-changing ML responses
+const { getWithETag } = require('../services/mlApiCache')
 
 // =================== ML API Configuration ========================
 // Use environment variable for ML API URL to support both development and production
@@ -21,6 +23,15 @@ const axios = require('axios')
 // Production: https://gracefulliving-ml-api.onrender.com (or our Render URL)
 const ML_API_URL = process.env.ML_API_URL || 'http://localhost:5001'
 
+// How long we wait for scoring calls
+const ML_SCORING_TIMEOUT = 30000;
+
+// Tell the ML API when we stop waiting (unix ms). It answers 429/503 right
+// away instead of scoring something we would throw away (admission_control.py)
+function deadlineHeader(timeoutMs) {
+    return { 'X-Request-Deadline': String(Date.now() + timeoutMs) };
+}
+
 // =================== Transform assessment data for ML API =================================
 // Ensures data structure matches what predict_new.py expects
 function transformAssessmentForML(assessment) {
@@ -40,6 +51,85 @@ function transformAssessmentForML(assessment) {
     };
 }
 
+// ========================== Score recent assessments on the ML API =================================
+// GET /predict/recent: the ML API queries MongoDB, scores everything in one batch
+// and returns { count, avg_conversion_probability, high_probability_count, top_leads }
+// How many leads the admin portal shows as cards
+const TOP_LEADS = 9;
+
+async function scoreRecentAssessments(daysBack, limit) {
+    try {
+        const response = await axios.get(`${ML_API_URL}/predict/recent`, {
+            params: { days: daysBack, limit, top_k: TOP_LEADS },
+            headers: { 'Accept-Encoding': 'gzip', ...deadlineHeader(ML_SCORING_TIMEOUT) },
+            timeout: ML_SCORING_TIMEOUT
+        });
+
+        if (!response.data.success) {
+            throw new Error(`ML API processing failed: ${response.data.error || 'Unknown error'}`);
+        }
+
+        return {
+            count: response.data.count,
+            avgConversionProbability: response.data.avg_conversion_probability,
+            highProbabilityCount: response.data.high_probability_count,
+            topLeads: response.data.top_leads
+        };
+    } catch (error) {
+        // Older ML API deploy without /predict/recent - send the assessments ourselves
+        if (error.response && error.response.status === 404) {
+            return scoreRecentViaBatch(daysBack, limit);
+        }
+        throw error;
+    }
+}
+
+// Fallback: query recent assessments here and POST them to /predict/batch
+async function scoreRecentViaBatch(daysBack, limit) {
+    const cutoffDate = new Date();
+    cutoffDate.setDate(cutoffDate.getDate() - daysBack);
+
+    const recentAssessments = await ChakraAssessment.find({
+        createdAt: {$gte: cutoffDate}
+    }).limit(limit).lean();
+
+    if (recentAssessments.length === 0) {
+        return { count: 0, avgConversionProbability: 0, highProbabilityCount: 0, topLeads: [] };
+    }
+
+    const response = await axios.post(
+        `${ML_API_URL}/predict/batch`,
+        recentAssessments.map(assessment => transformAssessmentForML(assessment)),
+        {
+            timeout: ML_SCORING_TIMEOUT,  // 30 seconds
+            maxContentLength: Infinity,
+            maxBodyLength: Infinity,
+            headers: {
+                'Content-Type': 'application/json',
+                'Accept': 'application/json',
+                'Accept-Encoding': 'gzip',
+                ...deadlineHeader(ML_SCORING_TIMEOUT)
+            }
+        }
+    );
+
+    if (!response.data.success || !Array.isArray(response.data.predictions)) {
+        throw new Error(`ML API processing failed: ${response.data.error || 'Unknown error'}`);
+    }
+
+    const predictions = response.data.predictions;
+    return {
+        count: predictions.length,
+        avgConversionProbability: predictions.length > 0
+            ? predictions.reduce((sum, p) => sum + p.conversion_probability, 0) / predictions.length
+            : 0,
+        highProbabilityCount: predictions.filter(p => p.conversion_probability >= 0.7).length,
+        topLeads: [...predictions]
+            .sort((a, b) => b.conversion_probability - a.conversion_probability)
+            .slice(0, TOP_LEADS)
+    };
+}
+
 // ========================== Get comprehensive ML conversion stats =================================
 // This function gets ML predictions AND calculates comprehensive conversion statistics
 async function getMLConversionStats(options = {}) {
@@ -55,237 +145,83 @@ async function getMLConversionStats(options = {}) {
         // // Step 1: Check ML API health
         // log('🔍 Step 1: Checking ML API health...');
         // log(`   Connecting to: ${ML_API_URL}`);
-        const healthCheck = await axios.get(`${ML_API_URL}/health`, {timeout: 2000});
-        // log('✅ ML API Response:', healthCheck.data);
-        
-        if(healthCheck.data.status !== 'ok'){
-            throw new Error('ML model not ready');
-        }
-
-        // Step 2: Get model information
-        // log('🔍 Step 2: Getting model info...');
-        const modelInfo = await axios.get(`${ML_API_URL}/model/info`, {timeout: 2000});
+        // No /health call first: a down ML API fails the scoring call below
+        // just the same (the service checks itself on /readyz)
+
+        // Step 2 + 3: model info and scoring in parallel
+        // Model info only changes with a new model version - ETag / 304
+        // It's only used for a label, so a failure there doesn't fail the stats
+        // The ML API reads the assessments from MongoDB itself and only sends back the
+        // summary + best leads (no more query -> serialize -> POST batch here)
+        // A scoring failure (ML API down, 429/503 from admission control, ...)
+        // keeps the basic stats below instead of failing the whole panel
+        let scoringError = null;
+        const [modelInfoData, recent] = await Promise.all([
+            getWithETag(`${ML_API_URL}/model/info`, {timeout: 2000}).catch(() => ({})),
+            scoreRecentAssessments(daysBack, limit).catch((predictionError) => {
+                // log('❌ Error calling ML prediction API:', predictionError.message);
+                scoringError = predictionError;
+                return null;
+            })
+        ]);
+        const modelInfo = { data: modelInfoData };
         // log('✅ Model Info:', {
         //     type: modelInfo.data.model_type,
         //     features: modelInfo.data.num_features,
         //     training_samples: modelInfo.data.training_samples
         // });
 
-        // Step 3: Get recent assessments to predict
-        // log(`🔍 Step 3: Querying assessments from last ${daysBack} days...`);
-        const cutoffDate = new Date();
-        cutoffDate.setDate(cutoffDate.getDate() - daysBack);
-        // log(`   Looking for assessments since: ${cutoffDate.toISOString()}`);
-
-        const recentAssessments = await ChakraAssessment.find({
-            createdAt: {$gte: cutoffDate}
-        }).limit(limit).lean();
-        
-        // log(`✅ Found ${recentAssessments.length} recent assessments`);
-        
-        // if (recentAssessments.length > 0 && verbose) {
-        //     log('   Sample assessment structure:', {
-        //         hasEmail: !!recentAssessments[0].email,
-        //         hasAgeBracket: !!recentAssessments[0].ageBracket,
-        //         hasScoredChakras: !!recentAssessments[0].scoredChakras,
-        //         hasScoredLifeQuadrants: !!recentAssessments[0].scoredLifeQuadrants,
-        //         hasFocusChakra: !!recentAssessments[0].focusChakra,
-        //         hasArchetype: !!recentAssessments[0].archetype
-        //     });
-        // }
+        // log(`✅ Scored ${recent.count} recent assessments`);
 
         // // Step 4: Get basic stats from database
         // log('📊 Step 4: Fetching basic conversion stats from database...');
         const basicStats = await getBasicConversionStats();
         
-        // Step 5: Get ML predictions if we have recent assessments
+        // Step 5: Combine ML predictions with database stats
         let mlPredictions = null;
         let highProbabilityLeads = 0;
         let conversionStats = null;
         
-        if (recentAssessments.length > 0) {
-            // log(`🤖 Step 5: Sending ${recentAssessments.length} assessments to ML API...`);
-            
-            // // Log first assessment to debug data structure
-            // if (verbose && recentAssessments[0]) {
-            //     log('   First assessment sample:', {
-            //         email: recentAssessments[0].email,
-            //         ageBracket: recentAssessments[0].ageBracket,
-            //         healthcareWorker: recentAssessments[0].healthcareWorker,
-            //         hasResults: !!recentAssessments[0].results,
-            //         hasScoredChakras: !!recentAssessments[0].scoredChakras,
-            //         hasScoredLifeQuadrants: !!recentAssessments[0].scoredLifeQuadrants
-            //     });
-            // }
-            
-            try {
-                // Transform assessments to match ML API expected format
-                // log(`   🔄 Transforming ${recentAssessments.length} assessments for ML API...`);
-                
-                let transformedAssessments;
-                try {
-                    transformedAssessments = recentAssessments.map(assessment => transformAssessmentForML(assessment));
-                    // log(`   ✅ Successfully transformed ${transformedAssessments.length} assessments`);
-                    
-                    // Log first transformed assessment structure
-                    // if (verbose && transformedAssessments[0]) {
-                    //     log('   📋 Transformed assessment sample:', {
-                    //         email: transformedAssessments[0].email ? '✓' : '✗',
-                    //         ageBracket: transformedAssessments[0].ageBracket ? '✓' : '✗',
-                    //         healthcareWorker: transformedAssessments[0].healthcareWorker ? '✓' : '✗',
-                    //         challenges: `${transformedAssessments[0].challenges.length} items`,
-                    //         familiarWith: `${transformedAssessments[0].familiarWith.length} items`,
-                    //         focusChakra: transformedAssessments[0].focusChakra,
-                    //         archetype: transformedAssessments[0].archetype
-                    //     });
-                    // }
-                    
-                    // Check payload size
-                    const payloadSize = JSON.stringify(transformedAssessments).length;
-                    // log(`   📦 Payload size: ${(payloadSize / 1024).toFixed(2)} KB`);
-                    
-                    if (payloadSize > 10 * 1024 * 1024) { // 10MB
-                        // log(`   ⚠️  Payload too large, reducing batch size...`);
-                        transformedAssessments = transformedAssessments.slice(0, 20);
-                        // log(`   📦 Reduced to ${transformedAssessments.length} assessments`);
-                    }
-                } catch (transformError) {
-                    // log(`   ❌ Transformation error: ${transformError.message}`);
-                    throw new Error(`Cannot transform assessment data: ${transformError.message}`);
-                }
-                
-                // Test with single assessment first
-                // log(`   🧪 Testing with single assessment first...`);
-                try {
-                    await axios.post(
-                        `${ML_API_URL}/predict`,
-                        transformedAssessments[0],
-                        {
-                            timeout: 10000,
-                            headers: {
-                                'Content-Type': 'application/json',
-                                'Accept': 'application/json'
-                            }
-                        }
-                    );
-                    // log(`   ✅ Single assessment test passed!`);
-                } catch (singleTestError) {
-                    // log(`   ❌ Single assessment test failed: ${singleTestError.message}`);
-                    if (singleTestError.response) {
-                        // log(`      Status: ${singleTestError.response.status}`);
-                        // log(`      Error: ${JSON.stringify(singleTestError.response.data)}`);
-                    }
-                    throw new Error(`ML API cannot process assessment format: ${singleTestError.message}`);
-                }
-                
-                // Now send batch
-                // log(`   🌐 Sending batch of ${transformedAssessments.length} assessments to ML API...`);
-                
-                const predictionsResponse = await axios.post(
-                    `${ML_API_URL}/predict/batch`,
-                    transformedAssessments,
-                    {
-                        timeout: 30000,  // 30 seconds
-                        maxContentLength: Infinity,
-                        maxBodyLength: Infinity,
-                        headers: {
-                            'Content-Type': 'application/json',
-                            'Accept': 'application/json'
-                        }
-                    }
-                );
-
-                // log(`   📥 Received response from ML API`);
-                // log(`   🔍 Response structure:`, {
-                //     success: predictionsResponse.data.success,
-                //     hasPredictions: !!predictionsResponse.data.predictions,
-                //     hasPrediction: !!predictionsResponse.data.prediction,
-                //     keys: Object.keys(predictionsResponse.data)
-                // });
-                
-                if (predictionsResponse.data.success){
-                    // Handle both 'predictions' (batch) and 'prediction' (single)
-                    mlPredictions = predictionsResponse.data.predictions || predictionsResponse.data.prediction;
-                    
-                    if (!mlPredictions) {
-                        // log(`   ⚠️  Warning: Response has success=true but no predictions data`);
-                        // log(`   Full response:`, JSON.stringify(predictionsResponse.data, null, 2));
-                        throw new Error('ML API returned success but no predictions data');
-                    }
-                    
-                    // Ensure it's an array
-                    if (!Array.isArray(mlPredictions)) {
-                        // log(`   ⚠️  Predictions is not an array, converting...`);
-                        mlPredictions = [mlPredictions];
-                    }
-                    
-                    // log(`✅ Received ${mlPredictions.length} ML predictions`);
-                
-                    // Count high probability leads (70%+)
-                    highProbabilityLeads = mlPredictions.filter(
-                        p => p.conversion_probability >= 0.7
-                    ).length;
-                // log(`🎯 Found ${highProbabilityLeads} high-probability leads (70%+)`);
-                
-                // Calculate average conversion probability
-                const avgProb = mlPredictions.length > 0
-                    ? mlPredictions.reduce((sum, p) => sum + p.conversion_probability, 0) / mlPredictions.length
-                    : 0;
-
-                // Build comprehensive stats combining ML + database
+        if (scoringError) {
+            // ML scoring unavailable right now - database stats only
+            if (basicStats) {
                 conversionStats = {
-                    conversionRate: basicStats ? basicStats.conversionRate : avgProb,
-                    totalConversions: basicStats ? basicStats.totalConversions : highProbabilityLeads,
-                    totalAssessments: basicStats ? basicStats.totalAssessments : recentAssessments.length,
-                    recentAssessments: recentAssessments.length,
-                    recentConversions: basicStats ? basicStats.recentConversions : highProbabilityLeads,
-                    highProbabilityCount: highProbabilityLeads,
-                    avgConversionProbability: avgProb,
-                    avgConversionDays: basicStats ? basicStats.avgConversionDays : null,
+                    ...basicStats,
+                    highProbabilityCount: 0,
                     topFactors: [{
-                        category: 'ML Model',
-                        description: `Model trained on ${modelInfo.data.training_samples || 'N/A'} samples with ${recentAssessments.length} recent assessments analyzed`
+                        category: 'Database Analysis',
+                        description: 'Real conversion data from quiz submissions and appointments'
                     }]
                 };
-                // log('✅ ML conversion stats built successfully');
-                } else {
-                    // API returned success: false
-                    // log('⚠️  ML API returned success=false');
-                    // log('   Error from ML API:', predictionsResponse.data.error || 'No error message provided');
-                    // log('   Full response:', JSON.stringify(predictionsResponse.data, null, 2));
-                    throw new Error(`ML API processing failed: ${predictionsResponse.data.error || 'Unknown error'}`);
-                }
-            } catch (predictionError) {
-                // log('❌ Error calling ML prediction API:', predictionError.message);
-                
-                // if (predictionError.response) {
-                //     // Server responded with error status
-                //     log('   📡 Server Response Error:');
-                //     log('      Status:', predictionError.response.status);
-                //     log('      Status Text:', predictionError.response.statusText);
-                //     log('      Data:', JSON.stringify(predictionError.response.data, null, 2));
-                // } else if (predictionError.request) {
-                //     // Request was made but no response
-                //     log('   📡 No response received from ML API');
-                //     log('      Request config:', {
-                //         url: predictionError.config?.url,
-                //         method: predictionError.config?.method,
-                //         timeout: predictionError.config?.timeout
-                //     });
-                // } else {
-                //     // Error in request setup
-                //     log('   ⚙️  Request setup error:');
-                //     log('      Message:', predictionError.message);
-                //     log('      Code:', predictionError.code);
-                //     log('      Name:', predictionError.name);
-                //     if (predictionError.stack) {
-                //         log('      Stack trace (first 3 lines):');
-                //         const stackLines = predictionError.stack.split('\n').slice(0, 3);
-                //         stackLines.forEach(line => log('         ' + line));
-                //     }
-                // }
-                // Don't throw - let it continue to use basic stats
             }
+        } else if (recent.count > 0) {
+            // Best leads for the lead cards (conversion-stats.js shows the top 9 at 70%+)
+            mlPredictions = recent.topLeads;
+
+            // Count high probability leads (70%+) over everything scored, not just
+            // the cards - conversion-stats.js shows "top 9 ... out of N total"
+            highProbabilityLeads = recent.highProbabilityCount;
+            // log(`🎯 Found ${highProbabilityLeads} high-probability leads (70%+)`);
+
+            // Average conversion probability
+            const avgProb = recent.avgConversionProbability;
+
+            // Build comprehensive stats combining ML + database
+            conversionStats = {
+                conversionRate: basicStats ? basicStats.conversionRate : avgProb,
+                totalConversions: basicStats ? basicStats.totalConversions : highProbabilityLeads,
+                totalAssessments: basicStats ? basicStats.totalAssessments : recent.count,
+                recentAssessments: recent.count,
+                recentConversions: basicStats ? basicStats.recentConversions : highProbabilityLeads,
+                highProbabilityCount: highProbabilityLeads,
+                avgConversionProbability: avgProb,
+                avgConversionDays: basicStats ? basicStats.avgConversionDays : null,
+                topFactors: [{
+                    category: 'ML Model',
+                    description: `Model trained on ${modelInfo.data.training_samples || 'N/A'} samples with ${recent.count} recent assessments analyzed`
+                }]
+            };
+            // log('✅ ML conversion stats built successfully');
         } else {
             // log('⚠️  No recent assessments - using historical stats only');
             
@@ -306,12 +242,24 @@ async function getMLConversionStats(options = {}) {
             }
         }
 
+        if (scoringError) {
+            return {
+                success: true,
+                mlApiAvailable: false,
+                conversionStats,
+                mlPredictions,
+                highProbabilityLeads,
+                recentAssessmentsCount: 0,
+                error: scoringError.message
+            };
+        }
+
         return {
             success: true,
             conversionStats,
             mlPredictions,
             highProbabilityLeads,
-            recentAssessmentsCount: recentAssessments.length
+            recentAssessmentsCount: recent.count
         };
         
     } catch (error) {
@@ -0,0 +1,38 @@
+# Shared-secret check for admin-only endpoints of the Flask apps
+# Set ML_ADMIN_TOKEN in the environment and send it as
+#   X-Admin-Token: <token>      or      Authorization: Bearer <token>
+# Without ML_ADMIN_TOKEN the admin endpoints are switched off (403).
+#
+# Usage:
+#   from admin_auth import admin_required
+#   @bp.route('/model/online/update', methods=['POST'])
+#   @admin_required
+#   def update(): ...
+
+import functools
+import hmac
+import os
+
+from flask import jsonify, request
+
+ADMIN_TOKEN = os.environ.get('ML_ADMIN_TOKEN', '')
+
+
+def _request_token():
+    token = request.headers.get('X-Admin-Token', '')
+    auth = request.headers.get('Authorization', '')
+    if not token and auth.lower().startswith('bearer '):
+        token = auth[7:].strip()
+    return token
+
+
+def admin_required(view):
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({'error': 'Admin endpoints disabled (ML_ADMIN_TOKEN not set)'}), 403
+        # Constant-time compare so the token can't be guessed byte by byte
+        if not hmac.compare_digest(_request_token().encode(), ADMIN_TOKEN.encode()):
+            return jsonify({'error': 'Invalid admin token'}), 401
+        return view(*args, **kwargs)
+    return wrapper
@@ -0,0 +1,206 @@
+# Deadline-aware admission control for the scoring endpoints
+# Each gunicorn worker has 2 threads and a 120 s timeout, while Node gives up
+# after 10-30 s. A burst of big /predict/batch requests used to queue behind
+# each other and finish long after the caller had gone - CPU spent on answers
+# nobody reads, while requests that could still make it waited behind them.
+#
+# Callers say how long they will wait:
+#   X-Request-Deadline: <unix time in ms>    (absolute - also covers the time
+#                                            spent waiting in gunicorn's queue)
+#   X-Request-Timeout-Ms: <ms from now>      (relative, if clocks can't be trusted)
+# Without a header the deadline is DEFAULT_DEADLINE_MS after arrival.
+#
+# On arrival we estimate
+#   cost  = base_ms + per_item_ms * items          (EWMAs of measured requests,
+#                                                   per_item_ms per endpoint)
+#   wait  = estimated work still running in this worker / PARALLELISM
+# and answer right away, before any scoring:
+#   413  batch cost over BATCH_BUDGET_MS      -> split the batch
+#   503  cost alone misses the deadline (or it has already passed)
+#   429  only the queued work makes it miss   -> Retry-After: estimated wait
+# Everything else runs normally and its measured time updates the EWMAs.
+# Requests are measured in wall time, from admission until the response is
+# done (for a streamed NDJSON body: until the last line is sent). That's
+# what the caller waits for, and it includes the pool processes scoring a
+# big batch and the Mongo read of /predict/recent, which the request
+# thread's CPU time missed. Under load it also counts waiting for the other
+# thread (GIL), so estimates lean high when busy - the safe side for a
+# deadline.
+# ML_ADMISSION=0 turns the checks off (estimates are still kept).
+
+import functools
+import math
+import os
+import threading
+import time
+
+from metrics import REGISTRY
+
+ADMISSION_ENABLED = os.environ.get('ML_ADMISSION', '1') != '0'
+# Deadline for callers that don't send one (Node's longest axios timeout)
+DEFAULT_DEADLINE_MS = float(os.environ.get('ML_DEFAULT_DEADLINE_MS', '30000'))
+# Most estimated work one batch request may bring
+BATCH_BUDGET_MS = float(os.environ.get('ML_BATCH_BUDGET_MS', '20000'))
+# Requests that make real progress at the same time in one worker. Scoring is
+# mostly Python under the GIL, so 2 threads still finish work at about 1x.
+PARALLELISM = float(os.environ.get('ML_ADMISSION_PARALLELISM', '1'))
+# Weight of the newest measurement in the EWMAs
+EWMA_ALPHA = 0.2
+# Starting estimates (replaced by measurements after a few requests)
+INITIAL_BASE_MS = 5.0
+INITIAL_PER_ITEM_MS = 0.1
+
+ADMISSION_TOTAL = REGISTRY.counter(
+    'ml_admission_total', 'Admission decisions for scoring requests',
+    ['endpoint', 'result'])
+
+
+class AdmissionController:
+    def __init__(self, parallelism=PARALLELISM):
+        self.parallelism = parallelism
+        # Fixed cost of a request (learned from single-item requests)
+        self.base_ms = INITIAL_BASE_MS
+        # endpoint -> cost of every further item (/predict/batch, /predict/recent differ)
+        self.per_item_ms = {}
+        # ticket -> (started, estimated ms) for requests running in this process
+        self._running = {}
+        self._next_ticket = 0
+        self._lock = threading.Lock()
+
+    def estimate(self, endpoint, items):
+        return self.base_ms + self.per_item_ms.get(endpoint, INITIAL_PER_ITEM_MS) * max(items - 1, 0)
+
+    def queued_ms(self, now=None):
+        # Estimated work still left on the running requests
+        now = time.perf_counter() if now is None else now
+        with self._lock:
+            running = list(self._running.values())
+        left = sum(max(cost - (now - started) * 1000, 0.0) for started, cost in running)
+        return left / self.parallelism
+
+    # ======================== Decisions ========================
+    def admit(self, endpoint, items, remaining_ms, batch=False):
+        # (ticket, None) when admitted, else (None, (status, message, retry_after_s))
+        cost = self.estimate(endpoint, items)
+        if batch and cost > BATCH_BUDGET_MS:
+            per_item = self.per_item_ms.get(endpoint, INITIAL_PER_ITEM_MS)
+            max_items = int((BATCH_BUDGET_MS - self.base_ms) / per_item) + 1
+            return None, (413, f"Batch too large: estimated {cost:.0f} ms, budget {BATCH_BUDGET_MS:.0f} ms "
+                               f"(send at most {max_items} assessments per request)", None)
+        if remaining_ms <= 0:
+            return None, (503, "Deadline already passed", None)
+        if cost > remaining_ms:
+            return None, (503, f"Cannot finish in time: estimated {cost:.0f} ms, "
+                               f"deadline in {remaining_ms:.0f} ms", None)
+
+        now = time.perf_counter()
+        wait = self.queued_ms(now)
+        if wait + cost > remaining_ms:
+            return None, (429, f"Server busy: estimated wait {wait:.0f} ms + {cost:.0f} ms, "
+                               f"deadline in {remaining_ms:.0f} ms", max(1, math.ceil(wait / 1000)))
+
+        with self._lock:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._running[ticket] = (now, cost)
+        return ticket, None
+
+    def start(self, endpoint, items):
+        # Track a request without checking it (ML_ADMISSION=0)
+        with self._lock:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            self._running[ticket] = (time.perf_counter(), self.estimate(endpoint, items))
+        return ticket
+
+    def finish(self, ticket, endpoint, items, succeeded=True):
+        # Called once the response is done (any thread)
+        with self._lock:
+            started, _ = self._running.pop(ticket)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if not succeeded:
+                return
+            # Single requests teach the fixed part, batches the per-item part
+            if items <= 1:
+                self.base_ms += EWMA_ALPHA * (elapsed_ms - self.base_ms)
+            else:
+                per_item = max(elapsed_ms - self.base_ms, 0.0) / (items - 1)
+                current = self.per_item_ms.get(endpoint, INITIAL_PER_ITEM_MS)
+                self.per_item_ms[endpoint] = current + EWMA_ALPHA * (per_item - current)
+
+    def status(self):
+        return {
+            'enabled': ADMISSION_ENABLED,
+            'base_ms': round(self.base_ms, 3),
+            'per_item_ms': {endpoint: round(ms, 4) for endpoint, ms in self.per_item_ms.items()},
+            'running': len(self._running),
+            'queued_ms': round(self.queued_ms(), 1),
+            'parallelism': self.parallelism,
+            'batch_budget_ms': BATCH_BUDGET_MS,
+            'default_deadline_ms': DEFAULT_DEADLINE_MS,
+        }
+
+
+# One controller per process (like the metrics registry)
+CONTROLLER = AdmissionController()
+
+
+# ======================== Flask integration ========================
+def remaining_ms(request, arrived):
+    # Milliseconds the caller is still waiting for, from the request headers
+    deadline = request.headers.get('X-Request-Deadline')
+    if deadline:
+        try:
+            return float(deadline) - time.time() * 1000
+        except ValueError:
+            pass
+    timeout = request.headers.get('X-Request-Timeout-Ms')
+    if timeout:
+        try:
+            return float(timeout) - (time.perf_counter() - arrived) * 1000
+        except ValueError:
+            pass
+    return DEFAULT_DEADLINE_MS - (time.perf_counter() - arrived) * 1000
+
+
+def admission_controlled(count_items=None, batch=False):
+    """
+    Decorator for a scoring route.
+    count_items() -> number of assessments in the request (default 1)
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import jsonify, make_response, request
+
+            arrived = time.perf_counter()
+            endpoint = request.url_rule.rule if request.url_rule is not None else request.path
+            items = max(count_items() if count_items else 1, 1)
+
+            if ADMISSION_ENABLED:
+                ticket, rejection = CONTROLLER.admit(endpoint, items, remaining_ms(request, arrived), batch)
+                if rejection is not None:
+                    status, message, retry_after = rejection
+                    ADMISSION_TOTAL.inc(endpoint=endpoint, result=f'rejected_{status}')
+                    response = make_response(jsonify({'success': False, 'error': message}), status)
+                    if retry_after is not None:
+                        response.headers['Retry-After'] = str(retry_after)
+                    return response
+                ADMISSION_TOTAL.inc(endpoint=endpoint, result='admitted')
+            else:
+                ticket = CONTROLLER.start(endpoint, items)
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except Exception:
+                CONTROLLER.finish(ticket, endpoint, items, succeeded=False)
+                raise
+            succeeded = response.status_code < 400
+            if response.is_streamed:
+                # NDJSON: the body is generated while it's sent - measure until then
+                response.call_on_close(lambda: CONTROLLER.finish(ticket, endpoint, items, succeeded))
+            else:
+                CONTROLLER.finish(ticket, endpoint, items, succeeded)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,49 @@
+# Read assessments for scoring straight from MongoDB
+# The ML API used to receive assessments from Node: Node queried Mongo,
+# transformed every document with transformAssessmentForML and posted the
+# whole list back to /predict/batch. Reading them here (through the pooled
+# client in mongo_pool.py) skips that round trip of serialization.
+
+from datetime import datetime, timedelta
+
+# Only the fields the model reads - same list as transformAssessmentForML
+ML_FIELDS = [
+    'email', 'ageBracket', 'healthcareWorker', 'healthcareYears', 'challenges',
+    'familiarWith', 'goals', 'focusChakra', 'archetype', 'scoredChakras', 'scoredLifeQuadrants'
+]
+
+# Mongo projection for ML_FIELDS (+ createdAt so results can be ordered/dated)
+ASSESSMENT_PROJECTION = {field: 1 for field in ML_FIELDS + ['createdAt']}
+
+
+# ====================== Mongo document -> predictor input ======================
+# Mirrors transformAssessmentForML in controllers/conversionStatsController.js
+# so a document scores the same whichever side prepared it
+def to_ml_input(doc):
+    challenges = doc.get('challenges')
+    familiar = doc.get('familiarWith')
+    return {
+        'email': doc.get('email') or '',
+        'ageBracket': doc.get('ageBracket') or '',
+        'healthcareWorker': doc.get('healthcareWorker') or 'No',
+        'healthcareYears': doc.get('healthcareYears') or '',
+        'challenges': challenges if isinstance(challenges, list) else [],
+        'familiarWith': familiar if isinstance(familiar, list) else [],
+        'goals': doc.get('goals') or '',
+        'focusChakra': doc.get('focusChakra') or 'unknown',
+        'archetype': doc.get('archetype') or 'unknown',
+        'scoredChakras': doc.get('scoredChakras') or {},
+        'scoredLifeQuadrants': doc.get('scoredLifeQuadrants') or {},
+    }
+
+
+# ====================== Recent assessments ======================
+def fetch_recent_assessments(db, days=90, limit=50):
+    # Newest first, only the projected fields
+    # pymongo returns naive UTC datetimes, so compare in UTC
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    cursor = db.chakraassessments.find({'createdAt': {'$gte': cutoff}}, ASSESSMENT_PROJECTION)
+    cursor = cursor.sort('createdAt', -1)
+    if limit:
+        cursor = cursor.limit(limit)
+    return list(cursor)
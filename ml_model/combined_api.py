@@ -0,0 +1,60 @@
+# Single-process ML service
+# Mounts BOTH route sets in one Flask app:
+# - Conversion prediction (this folder, ml_api.py)   => /health, /predict, /predict/batch, /model/info
+# - Chakra trend forecast (../python/app.py)         => /api/predict_trend, /api/predict_trend/models
+#
+# Instead of two interpreters each importing pandas/sklearn and holding their own
+# Mongo connections, one process shares:
+# - the preloaded conversion model (ml_api.predictor)
+# - one Mongo connection pool (mongo_pool.py)
+# - one metrics registry (metrics.py)
+# - one set of module-level caches
+#
+# Run with the same gunicorn config as the conversion API:
+#   cd ml_model
+#   gunicorn -c gunicorn_config.py combined_api:app
+# Then point the Node app's ML_API_URL2 / ML_HEALTH_URL at this port as well.
+# Use measure_memory.py to compare memory against running the two services separately.
+
+import os
+import sys
+
+from flask import Flask
+
+# Make the trend service modules importable (python/ folder next to ml_model/)
+TREND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'python')
+if TREND_DIR not in sys.path:
+    sys.path.append(TREND_DIR)
+
+# Importing ml_api loads the conversion model once for the whole process
+from ml_api import conversion_bp, configure_cors, predictor, SELF_TEST
+import parallel_scoring
+from scoring_worker import start_scoring_worker
+from scoring_pipeline import start_pipeline
+from app import trend_bp, add_trend_checks
+from metrics import instrument_app
+from json_provider import install_json_provider
+from http_cache import install_compression
+
+# ===================== Create combined Flask app ========================
+app = Flask(__name__)
+configure_cors(app)
+# One metrics registry for both route sets, served on /metrics
+instrument_app(app)
+install_json_provider(app)
+install_compression(app)
+
+# /health, /livez and /readyz come from the conversion routes; the
+# self-test also covers the trend forecast here
+add_trend_checks(SELF_TEST)
+app.register_blueprint(conversion_bp)
+app.register_blueprint(trend_bp)
+
+# =================== Start the API server =============================
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', 5001))
+    # Batch scoring pool first - it's forked, so before any thread starts
+    parallel_scoring.start_pool(predictor)
+    start_scoring_worker(predictor)
+    start_pipeline(predictor)
+    app.run(host='0.0.0.0', port=port, debug=False)
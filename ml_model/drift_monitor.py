@@ -0,0 +1,218 @@
+# Streaming drift monitor for live predictions
+# Compares what /predict and /predict/batch see with the training data
+# (chakra_conversion_dataset.csv):
+#
+#   - every model feature: histogram over bins fixed at training time
+#     (decile edges, or one bin per value for small-integer / one-hot features)
+#   - focusChakra / archetype: counts of raw values, so a new archetype that
+#     the one-hot encoding silently turns into all zeros shows up as "unseen"
+#   - predicted conversion probability: 20-bin histogram
+#
+# Scores per feature: PSI (population stability index) and a KS-style
+# statistic (largest gap between the two binned CDFs).
+#   PSI < 0.1 stable, 0.1 - 0.25 moderate shift, > 0.25 significant shift
+#
+# Memory is constant: fixed-size count arrays plus at most MAX_CATEGORIES
+# raw values per categorical field. Counts cover the current and the
+# previous WINDOW_SECONDS window, so old traffic ages out. Each worker
+# process keeps its own monitor (like /metrics). Updating costs one
+# vectorized pass per batch.
+
+import os
+import threading
+import time
+
+import numpy as np
+
+from training_data import CATEGORICAL_FIELDS, load_training_frame
+
+# Counts roll over to "previous" after this many seconds
+WINDOW_SECONDS = float(os.environ.get('ML_DRIFT_WINDOW', '3600'))
+# Set ML_DRIFT_MONITOR=0 to turn monitoring off
+MONITOR_ENABLED = os.environ.get('ML_DRIFT_MONITOR', '1') != '0'
+# Raw values kept per categorical field (the rest are counted as "other")
+MAX_CATEGORIES = 50
+# Features with at most this many distinct training values get one bin per value
+DISCRETE_VALUES = 12
+PROBABILITY_BINS = 20
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+# Proportions are floored here so empty bins don't make PSI infinite
+EPSILON = 1e-4
+
+
+def psi(expected, actual):
+    # Population stability index between two count (or proportion) vectors
+    expected = np.maximum(expected / max(expected.sum(), 1), EPSILON)
+    actual = np.maximum(actual / max(actual.sum(), 1), EPSILON)
+    return float(np.sum((actual - expected) * np.log(actual / expected)))
+
+
+def ks_statistic(expected, actual):
+    # Largest gap between the binned CDFs
+    expected = np.cumsum(expected) / max(expected.sum(), 1)
+    actual = np.cumsum(actual) / max(actual.sum(), 1)
+    return float(np.max(np.abs(actual - expected)))
+
+
+def status(value):
+    if value > PSI_SIGNIFICANT:
+        return 'significant'
+    if value > PSI_MODERATE:
+        return 'moderate'
+    return 'stable'
+
+
+def bin_edges(values):
+    # Bin boundaries for one feature from its training values
+    unique = np.unique(values)
+    if len(unique) <= DISCRETE_VALUES:
+        # One bin per value: boundaries halfway between them
+        return (unique[1:] + unique[:-1]) / 2
+    return np.unique(np.quantile(values, np.linspace(0.1, 0.9, 9)))
+
+
+class DriftMonitor:
+    def __init__(self, feature_names, X_train, probabilities, categories):
+        # X_train: training features (feature_names order), probabilities: model
+        # output on them, categories: {payload field: set of training values}
+        self.feature_names = list(feature_names)
+        edges = [bin_edges(X_train[:, j]) for j in range(X_train.shape[1])]
+        self.n_bins = max(len(e) for e in edges) + 1
+        # (features x n_bins-1) edges, padded with +inf so extra bins stay empty
+        self.edges = np.full((len(edges), self.n_bins - 1), np.inf)
+        for j, e in enumerate(edges):
+            self.edges[j, :len(e)] = e
+        self.bins_used = np.array([len(e) + 1 for e in edges])
+        self.offsets = np.arange(len(edges)) * self.n_bins
+
+        self.probability_edges = np.linspace(0, 1, PROBABILITY_BINS + 1)[1:-1]
+        self.baseline_features = self._feature_counts(X_train)
+        self.baseline_probability = self._probability_counts(probabilities)
+        self.baseline_rows = len(X_train)
+        self.categories = {field: set(values) for field, values in categories.items()}
+
+        self._lock = threading.Lock()
+        self._reset_counts()
+
+    def _reset_counts(self):
+        self.window_start = time.time()
+        self.current = self._empty()
+        self.previous = self._empty()
+
+    def _empty(self):
+        return {
+            'rows': 0,
+            'features': np.zeros(len(self.feature_names) * self.n_bins, dtype=np.int64),
+            'probability': np.zeros(PROBABILITY_BINS, dtype=np.int64),
+            'categories': {field: {} for field in self.categories},
+        }
+
+    def _feature_counts(self, X):
+        # Bin index of every value, counted per feature in one bincount
+        bins = (X[:, :, None] >= self.edges[None, :, :]).sum(axis=2) + self.offsets
+        return np.bincount(bins.ravel(), minlength=len(self.feature_names) * self.n_bins)
+
+    def _probability_counts(self, probabilities):
+        return np.bincount(np.searchsorted(self.probability_edges, probabilities, side='right'),
+                           minlength=PROBABILITY_BINS)
+
+    # ======================== Updates ========================
+    def observe(self, X, probabilities, assessments=()):
+        # X: feature table of the batch, probabilities: class-1 probability per row
+        X = np.asarray(X, dtype=np.float64)
+        feature_counts = self._feature_counts(X)
+        probability_counts = self._probability_counts(np.asarray(probabilities, dtype=np.float64))
+
+        with self._lock:
+            if time.time() - self.window_start > WINDOW_SECONDS:
+                self.previous = self.current
+                self.current = self._empty()
+                self.window_start = time.time()
+            counts = self.current
+            counts['rows'] += len(X)
+            counts['features'] += feature_counts
+            counts['probability'] += probability_counts
+            for assessment in assessments:
+                for field, seen in counts['categories'].items():
+                    value = str(assessment.get(field) or 'unknown')
+                    if value not in seen and len(seen) >= MAX_CATEGORIES:
+                        value = 'other'
+                    seen[value] = seen.get(value, 0) + 1
+
+    # ======================== Report ========================
+    def report(self):
+        with self._lock:
+            rows = self.current['rows'] + self.previous['rows']
+            features = self.current['features'] + self.previous['features']
+            probability = self.current['probability'] + self.previous['probability']
+            categories = {}
+            for field in self.categories:
+                merged = dict(self.previous['categories'][field])
+                for value, count in self.current['categories'][field].items():
+                    merged[value] = merged.get(value, 0) + count
+                categories[field] = merged
+            window_start = self.window_start
+
+        feature_scores = {}
+        for j, name in enumerate(self.feature_names):
+            used = slice(self.offsets[j], self.offsets[j] + self.bins_used[j])
+            expected, actual = self.baseline_features[used], features[used]
+            value = psi(expected, actual) if rows else 0.0
+            feature_scores[name] = {'psi': round(value, 4), 'ks': round(ks_statistic(expected, actual), 4)
+                                    if rows else 0.0, 'status': status(value)}
+
+        categorical = {}
+        for field, counts in categories.items():
+            unseen = {value: count for value, count in counts.items() if value not in self.categories[field]}
+            total = sum(counts.values())
+            categorical[field] = {
+                'unseen_count': sum(unseen.values()),
+                'unseen_share': round(sum(unseen.values()) / total, 4) if total else 0.0,
+                # Most frequent values the model has never seen
+                'unseen_values': dict(sorted(unseen.items(), key=lambda item: -item[1])[:10]),
+            }
+
+        probability_psi = psi(self.baseline_probability, probability) if rows else 0.0
+        drifted = sorted((name for name, score in feature_scores.items() if score['status'] != 'stable'),
+                         key=lambda name: -feature_scores[name]['psi'])
+        overall = max([status(probability_psi)] + [score['status'] for score in feature_scores.values()],
+                      key=['stable', 'moderate', 'significant'].index)
+        if any(field['unseen_count'] for field in categorical.values()) and overall == 'stable':
+            overall = 'moderate'
+
+        return {
+            'rows': rows,
+            'baseline_rows': self.baseline_rows,
+            'window_seconds': WINDOW_SECONDS,
+            'window_started': window_start,
+            'status': overall,
+            'drifted_features': drifted,
+            'prediction': {
+                'psi': round(probability_psi, 4),
+                'ks': round(ks_statistic(self.baseline_probability, probability), 4) if rows else 0.0,
+                'status': status(probability_psi),
+                'histogram': probability.tolist(),
+                'baseline_histogram': self.baseline_probability.tolist(),
+            },
+            'categorical': categorical,
+            'features': feature_scores,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._reset_counts()
+
+
+def build_monitor(predictor):
+    # Monitor with baselines from the training CSV, or None (disabled / no CSV)
+    if not MONITOR_ENABLED:
+        return None
+    X_train, _, raw = load_training_frame(predictor.feature_names)
+    if X_train is None or not len(X_train):
+        print("Drift monitor off: training dataset not found")
+        return None
+    probabilities = predictor.predict_matrix(X_train)[:, 1]
+    categories = {field: raw[column].fillna('unknown').astype(str).unique()
+                  for column, field in CATEGORICAL_FIELDS.items() if column in raw}
+    return DriftMonitor(predictor.feature_names, X_train.to_numpy(dtype=np.float64), probabilities, categories)
@@ -0,0 +1,132 @@
+# Per-prediction feature attributions (?explain=1 on /predict and /predict/batch)
+# Admins see "Medium - May book with followup" but not why. Full SHAP on the
+# 100-tree forest costs far more than the prediction itself, so we use the
+# two attributions that come almost for free:
+#
+#   tree ensembles (RandomForest / GradientBoosting): Saabas path attribution
+#     over the flattened trees (CompiledEnsemble.contributions) - every split
+#     on the path gives the change in node value to the feature it tested
+#   logistic models (LogisticRegression, the online SGD model): exact linear
+#     attribution with the scaler folded into the coefficients
+#       w = coef / scale            contribution_j = w_j * (x_j - mean_j)
+#
+# Either way
+#   expected_value + sum(contributions) == output_value
+# where output_value is the conversion probability (forest) or its log-odds
+# (boosting, logistic). expected_value is the model's prior / bias term, NOT
+# its average prediction:
+#   trees     the mean root-node value - what the trees say before any split.
+#             Each tree's root is fitted on its bootstrap sample with the
+#             class weights, so for the shipped forest it is ~0.51 while the
+#             mean predicted probability on the training data is ~0.67
+#   logistic  the intercept - the log-odds at the scaler mean
+# Saabas attribution needs exactly this starting point for the sum to add up.
+# It is computed once per model version when the explainer is built.
+
+import numpy as np
+
+# Contributions returned per prediction (largest first); 0 = all features
+DEFAULT_TOP = 5
+
+
+class StandardTransform:
+    # StandardScaler.transform in plain NumPy (same operations, same float64
+    # result) - sklearn's input validation alone costs ~1 ms per call
+    def __init__(self, scaler):
+        self.mean = scaler.mean_ if scaler.with_mean else None
+        self.scale = scaler.scale_ if scaler.with_std else None
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float64)
+        if self.mean is not None:
+            X -= self.mean
+        if self.scale is not None:
+            X /= self.scale
+        return X
+
+
+class TreeExplainer:
+    method = 'saabas'
+
+    def __init__(self, compiled, scaler, feature_names):
+        # scaler: anything with transform(X) -> scaled NumPy array
+        self.compiled = compiled
+        self.scaler = scaler
+        self.feature_names = list(feature_names)
+        self.output = 'probability' if compiled.kind == 'forest' else 'log_odds'
+        # Tree prior: mean root node value (bootstrap + class weighted, so not
+        # the average prediction - see the header)
+        self.expected_value = compiled.contributions(np.zeros((1, len(self.feature_names))))[0]
+
+    def contributions(self, X):
+        # (n_rows, n_features) attributions for an unscaled feature table
+        return self.compiled.contributions(self.scaler.transform(X))[1]
+
+
+class LinearExplainer:
+    method = 'linear'
+    output = 'log_odds'
+
+    def __init__(self, model, scaler, feature_names):
+        self.feature_names = list(feature_names)
+        coef = np.asarray(model.coef_, dtype=np.float64)[0]
+        mean = getattr(scaler, 'mean_', None)
+        scale = getattr(scaler, 'scale_', None)
+        # Fold the StandardScaler into the weights once
+        self.mean = np.zeros(len(coef)) if mean is None else np.asarray(mean, dtype=np.float64)
+        self.weights = coef if scale is None else coef / scale
+        # Bias: log-odds at the scaler mean (scaled features are 0 there) -
+        # not the average predicted log-odds
+        self.expected_value = float(np.asarray(model.intercept_)[0])
+
+    def contributions(self, X):
+        return (np.asarray(X, dtype=np.float64) - self.mean) * self.weights
+
+
+def build_explainer(predictor):
+    # Explainer for the model currently answering predictions, or None
+    from tree_compiler import compile_model
+
+    online = predictor.online
+    if online is not None:
+        return LinearExplainer(online.model, online.scaler, predictor.feature_names)
+
+    model = predictor.model
+    if hasattr(model, 'coef_') and len(model.classes_) == 2:
+        return LinearExplainer(model, predictor.scaler, predictor.feature_names)
+
+    if predictor.float32 is not None:
+        # Same float32 trees and scaler the predictions come from
+        return TreeExplainer(predictor.float32.compiled, predictor.float32.scaler, predictor.feature_names)
+    compiled = predictor.compiled or compile_model(model)
+    if compiled is None:
+        return None
+    return TreeExplainer(compiled, StandardTransform(predictor.scaler), predictor.feature_names)
+
+
+def explain_rows(explainer, X, top=DEFAULT_TOP):
+    # One explanation dict per row of the (unscaled) feature table X
+    values = np.asarray(X, dtype=np.float64)
+    contributions = explainer.contributions(X)
+    output_values = explainer.expected_value + contributions.sum(axis=1)
+
+    # Largest absolute contributions first
+    order = np.argsort(-np.abs(contributions), axis=1, kind='stable')
+    if top:
+        order = order[:, :top]
+    names = explainer.feature_names
+
+    explanations = []
+    for row, columns in enumerate(order.tolist()):
+        shown = contributions[row, columns]
+        explanations.append({
+            'method': explainer.method,
+            'output': explainer.output,
+            'expected_value': explainer.expected_value,
+            'output_value': float(output_values[row]),
+            'contributions': [{'feature': names[j], 'value': float(values[row, j]),
+                               'contribution': float(c)} for j, c in zip(columns, shown.tolist())],
+            # Everything not listed, so the numbers still add up
+            'other': float(contributions[row].sum() - shown.sum()),
+        })
+    return explanations
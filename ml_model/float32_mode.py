@@ -0,0 +1,126 @@
+# Opt-in float32 inference
+# Features are small integers and 1-5 averages, so float64 mostly moves
+# twice the bytes for nothing. With ML_INFERENCE_PRECISION=float32 the
+# feature matrix, the scaler's mean/scale and the flattened tree arrays
+# (tree_compiler.py) are all float32.
+#
+# Float32 results are not bit-identical, so the mode has to earn its place:
+# at load time validate() scores a held-out sample both ways -
+#   - the labelled rows of chakra_conversion_dataset.csv (ROC-AUC)
+#   - VALIDATION_ROWS seeded synthetic assessments (probability drift)
+# and the predictor stays on float64 if the largest probability difference
+# is over MAX_PROBABILITY_DRIFT or AUC drops by more than MAX_AUC_DROP.
+#
+# Trees can split between two float64 feature values that become the same
+# float32 (13/7 computed two slightly different ways), so a retrained model
+# may pass or fail - the check runs on every load.
+#
+# When float32 is active the model version gets a "-f32" suffix, so stored
+# predictions from the float64 path are rescored instead of mixed in.
+
+import os
+
+import numpy as np
+
+from prediction_batch import risk_codes
+from training_data import load_training_frame
+
+# 'float64' (default) or 'float32'
+PRECISION = os.environ.get('ML_INFERENCE_PRECISION', 'float64')
+# Refuse float32 if any probability moves more than this...
+MAX_PROBABILITY_DRIFT = float(os.environ.get('ML_FLOAT32_MAX_DRIFT', '0.005'))
+# ...or ROC-AUC on the labelled rows drops by more than this
+MAX_AUC_DROP = float(os.environ.get('ML_FLOAT32_MAX_AUC_DROP', '0.001'))
+# Synthetic assessments added to the labelled rows for the drift check
+VALIDATION_ROWS = 2000
+
+class Float32Scaler:
+    # StandardScaler.transform with float32 parameters
+    def __init__(self, scaler):
+        self.mean = scaler.mean_.astype(np.float32) if scaler.with_mean else None
+        self.scale = scaler.scale_.astype(np.float32) if scaler.with_std else None
+
+    def transform(self, X):
+        X = np.array(X, dtype=np.float32)
+        if self.mean is not None:
+            X -= self.mean
+        if self.scale is not None:
+            X /= self.scale
+        return X
+
+
+class Float32Model:
+    # Scaler + flattened trees, both float32
+    def __init__(self, scaler, compiled):
+        self.scaler = Float32Scaler(scaler)
+        self.compiled = compiled.to_float32()
+
+    def predict_proba(self, X):
+        # X: unscaled feature table in feature_names order
+        return self.compiled.predict_proba(self.scaler.transform(X))
+
+
+# ======================== Validation ========================
+def validation_sample(predictor):
+    # (features, labels) - labels only exist for the CSV rows
+    import pandas as pd
+    import synthetic_data
+
+    frames = []
+    X_train, labels, _ = load_training_frame(predictor.feature_names)
+    if X_train is not None:
+        frames.append(X_train)
+
+    payloads = [synthetic_data.to_ml_payload(a)
+                for a in synthetic_data.make_assessments(VALIDATION_ROWS, seed=2024)]
+    frames.append(pd.DataFrame([predictor.extract_features(p) for p in payloads])
+                  .reindex(columns=predictor.feature_names, fill_value=0))
+    X = pd.concat(frames, ignore_index=True).astype(np.float64)
+    return X, labels
+
+
+def validate(predictor, model32):
+    # Compare float32 against the float64 path; returns a report dict with 'passed'
+    from sklearn.metrics import roc_auc_score
+
+    X, labels = validation_sample(predictor)
+    proba64 = predictor.model.predict_proba(predictor.scaler.transform(X))[:, 1]
+    proba32 = model32.predict_proba(X.to_numpy())[:, 1].astype(np.float64)
+
+    report = {
+        'rows': len(X),
+        'max_probability_drift': float(np.max(np.abs(proba32 - proba64))),
+        # Informational: rows that would land in another risk bucket
+        'risk_level_changes': int(np.sum(risk_codes(proba32) != risk_codes(proba64))),
+        'auc_float64': None,
+        'auc_float32': None,
+    }
+    passed = report['max_probability_drift'] <= MAX_PROBABILITY_DRIFT
+
+    # AUC needs both classes among the labelled rows
+    if labels is not None and len(set(labels)) > 1:
+        report['auc_float64'] = float(roc_auc_score(labels, proba64[:len(labels)]))
+        report['auc_float32'] = float(roc_auc_score(labels, proba32[:len(labels)]))
+        passed = passed and report['auc_float64'] - report['auc_float32'] <= MAX_AUC_DROP
+
+    report['passed'] = bool(passed)
+    return report
+
+
+def load_float32(predictor):
+    # Float32Model when ML_INFERENCE_PRECISION=float32 and validation passes, else None
+    if PRECISION != 'float32':
+        return None
+    if predictor.compiled is None:
+        print("Float32 mode needs a tree model (see tree_compiler.py) - using float64")
+        return None
+
+    model32 = Float32Model(predictor.scaler, predictor.compiled)
+    report = validate(predictor, model32)
+    print(f"Float32 validation on {report['rows']} rows: max drift {report['max_probability_drift']:.2e}, "
+          f"{report['risk_level_changes']} risk level change(s), "
+          f"AUC {report['auc_float64']} -> {report['auc_float32']}")
+    if not report['passed']:
+        print("Float32 mode refused (over the drift / AUC limit) - using float64")
+        return None
+    return model32
@@ -3,8 +3,16 @@ Gunicorn Configuration for Production ML API Deployment on Render
 """
 
 import os
+import sys
 import multiprocessing
 
+# The config is read before gunicorn puts the app folder on sys.path
+CONFIG_DIR = os.path.dirname(os.path.abspath(__file__))
+if CONFIG_DIR not in sys.path:
+    sys.path.insert(0, CONFIG_DIR)
+
+from native_threads import configure_worker, native_thread_limit, pool_processes, scoring_pool_size, set_thread_env
+
 # Server socket
 # Render sets PORT environment variable, default to 5001 for local testing
 ml_port = os.environ.get('ML_PORT', '5001')
@@ -16,6 +24,11 @@ workers = 2
 worker_class = "sync"  # Synchronous workers work well for ML predictions
 threads = 2  # 2 threads per worker
 
+# Native thread pools (BLAS / OpenMP): size them before the app is preloaded,
+# post_fork applies the final per-worker limit (ML_NATIVE_THREADS, native_threads.py)
+# The parallel scoring pool processes count against the same budget
+set_thread_env(native_thread_limit(workers, threads, scoring_pool_size(workers)))
+
 # Timeouts
 timeout = 120  # 2 minutes - ML predictions can take time
 keepalive = 5  # Keep-alive connections for 5 seconds
@@ -68,6 +81,9 @@ def on_starting(server):
     print("="*60)
     print(f"Workers: {workers}")
     print(f"Threads per worker: {threads}")
+    print(f"Scoring pool processes per worker: {scoring_pool_size(server.cfg.workers) or 'off'}")
+    print(f"Native threads per worker: "
+          f"{native_thread_limit(server.cfg.workers, server.cfg.threads, scoring_pool_size(server.cfg.workers))}")
     print(f"Binding to: {bind}")
     print(f"Timeout: {timeout}s")
     print(f"Preload app: {preload_app}")
@@ -79,10 +95,22 @@ def on_reload(server):
     """
     print("Reloading workers...")
 
+def _loaded_predictor():
+    """
+    The conversion model preloaded by ml_api.py (also used by combined_api.py)
+    """
+    ml_api = sys.modules.get('ml_api')
+    return getattr(ml_api, 'predictor', None)
+
 def when_ready(server):
     """
     Called just after the server is started
+    With preload_app the app is already imported in the master, so importing
+    the hot-path modules here means every forked worker inherits them
     """
+    from warmup import warm_up
+    report = warm_up(predictor=_loaded_predictor())
+    print(f"Warm-up (master): imports {report['import_ms']}ms, hot paths {report['touch_ms']}ms")
     print("Server is ready. Accepting connections.")
 
 def pre_fork(server, worker):
@@ -94,8 +122,30 @@ def pre_fork(server, worker):
 def post_fork(server, worker):
     """
     Called just after a worker has been forked
-    """
-    print(f"Worker spawned (pid: {worker.pid})")
+    Run the hot paths once so the first real request isn't the cold one,
+    then start background scoring + the real-time pipeline (only one
+    worker wins each store lock) and the /readyz self-test thread
+    Native thread pools are limited first, so the warm-up already runs with them,
+    then the parallel scoring pool is forked before any thread exists
+    """
+    from warmup import warm_up
+    threading_report = configure_worker(_loaded_predictor(), server.cfg.workers, server.cfg.threads,
+                                        scoring_pool_size(server.cfg.workers))
+    print(f"Worker {worker.pid} native threads: {threading_report['native_threads']} "
+          f"{threading_report['pools']}, model n_jobs: {threading_report['model_n_jobs']}")
+    # Fork the batch scoring pool while this worker still has one thread
+    import parallel_scoring
+    pool = parallel_scoring.start_pool(_loaded_predictor(), pool_processes(server.cfg.workers))
+    print(f"Worker {worker.pid} scoring pool: {pool or 'off'} processes")
+    from scoring_worker import start_scoring_worker
+    from scoring_pipeline import start_pipeline
+    report = warm_up(predictor=_loaded_predictor())
+    print(f"Worker spawned (pid: {worker.pid}) - warm-up {report['touch_ms']}ms")
+    start_scoring_worker(_loaded_predictor())
+    start_pipeline(_loaded_predictor())
+    self_test = getattr(sys.modules.get('ml_api'), 'SELF_TEST', None)
+    if self_test is not None:
+        self_test.ensure_running()
 
 def pre_exec(server):
     """
@@ -0,0 +1,127 @@
+# Liveness / readiness for the ML services
+#   GET /livez   the process is up and answering - does no work at all
+#   GET /readyz  last result of a background self-test (cached, never
+#                computed inside the request once the first run is done)
+#
+# /health only said "the model object exists" and Node called it before
+# every real request. The self-test instead runs every SELF_TEST_INTERVAL
+# seconds in a daemon thread of each worker and actually exercises things:
+#   conversion API: score a canned assessment (warmup.py), ping MongoDB
+#   trend API:      forecast a small synthetic history, ping MongoDB
+# Checks marked non-critical (MongoDB for the conversion API - /predict works
+# without it) only turn the status into "degraded"; a failing critical check,
+# or results older than STALE_AFTER (self-test thread stuck / dead), gives 503.
+#
+# Usage:
+#   SELF_TEST = SelfTest()
+#   SELF_TEST.add_check('model_score', score_canned_assessment)
+#   register_health_routes(blueprint_or_app, SELF_TEST)
+
+import os
+import threading
+import time
+
+# Seconds between self-test runs
+SELF_TEST_INTERVAL = float(os.environ.get('ML_SELF_TEST_INTERVAL', '30'))
+# Results older than this don't count (the thread should have run 3 times)
+STALE_AFTER = 3 * SELF_TEST_INTERVAL
+
+
+class SelfTest:
+    def __init__(self, interval=SELF_TEST_INTERVAL):
+        self.interval = interval
+        self.checks = []            # (name, fn, critical)
+        self._result = None
+        self._thread = None
+        self._thread_pid = None
+        self._lock = threading.Lock()
+
+    def add_check(self, name, fn, critical=True):
+        # fn() raises (or returns False) when the check fails; any other
+        # return value is shown as the check's detail
+        self.checks.append((name, fn, critical))
+
+    def run_once(self):
+        checks = {}
+        ready, degraded = True, False
+        for name, fn, critical in self.checks:
+            start = time.perf_counter()
+            try:
+                detail = fn()
+                ok = detail is not False
+                error = None if ok else 'check returned False'
+            except Exception as e:
+                detail, ok, error = None, False, f"{type(e).__name__}: {e}"
+            checks[name] = {'ok': ok, 'critical': critical,
+                            'ms': round((time.perf_counter() - start) * 1000, 2)}
+            if error:
+                checks[name]['error'] = error
+            elif detail not in (None, True):
+                checks[name]['detail'] = detail
+            if not ok:
+                if critical:
+                    ready = False
+                else:
+                    degraded = True
+
+        self._result = {
+            'ready': ready,
+            'status': 'ok' if ready and not degraded else 'degraded' if ready else 'failing',
+            'checked_at': time.time(),
+            'checks': checks,
+        }
+        return self._result
+
+    # ======================== Background thread ========================
+    def _loop(self):
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Self-test failed to run: {e}")
+            time.sleep(self.interval)
+
+    def ensure_running(self):
+        # One thread per process - threads don't survive gunicorn's fork
+        if self._thread is not None and self._thread_pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._thread_pid != os.getpid() or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name='ml-self-test', daemon=True)
+                self._thread_pid = os.getpid()
+                self._thread.start()
+
+    def result(self):
+        # Cached result with its age; only the very first call waits for a run
+        self.ensure_running()
+        result = self._result
+        if result is None:
+            with self._lock:
+                result = self._result or self.run_once()
+        age = time.time() - result['checked_at']
+        if age > STALE_AFTER:
+            result = dict(result, ready=False, status='stale')
+        return dict(result, age_seconds=round(age, 1))
+
+
+# ======================== Checks ========================
+def mongo_ping():
+    from mongo_pool import get_database
+    get_database().command('ping')
+
+
+# ======================== Flask routes ========================
+def register_health_routes(target, self_test):
+    # /livez + /readyz on a Flask app or blueprint
+    from flask import jsonify
+
+    @target.route('/livez', methods=['GET'])
+    def livez():
+        return jsonify({'status': 'ok'})
+
+    @target.route('/readyz', methods=['GET'])
+    def readyz():
+        result = self_test.result()
+        return jsonify(result), 200 if result['ready'] else 503
+
+    return target
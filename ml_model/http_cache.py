@@ -0,0 +1,79 @@
+# Conditional GET and gzip for the Flask apps
+# - ETags: /model/info and /api/predict_trend change rarely (model version /
+#   forecast snapshot), so callers send If-None-Match and get an empty 304
+#   back while nothing changed. The ETags are weak (W/"..."): the same tag
+#   goes on the gzip and the identity body, which are equivalent content
+#   but not the same bytes.
+# - gzip: big responses (batch predictions, /metrics) are compressed when
+#   the client sends Accept-Encoding: gzip. Small ones are left alone -
+#   compressing a 200-byte body costs more than it saves.
+#
+# Usage:
+#   from http_cache import conditional_json, content_etag, install_compression
+#   install_compression(app)
+#   return conditional_json(payload, etag)
+
+import gzip
+import hashlib
+import os
+
+from flask import current_app, jsonify, request
+from werkzeug.http import unquote_etag
+
+from json_provider import dumps_bytes
+from metrics import time_stage
+
+# Only compress bodies at least this big (bytes)
+COMPRESS_MIN_BYTES = int(os.environ.get('ML_GZIP_MIN_BYTES', '2048'))
+# 1 (fast) .. 9 (small); 5 is a good trade for JSON
+COMPRESS_LEVEL = int(os.environ.get('ML_GZIP_LEVEL', '5'))
+
+
+# ======================== ETag / 304 ========================
+def content_etag(payload, exclude=()):
+    # Weak ETag from the JSON content (keys listed in `exclude` ignored,
+    # e.g. per-call timings that don't change what the client shows)
+    if exclude:
+        payload = {key: value for key, value in payload.items() if key not in exclude}
+    return 'W/"' + hashlib.sha1(dumps_bytes(payload)).hexdigest()[:20] + '"'
+
+
+def conditional_json(payload, etag):
+    # 304 when the client already has this version, full JSON otherwise
+    # etag: 'W/"..."' or '"..."' - always sent weak (see top of file)
+    # (If-None-Match uses weak comparison, so either form from a client matches)
+    tag, _ = unquote_etag(etag)
+    if request.if_none_match.contains_weak(tag):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(payload)
+    response.set_etag(tag, weak=True)
+    # Allow caching but make clients revalidate every time
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# ======================== gzip ========================
+def install_compression(app, min_bytes=COMPRESS_MIN_BYTES, level=COMPRESS_LEVEL):
+    @app.after_request
+    def _gzip_response(response):
+        if (response.status_code != 200
+                or response.direct_passthrough
+                or response.is_streamed
+                or 'Content-Encoding' in response.headers
+                or 'gzip' not in request.headers.get('Accept-Encoding', '').lower()):
+            return response
+
+        data = response.get_data()
+        if len(data) < min_bytes:
+            return response
+
+        with time_stage('gzip'):
+            compressed = gzip.compress(data, compresslevel=level)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Content-Length'] = str(len(compressed))
+        response.vary.add('Accept-Encoding')
+        return response
+
+    return app
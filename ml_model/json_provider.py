@@ -0,0 +1,96 @@
+# Faster JSON for the Flask apps
+# Flask's default provider uses the stdlib json module for request.json and
+# jsonify. The assessment payloads (nested scoredChakras / scoredLifeQuadrants)
+# and the trend history rows spend a noticeable part of each request there.
+#
+# FastJSONProvider uses orjson when it is installed (native encoder/decoder,
+# serializes NumPy arrays and scalars itself) and falls back to the stdlib
+# otherwise. Both paths handle NumPy / pandas values, so numbers coming out
+# of sklearn or pandas never break a response.
+#
+# Usage:
+#   from json_provider import install_json_provider
+#   install_json_provider(app)
+
+import json
+from datetime import date, datetime
+
+import numpy as np
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+# Keep Flask's default: keys sorted, so responses are byte-for-byte stable
+ORJSON_OPTIONS = (orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS) if orjson else 0
+
+
+def to_builtin(value):
+    # NumPy / pandas / datetime values -> something json can write
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, np.floating):
+        return float(value)
+    if isinstance(value, np.bool_):
+        return bool(value)
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if hasattr(value, 'isoformat'):  # pandas Timestamp / Period
+        return value.isoformat()
+    if hasattr(value, 'tolist'):     # pandas Series / Index
+        return value.tolist()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def _stdlib_default(value):
+    try:
+        return to_builtin(value)
+    except TypeError:
+        # Flask's own fallbacks (dataclasses, UUID, Decimal, __html__)
+        return DefaultJSONProvider.default(value)
+
+
+def dumps_bytes(obj):
+    # Compact UTF-8 JSON bytes with sorted keys
+    if orjson is not None:
+        return orjson.dumps(obj, default=to_builtin, option=ORJSON_OPTIONS)
+    return json.dumps(obj, default=_stdlib_default, sort_keys=True,
+                      separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    # Name of the active backend, shown by the benchmark
+    backend = 'orjson' if orjson is not None else 'json'
+
+    def dumps(self, obj, **kwargs):
+        # Extra options (indent, ...) are only supported by the stdlib path
+        if kwargs or orjson is None:
+            kwargs.setdefault('default', _stdlib_default)
+            kwargs.setdefault('sort_keys', True)
+            return json.dumps(obj, **kwargs)
+        return dumps_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        # jsonify(): encode straight to bytes, no str round trip
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps_bytes(obj), mimetype=self.mimetype)
+
+
+def install_json_provider(app):
+    app.json = FastJSONProvider(app)
+    return app
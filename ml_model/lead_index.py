@@ -0,0 +1,189 @@
+# In-memory index of scored leads
+# Answers "top K leads in the last N days" and "how many leads per risk
+# bucket" without rescoring or scanning every prediction.
+#
+# Layout (all per UTC creation day):
+#   by_day[day]  -> sorted list of (-probability, assessment_id)   best lead first
+#   counts[day]  -> [high, medium_high, medium, low] lead counts
+#   sums[day]    -> sum of probabilities (for the average)
+# plus entries[assessment_id] -> (day, -probability, email) so a rescored
+# assessment can be found and moved.
+#
+# Top K over N days = merge the N already-sorted day lists and stop after K
+# -> O(N + K log N). Bucket counts over N days = O(N). Neither depends on
+# how many leads are stored.
+#
+# Every process keeps its own index and tails the prediction store by
+# (scored_at, assessment_id) (see refresh), so it picks up scores written by the background
+# worker / pipeline in another gunicorn worker. Deleted assessments are
+# tailed the same way from the store's removals.
+
+import bisect
+import heapq
+import itertools
+import threading
+import time
+from datetime import datetime, timedelta
+
+from prediction_store import REMOVAL_RETENTION, get_store
+
+# Same thresholds as ConversionPredictorService._get_risk_level, highest first
+RISK_BUCKETS = [('high', 0.7), ('medium_high', 0.5), ('medium', 0.3), ('low', 0.0)]
+
+# Re-read rows scored this long before the last one seen: a slower writer
+# can commit a batch stamped a little earlier than one we already read
+REFRESH_OVERLAP = timedelta(seconds=5)
+
+# Don't hit SQLite more than once per this many seconds
+REFRESH_INTERVAL = 1.0
+
+# Rows per store read while refreshing
+REFRESH_PAGE = 5000
+
+
+def risk_bucket(probability):
+    # Index into RISK_BUCKETS
+    for index, (_, threshold) in enumerate(RISK_BUCKETS):
+        if probability >= threshold:
+            return index
+    return len(RISK_BUCKETS) - 1
+
+
+def _day(created_at):
+    # created_at is stored as ISO text; the first 10 chars are the date
+    return created_at[:10] if created_at else '0000-00-00'
+
+
+class LeadIndex:
+    def __init__(self, model_version=None):
+        self._lock = threading.Lock()
+        # Only one request thread refreshes at a time, the others use what's there
+        self._refresh_lock = threading.Lock()
+        self.last_refresh = 0.0
+        self._reset(model_version)
+
+    def _reset(self, model_version):
+        self.model_version = model_version
+        self.by_day = {}
+        self.counts = {}
+        self.sums = {}
+        self.entries = {}
+        self.last_scored_at = ''
+        self.last_removed_at = ''
+
+    # ======================== Updates ========================
+    def upsert(self, assessment_id, probability, created_at, email=None):
+        with self._lock:
+            self._remove(assessment_id)
+            day = _day(created_at)
+            key = (-probability, assessment_id)
+            bisect.insort(self.by_day.setdefault(day, []), key)
+            self.counts.setdefault(day, [0] * len(RISK_BUCKETS))[risk_bucket(probability)] += 1
+            self.sums[day] = self.sums.get(day, 0.0) + probability
+            self.entries[assessment_id] = (day, -probability, email)
+
+    def _remove(self, assessment_id):
+        entry = self.entries.pop(assessment_id, None)
+        if entry is None:
+            return
+        day, neg_probability, _ = entry
+        leads = self.by_day[day]
+        del leads[bisect.bisect_left(leads, (neg_probability, assessment_id))]
+        self.counts[day][risk_bucket(-neg_probability)] -= 1
+        self.sums[day] -= -neg_probability
+
+    def refresh(self, model_version, store=None, force=False):
+        # Pull rows scored since the last refresh; rebuild when the model changed
+        now = time.monotonic()
+        if not force and model_version == self.model_version and now - self.last_refresh < REFRESH_INTERVAL:
+            return 0
+        if not self._refresh_lock.acquire(blocking=False):
+            return 0
+        try:
+            # Removals are only kept for REMOVAL_RETENTION - after a longer
+            # gap we could have missed some, so start over
+            stale = now - self.last_refresh > REMOVAL_RETENTION.total_seconds()
+            self.last_refresh = now
+            store = store or get_store()
+
+            if model_version != self.model_version or stale:
+                with self._lock:
+                    self._reset(model_version)
+
+            start = ''
+            if self.last_scored_at:
+                start = (datetime.fromisoformat(self.last_scored_at) - REFRESH_OVERLAP).isoformat()
+
+            applied = 0
+            after_id = ''
+            while True:
+                rows = store.scored_since(model_version, start, after_id, REFRESH_PAGE)
+                for assessment_id, email, created_at, probability, scored_at in rows:
+                    self.upsert(assessment_id, probability, created_at, email)
+                    self.last_scored_at = max(self.last_scored_at, scored_at)
+                applied += len(rows)
+                if len(rows) < REFRESH_PAGE:
+                    break
+                # Next page after the last (scored_at, assessment_id) - one big
+                # batch shares a scored_at, so the id keeps the pages moving
+                start, after_id = rows[-1][4], rows[-1][0]
+
+            # Then drop assessments deleted since the last refresh
+            since = ''
+            if self.last_removed_at:
+                since = (datetime.fromisoformat(self.last_removed_at) - REFRESH_OVERLAP).isoformat()
+            for assessment_id, removed_at in store.removed_since(model_version, since):
+                with self._lock:
+                    self._remove(assessment_id)
+                self.last_removed_at = max(self.last_removed_at, removed_at)
+            return applied
+        finally:
+            self._refresh_lock.release()
+
+    # ======================== Queries ========================
+    def _days(self, days):
+        # Last `days` UTC calendar days, today included
+        today = datetime.utcnow().date()
+        return [(today - timedelta(days=offset)).isoformat() for offset in range(days)]
+
+    def top(self, k, days, min_probability=0.0):
+        with self._lock:
+            day_lists = [self.by_day[day] for day in self._days(days) if self.by_day.get(day)]
+            leads = []
+            for neg_probability, assessment_id in itertools.islice(heapq.merge(*day_lists), k):
+                if -neg_probability < min_probability:
+                    break
+                day, _, email = self.entries[assessment_id]
+                leads.append({
+                    'assessment_id': assessment_id,
+                    'email': email,
+                    'conversion_probability': -neg_probability,
+                    'risk_bucket': RISK_BUCKETS[risk_bucket(-neg_probability)][0],
+                    'created_day': day,
+                })
+            return leads
+
+    def bucket_counts(self, days):
+        with self._lock:
+            totals = [0] * len(RISK_BUCKETS)
+            probability_sum = 0.0
+            for day in self._days(days):
+                for index, count in enumerate(self.counts.get(day, ())):
+                    totals[index] += count
+                probability_sum += self.sums.get(day, 0.0)
+            total = sum(totals)
+            return {
+                'total': total,
+                'buckets': {name: count for (name, _), count in zip(RISK_BUCKETS, totals)},
+                'avg_conversion_probability': probability_sum / total if total else 0,
+            }
+
+
+# ======================== Shared instance ========================
+_index = LeadIndex()
+
+
+def get_lead_index(model_version):
+    # Up-to-date index for this model version
+    _index.refresh(model_version)
+    return _index
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for the conversion ML API (ml_api.py)
+
+Drives a mix of /predict and /predict/batch traffic at a fixed concurrency
+and reports throughput, latency tails and error rate. Uses the bundled
+model pickles and the in-memory Mongo stand-in (ML_FAKE_MONGO), so nothing
+external is needed.
+
+Two modes:
+- inprocess: Flask test client, no sockets - measures the app itself
+- gunicorn:  starts real gunicorn servers with gunicorn_config.py, one per
+             worker/thread/worker-class setting, and drives them over HTTP
+
+    python3 load_test.py
+    python3 load_test.py --mode gunicorn --matrix 2x2:sync,4x1:sync,1x4:gthread
+    python3 load_test.py --concurrency 16 --duration 20 --batch-ratio 0.2 --batch-size 50
+    python3 load_test.py --concurrency 32 --batch-size 2000 --deadline-ms 2000 --compare-admission
+
+--deadline-ms sends X-Request-Deadline (and gives up client-side at the
+deadline, like Node's axios timeout). Goodput counts only 200 answers that
+arrived in time; "late" ones were work the caller never used, "shed" ones
+were turned away early with 429/503/413 (admission_control.py).
+--compare-admission runs every setting with ML_ADMISSION=0 and =1.
+
+Matrix entries are WORKERSxTHREADS:WORKER_CLASS. Note that gunicorn runs a
+"sync" worker with threads > 1 as gthread.
+--native-threads 1,2,4 repeats every entry with ML_NATIVE_THREADS set to each
+value (BLAS / OpenMP pool size per worker, see native_threads.py):
+
+    python3 load_test.py --mode gunicorn --matrix 1x1:sync,2x2:sync,4x1:sync --native-threads 1,4
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import synthetic_data
+
+# Assessments held by the fake Mongo in the server under test
+FAKE_MONGO_SIZE = '2000'
+
+
+# ============================ Traffic ===================================
+class TrafficMix:
+    # Pre-serialized request bodies so the client spends its time waiting, not encoding
+    def __init__(self, batch_ratio, batch_size, seed=3):
+        assessments = [synthetic_data.to_ml_payload(a)
+                       for a in synthetic_data.make_assessments(max(batch_size, 200), seed=seed)]
+        self.singles = [json.dumps(a) for a in assessments[:200]]
+        self.batch = json.dumps(assessments[:batch_size])
+        self.batch_ratio = batch_ratio
+
+    def next_request(self, rng):
+        if rng.random() < self.batch_ratio:
+            return '/predict/batch', self.batch
+        return '/predict', rng.choice(self.singles)
+
+
+# ============================ Clients ===================================
+class InProcessClient:
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def post(self, path, body, headers=None):
+        response = self.client.post(path, data=body, content_type='application/json', headers=headers)
+        return response.status_code
+
+
+class HttpClient:
+    # One keep-alive connection per load thread, like a pooled Node agent
+    def __init__(self, port, timeout):
+        self.port = port
+        self.timeout = timeout
+        self.conn = None
+
+    def post(self, path, body, headers=None):
+        for attempt in range(2):
+            try:
+                if self.conn is None:
+                    self.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=self.timeout)
+                self.conn.request('POST', path, body=body,
+                                  headers={'Content-Type': 'application/json', **(headers or {})})
+                response = self.conn.getresponse()
+                response.read()
+                return response.status
+            except socket.timeout:
+                # Gave up like the real caller - never retried
+                self.conn = None
+                raise
+            except (http.client.HTTPException, OSError):
+                # Server closed the keep-alive connection - reconnect once
+                self.conn = None
+                if attempt == 1:
+                    raise
+        return None
+
+
+# ============================ Driver ====================================
+def drive(make_client, mix, concurrency, duration, deadline_ms=None):
+    results = []
+    results_lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(index)
+        client = make_client()
+        local = []
+        while time.perf_counter() < stop_at:
+            path, body = mix.next_request(rng)
+            headers = None
+            if deadline_ms:
+                headers = {'X-Request-Deadline': str(int(time.time() * 1000 + deadline_ms))}
+            start = time.perf_counter()
+            try:
+                status = client.post(path, body, headers)
+            except Exception:
+                status = None
+            local.append((path, (time.perf_counter() - start) * 1000, status))
+        with results_lock:
+            results.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed, deadline_ms=None):
+    summary = {}
+    groups = {'all': results}
+    for path in sorted({r[0] for r in results}):
+        groups[path] = [r for r in results if r[0] == path]
+
+    for name, rows in groups.items():
+        if not rows:
+            continue
+        latencies = np.asarray([r[1] for r in rows])
+        errors = sum(1 for r in rows if r[2] != 200)
+        shed = sum(1 for r in rows if r[2] in (413, 429, 503))
+        on_time = [r for r in rows if r[2] == 200 and (not deadline_ms or r[1] <= deadline_ms)]
+        ok = sum(1 for r in rows if r[2] == 200)
+        summary[name] = {
+            'requests': len(rows),
+            'rps': round(len(rows) / elapsed, 1),
+            'p50_ms': round(float(np.percentile(latencies, 50)), 1),
+            'p95_ms': round(float(np.percentile(latencies, 95)), 1),
+            'p99_ms': round(float(np.percentile(latencies, 99)), 1),
+            'max_ms': round(float(latencies.max()), 1),
+            'error_rate': round(errors / len(rows), 4),
+            # Answers the caller could still use
+            'goodput_rps': round(len(on_time) / elapsed, 1),
+            'shed_rate': round(shed / len(rows), 4),
+            'late_rate': round((ok - len(on_time)) / len(rows), 4),
+        }
+    return summary
+
+
+# ========================== Gunicorn server =============================
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def parse_setting(spec):
+    # "2x2:sync" -> (2, 2, "sync")
+    sizes, _, worker_class = spec.partition(':')
+    workers, _, threads = sizes.partition('x')
+    return int(workers), int(threads or 1), worker_class or 'sync'
+
+
+def start_gunicorn(workers, threads, worker_class, port, extra_env=None):
+    command = [
+        sys.executable, '-m', 'gunicorn', '-c', 'gunicorn_config.py',
+        '--workers', str(workers), '--threads', str(threads),
+        '--worker-class', worker_class, '--bind', f'127.0.0.1:{port}',
+        '--access-logfile', '/dev/null', 'ml_api:app',
+    ]
+    env = {**os.environ, 'ML_FAKE_MONGO': FAKE_MONGO_SIZE, 'NODE_ENV': 'development', **(extra_env or {})}
+    server = subprocess.Popen(command, cwd=BASE_DIR, env=env,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    # Wait until the service is ready (model scores in the self-test)
+    deadline = time.time() + 90
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"gunicorn exited with code {server.returncode}")
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=2)
+            conn.request('GET', '/readyz')
+            if conn.getresponse().status == 200:
+                return server
+        except OSError:
+            pass
+        time.sleep(0.5)
+    server.terminate()
+    raise RuntimeError("gunicorn did not become healthy in time")
+
+
+def stop_gunicorn(server):
+    server.terminate()
+    try:
+        server.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        server.kill()
+
+
+# ============================== Report ==================================
+def print_summary(label, summary):
+    for name, s in summary.items():
+        print(f"{label:<22}{name:<16}{s['requests']:>8}{s['rps']:>9}{s['p50_ms']:>9}"
+              f"{s['p95_ms']:>9}{s['p99_ms']:>9}{s['error_rate']:>8.2%}"
+              f"{s['goodput_rps']:>9}{s['shed_rate']:>8.2%}{s['late_rate']:>8.2%}")
+        label = ''
+
+
+def print_header():
+    print(f"{'setting':<22}{'endpoint':<16}{'reqs':>8}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'errors':>8}"
+          f"{'goodput':>9}{'shed':>8}{'late':>8}")
+    print("-" * 115)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--mode', choices=['inprocess', 'gunicorn'], default='inprocess')
+    parser.add_argument('--matrix', default='2x2:sync',
+                        help='comma separated WORKERSxTHREADS:CLASS settings (gunicorn mode)')
+    parser.add_argument('--concurrency', type=int, default=8, help='simultaneous clients')
+    parser.add_argument('--duration', type=float, default=10, help='seconds per setting')
+    parser.add_argument('--batch-ratio', type=float, default=0.1, help='share of requests sent to /predict/batch')
+    parser.add_argument('--batch-size', type=int, default=50, help='assessments per batch request')
+    parser.add_argument('--timeout', type=float, default=30, help='client timeout in seconds (Node uses 10-30s)')
+    parser.add_argument('--native-threads',
+                        help='comma separated ML_NATIVE_THREADS values to try for every setting (gunicorn mode)')
+    parser.add_argument('--deadline-ms', type=float, help='send X-Request-Deadline and give up after this long')
+    parser.add_argument('--compare-admission', action='store_true',
+                        help='run every setting with admission control off and on')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    mix = TrafficMix(args.batch_ratio, args.batch_size)
+    report = {}
+
+    print("\n" + "=" * 115)
+    print(f"ML API LOAD TEST - {args.mode}, concurrency {args.concurrency}, {args.duration:.0f}s per setting, "
+          f"{args.batch_ratio:.0%} batch x{args.batch_size}"
+          + (f", deadline {args.deadline_ms:.0f}ms" if args.deadline_ms else ""))
+    print("=" * 115)
+    print_header()
+
+    # (label suffix, ML_ADMISSION value or None to keep the server default)
+    admission_runs = [(' adm=off', '0'), (' adm=on', '1')] if args.compare_admission else [('', None)]
+    # With a deadline the client gives up then, like Node
+    client_timeout = args.deadline_ms / 1000 if args.deadline_ms else args.timeout
+
+    if args.mode == 'inprocess':
+        os.environ.setdefault('ML_FAKE_MONGO', FAKE_MONGO_SIZE)
+        os.environ.setdefault('NODE_ENV', 'development')
+        import admission_control
+        import ml_api
+        for suffix, admission in admission_runs:
+            if admission is not None:
+                admission_control.ADMISSION_ENABLED = admission == '1'
+            label = 'inprocess' + suffix
+            results, elapsed = drive(lambda: InProcessClient(ml_api.app), mix, args.concurrency,
+                                     args.duration, args.deadline_ms)
+            report[label] = summarize(results, elapsed, args.deadline_ms)
+            print_summary(label, report[label])
+    else:
+        # None = the server's default (cores / (workers x threads))
+        native_runs = args.native_threads.split(',') if args.native_threads else [None]
+        for spec in args.matrix.split(','):
+            workers, threads, worker_class = parse_setting(spec.strip())
+            for native, (suffix, admission) in [(n, a) for n in native_runs for a in admission_runs]:
+                port = free_port()
+                extra_env = {}
+                if admission is not None:
+                    extra_env['ML_ADMISSION'] = admission
+                if native is not None:
+                    extra_env['ML_NATIVE_THREADS'] = native.strip()
+                server = start_gunicorn(workers, threads, worker_class, port, extra_env)
+                try:
+                    results, elapsed = drive(lambda: HttpClient(port, client_timeout), mix, args.concurrency,
+                                             args.duration, args.deadline_ms)
+                finally:
+                    stop_gunicorn(server)
+                label = f"{workers}x{threads}:{worker_class}"
+                if native is not None:
+                    label += f" n{native.strip()}"
+                label += suffix
+                report[label] = summarize(results, elapsed, args.deadline_ms)
+                print_summary(label, report[label])
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': report}, f, indent=2)
+    print("=" * 115 + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Memory comparison: two ML services vs the single combined service
+
+Starts each setup in a fresh interpreter, imports the app, pushes one request
+through every hot path with the Flask test client (so pandas/sklearn/numpy are
+really loaded), and reads the peak resident memory of that process.
+
+    python3 measure_memory.py
+
+No Mongo connection is needed - the trend service is exercised through its
+forecasting backends on a small synthetic history.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TREND_DIR = os.path.join(BASE_DIR, '..', 'python')
+
+# Shared snippet: read peak RSS of this process in MB
+RSS_SNIPPET = '''
+import resource, sys
+peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+# Linux reports KB, macOS reports bytes
+peak_mb = peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+print("PEAK_RSS_MB=%.1f" % peak_mb)
+'''
+
+SAMPLE_ASSESSMENT = {
+    "email": "test@example.com",
+    "ageBracket": "30-40",
+    "healthcareWorker": "No",
+    "challenges": ["stress", "anxiety"],
+    "familiarWith": ["meditation"],
+    "goals": "Find balance",
+    "focusChakra": "heartChakra",
+    "archetype": "martyr",
+    "scoredChakras": {"rootChakra": {"q1": {"score": 3}, "q2": {"score": 4}}},
+    "scoredLifeQuadrants": {"healthWellness": {"q1": {"score": 3}}},
+}
+
+# Work pushed through each route set - expects `conversion_app` / `trend_app`
+CONVERSION_WORK = '''
+import json
+client = conversion_app.test_client()
+client.get("/health")
+client.get("/model/info")
+client.post("/predict", json=json.loads(%r))
+client.post("/predict/batch", json=[json.loads(%r)] * 10)
+''' % (json.dumps(SAMPLE_ASSESSMENT), json.dumps(SAMPLE_ASSESSMENT))
+
+TREND_WORK = '''
+import numpy as np
+import pandas as pd
+import pymongo
+from forecast_models import evaluate_models, forecast_with_intervals
+history = np.random.default_rng(0).poisson(5, size=(24, 7)).astype(float)
+forecast_with_intervals("linear", history, horizon=3)
+evaluate_models(history)
+trend_app.test_client().get("/health")
+'''
+
+CONVERSION_SNIPPET = 'from ml_api import app as conversion_app\n' + CONVERSION_WORK
+TREND_SNIPPET = 'from app import app as trend_app\n' + TREND_WORK
+# One app serves both route sets
+COMBINED_SNIPPET = 'from combined_api import app as conversion_app\ntrend_app = conversion_app\n' + CONVERSION_WORK + TREND_WORK
+
+
+def run_snippet(code, cwd):
+    result = subprocess.run(
+        [sys.executable, '-c', code + RSS_SNIPPET],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        env={**os.environ, 'NODE_ENV': 'development'},
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith('PEAK_RSS_MB='):
+            return float(line.split('=', 1)[1])
+    raise RuntimeError(f"Measurement failed:\n{result.stderr[-2000:]}")
+
+
+def main():
+    print("\n" + "=" * 60)
+    print("ML SERVICES MEMORY COMPARISON (peak RSS per process)")
+    print("=" * 60)
+
+    conversion_mb = run_snippet(CONVERSION_SNIPPET, BASE_DIR)
+    trend_mb = run_snippet(TREND_SNIPPET, TREND_DIR)
+    combined_mb = run_snippet(COMBINED_SNIPPET, BASE_DIR)
+
+    separate_mb = conversion_mb + trend_mb
+    saved_mb = separate_mb - combined_mb
+
+    print(f"Conversion API (ml_api.py)      {conversion_mb:8.1f} MB")
+    print(f"Trend API (python/app.py)       {trend_mb:8.1f} MB")
+    print(f"Two processes total             {separate_mb:8.1f} MB")
+    print(f"Combined API (combined_api.py)  {combined_mb:8.1f} MB")
+    print("-" * 60)
+    print(f"Saved per worker                {saved_mb:8.1f} MB ({saved_mb / separate_mb:.0%})")
+    print("Multiply by the gunicorn worker count for the whole deployment.")
+    print("=" * 60 + "\n")
+
+
+if __name__ == '__main__':
+    main()
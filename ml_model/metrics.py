@@ -0,0 +1,187 @@
+# Request-level latency instrumentation for the ML services
+# A tiny Prometheus-style metrics registry (no extra dependency):
+# - Counter:   things that only go up (requests, predictions)
+# - Histogram: latency distributions with fixed buckets
+#
+# Everything is kept in memory per process. The registry is module-level, so
+# the combined service (combined_api.py) shares ONE registry for both route
+# sets. With several gunicorn workers, each worker exposes its own numbers on
+# /metrics - Prometheus adds them up per instance label.
+#
+# Usage:
+#   from metrics import time_stage, instrument_app
+#   instrument_app(app)                # request counters/latency + GET /metrics
+#   with time_stage('predict_proba'):  # time one stage of the request
+#       ...
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds - from sub-millisecond sklearn calls to slow Mongo reads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    inner = ','.join('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"')) for k, v in pairs)
+    return '{' + inner + '}'
+
+
+# ======================== Counter ==============================
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        return self._values.get(key, 0)
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {value}' for key, value in items]
+
+
+# ======================== Histogram ============================
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # label values -> [bucket counts..., +Inf count, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        series = self._series.get(key)
+        return sum(series[:-1]) if series else 0
+
+    def render(self):
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, ("le", bound))} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, ("le", "+Inf"))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]}')
+            lines.append(f'{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}')
+        return lines
+
+
+# ======================== Registry =============================
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def render(self):
+        # Prometheus text exposition format
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# One registry per process
+REGISTRY = MetricsRegistry()
+
+REQUESTS_TOTAL = REGISTRY.counter(
+    'ml_http_requests_total', 'HTTP requests handled', ['endpoint', 'method', 'status'])
+REQUEST_SECONDS = REGISTRY.histogram(
+    'ml_http_request_duration_seconds', 'Time to handle an HTTP request', ['endpoint'])
+STAGE_SECONDS = REGISTRY.histogram(
+    'ml_stage_duration_seconds',
+    'Time spent in each request stage (json_parse, preprocess, scaler_transform, predict_proba, mongo_fetch, trend_fit, ...)',
+    ['stage'])
+PREDICTIONS_TOTAL = REGISTRY.counter(
+    'ml_predictions_total', 'Assessments scored by the conversion model', ['endpoint'])
+
+
+@contextmanager
+def time_stage(stage):
+    # Time the body of the with-block into ml_stage_duration_seconds{stage=...}
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+# ==================== Flask integration ========================
+def instrument_app(app):
+    """
+    Count and time every request on a Flask app and serve GET /metrics.
+    The endpoint label is the matched route rule (e.g. /predict/batch),
+    so label cardinality stays bounded.
+    """
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        start = getattr(g, '_metrics_start', None)
+        if start is not None:
+            endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+            REQUESTS_TOTAL.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+    return app
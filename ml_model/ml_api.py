@@ -5,40 +5,133 @@
 
 # Endpoints
 # - Get     /health         => Check if API is running
+# - GET     /livez          => Process is up (no work at all)
+# - GET     /readyz         => Cached background self-test: model scores, MongoDB answers
 # - POST    /predict        => Get prediction for 1 assessment
 # - POST    /predict/batch  => Get prediction for multiple assessments
+#                              (?explain=1 on both adds per-feature contributions)
+# - GET     /predict/recent => Score recent assessments from MongoDB, return summary
+# - GET     /leads/top      => Best scored leads of the last N days (from the lead index)
+# - GET     /leads/buckets  => Lead count per risk bucket for the last N days
 # - GET     /model/info     => Get info about the loaded model
+# - GET     /model/online   => Online (incrementally updated) model status
+# - GET     /monitor/drift  => Feature / prediction drift vs the training data (PSI, KS)
+# - POST    /model/online/update => Learn from newly labelled assessments (X-Admin-Token)
+# - GET     /admission      => Admission control estimates (see admission_control.py)
+# - POST    /debug/profile  => Sampling profile of this worker, collapsed stacks (X-Admin-Token)
+# - POST    /debug/allocations => tracemalloc top allocations of this worker (X-Admin-Token)
+# - GET     /metrics        => Prometheus-style request/stage latency metrics
+#
+# /predict, /predict/batch and /predict/recent take an X-Request-Deadline
+# header and answer 429/503 right away when they can't make it (413 for
+# batches over the cost budget)
 
 # ====================== Import libraries ===============================
 # Flask: web framework for building APIs
-from flask import Flask, request, jsonify
+# Blueprint: group of routes we can mount on more than one app (see combined_api.py)
+from flask import Flask, Blueprint, Response, request, jsonify
 # CORS: allows Node.js to call our API
 from flask_cors import CORS
 # Our prediction service in predict_new.py
 from predict_new import ConversionPredictorService
+# Request counters/latency histograms + GET /metrics
+from metrics import instrument_app, time_stage, PREDICTIONS_TOTAL
+# orjson-backed request.json / jsonify when installed (stdlib otherwise)
+from json_provider import install_json_provider
+# ETag / 304 for rarely-changing responses + gzip for big ones
+from http_cache import conditional_json, install_compression
+# Pooled MongoDB access + projected assessment reads
+from mongo_pool import get_database
+from assessment_source import fetch_recent_assessments, to_ml_input
+# Precomputed predictions, filled in the background by scoring_worker.py
+from prediction_store import get_store
+from scoring_worker import start_scoring_worker
+from scoring_pipeline import start_pipeline
+# Sorted in-memory index over the stored predictions
+from lead_index import get_lead_index
+# Process pool for big batches (forked before any thread starts)
+import parallel_scoring
+# Incremental updates of the online logistic model (admin only)
+from admin_auth import admin_required
+from online_learning import online_status, update_online_model
+from explanations import DEFAULT_TOP as EXPLAIN_TOP
+# Deadline-aware load shedding for the scoring routes
+from admission_control import CONTROLLER as ADMISSION, admission_controlled
+# /livez + /readyz backed by a background self-test
+from health_check import SelfTest, mongo_ping, register_health_routes
+from warmup import CANNED_ASSESSMENT
+# On-demand stack sampling / allocation tracing (admin only, idle otherwise)
+from profiler import register_profiler_routes
+from datetime import datetime, timedelta
 import os
 
+# Same cut-off the admin portal uses for "high probability" leads
+HIGH_PROBABILITY = 0.7
+
+# Upper bounds for /predict/recent query params
+MAX_RECENT_DAYS = 365
+MAX_RECENT_LIMIT = 10000
+
+# ?explain=1&top=5 -> (explain, top), ValueError (-> 400) for a bad top
+def _explain_args():
+    explain = request.args.get('explain', '0').lower() in ('1', 'true', 'yes')
+    try:
+        top = int(request.args.get('top', EXPLAIN_TOP))
+    except ValueError:
+        raise ValueError('top must be an integer')
+    if top < 0:
+        raise ValueError('top must be >= 0')
+    return explain, top
+
+def _bad_explain_args(e):
+    return jsonify({
+        'success': False,
+        'error': str(e)
+    }), 400
+
+# Assessments in a /predict/batch body - the body is parsed (and timed) here,
+# the view reuses Flask's cached request.json
+def _batch_items():
+    with time_stage('json_parse'):
+        body = request.get_json(silent=True)
+    return len(body) if isinstance(body, list) else 1
+
+# Assessments /predict/recent may score
+def _recent_items():
+    try:
+        return min(int(request.args.get('limit', 50)), MAX_RECENT_LIMIT)
+    except ValueError:
+        return 1
+
 # ===================== Create Flask app =================================
 app = Flask(__name__)
 
+# All conversion routes are registered on this blueprint, then mounted on app
+conversion_bp = Blueprint('conversion', __name__)
+
 # ===================== Configure CORS for Security =======================
 # CORS (Cross-Origin Resource Sharing) controls which domains can access this API
 # In development: Allow all origins for easy testing
 # In production: Only allow requests from our deployed web app for security
+def configure_cors(flask_app):
+    if os.environ.get('NODE_ENV') == 'development':
+        # Development mode - allow all origins
+        CORS(flask_app)
+        # print("CORS: Allowing all origins (development mode)")
+    else:
+        # Production mode - only allow your specific web app URLs
+        allowed_origins = [
+            "https://graceful-living-web-application.onrender.com",  # Render URL
+            "https://coachshante.com",  # Custom domain
+            "https://www.coachshante.com"  # Custom domain with www
+        ]
+        CORS(flask_app, origins=allowed_origins)
+        # print(f"CORS: Restricted to {len(allowed_origins)} allowed origins (production mode)")
 
-if os.environ.get('NODE_ENV') == 'development':
-    # Development mode - allow all origins
-    CORS(app)
-    # print("CORS: Allowing all origins (development mode)")
-else:
-    # Production mode - only allow your specific web app URLs
-    allowed_origins = [
-        "https://graceful-living-web-application.onrender.com",  # Render URL
-        "https://coachshante.com",  # Custom domain
-        "https://www.coachshante.com"  # Custom domain with www
-    ]
-    CORS(app, origins=allowed_origins)
-    # print(f"CORS: Restricted to {len(allowed_origins)} allowed origins (production mode)")
+configure_cors(app)
+instrument_app(app)
+install_json_provider(app)
+install_compression(app)
 
 try:
     predictor = ConversionPredictorService()
@@ -48,10 +141,28 @@ except Exception as e:
 
 # ================================= API ENDPOINTS =========================
 
+# ----------- Liveness / readiness ---------------------
+# Score the canned warm-up assessment straight through the model (no drift
+# monitor, no stored predictions) and check the answer is a probability
+def score_canned_assessment():
+    if predictor is None:
+        raise RuntimeError('Model not loaded')
+    probability = float(predictor.predict_matrix(predictor.preprocess_assessment(CANNED_ASSESSMENT))[0, 1])
+    if not 0.0 <= probability <= 1.0:
+        raise ValueError(f'Canned assessment scored {probability}')
+    return {'conversion_probability': round(probability, 4), 'model_version': predictor.model_version}
+
+SELF_TEST = SelfTest()
+SELF_TEST.add_check('model_score', score_canned_assessment)
+# Only /predict/recent and the background scoring need MongoDB
+SELF_TEST.add_check('mongo', mongo_ping, critical=False)
+register_health_routes(conversion_bp, SELF_TEST)
+register_profiler_routes(conversion_bp)
+
 # ----------- Health check endpoint ---------------------
 # Check if API is running and model is loaded
-# Our app should check if ML serice is up before prediction
-@app.route('/health', methods=['GET'])
+# Kept for older callers - /livez and /readyz replace it
+@conversion_bp.route('/health', methods=['GET'])
 def health_check():
     # Check if model loaded successfully
     if predictor is None:
@@ -67,7 +178,8 @@ def health_check():
     })
 
 # -------------- Predict conversion probability - Main endpoint -------------
-@app.route('/predict', methods=['POST'])
+@conversion_bp.route('/predict', methods=['POST'])
+@admission_controlled()
 def predict_single():
     # Check if model is loaded
     if predictor is None:
@@ -77,7 +189,8 @@ def predict_single():
     
     try:
         # Get JSON data from request body
-        assessment_data = request.json # parse JSON to Python dictionary automatically
+        with time_stage('json_parse'):
+            assessment_data = request.json # parse JSON to Python dictionary automatically
 
         # Validate provided data
         if not assessment_data:
@@ -87,7 +200,12 @@ def predict_single():
             }), 400
         
         # Make prediction using predictor service
-        result = predictor.predict_conversion_probability(assessment_data)
+        try:
+            explain, top = _explain_args()
+        except ValueError as e:
+            return _bad_explain_args(e)
+        result = predictor.predict_conversion_probability(assessment_data, explain=explain, top=top)
+        PREDICTIONS_TOTAL.inc(endpoint='/predict')
 
         # Return success response with prediction
         return jsonify({
@@ -101,7 +219,8 @@ def predict_single():
             'error': str(e)
         }), 500
     
-@app.route('/predict/batch', methods=['POST'])
+@conversion_bp.route('/predict/batch', methods=['POST'])
+@admission_controlled(_batch_items, batch=True)
 def predict_batch():
     if predictor is None:
         return jsonify({
@@ -109,6 +228,7 @@ def predict_batch():
         }), 500
     
     try:
+        # Already parsed by _batch_items (admission control)
         assessments_list = request.json
 
         if not isinstance(assessments_list, list):
@@ -116,21 +236,173 @@ def predict_batch():
                 'error': 'Request must be a JSON array of assessment'
             }), 400
         
-        results = predictor.predict_batch(assessments_list)
+        # Columnar results, written to JSON straight from the arrays
+        try:
+            explain, top = _explain_args()
+        except ValueError as e:
+            return _bad_explain_args(e)
+        results = predictor.predict_batch_columnar(assessments_list, explain=explain, top=top)
+        PREDICTIONS_TOTAL.inc(len(results), endpoint='/predict/batch')
+
+        # ?format=ndjson (or Accept: application/x-ndjson) streams one prediction per line
+        if request.args.get('format') == 'ndjson' or 'application/x-ndjson' in request.headers.get('Accept', ''):
+            return Response(results.iter_ndjson(), mimetype='application/x-ndjson')
+
+        with time_stage('serialize'):
+            body = results.to_response_json()
+        return Response(body, mimetype='application/json')
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+# --------- Score recent assessments straight from MongoDB ----------------
+# GET /predict/recent?days=90&limit=50&top_k=9
+# Replaces "Node queries Mongo -> serializes -> POST /predict/batch": we read
+# the assessments ourselves, score them in one batch and only send back
+# the numbers the admin portal shows
+@conversion_bp.route('/predict/recent', methods=['GET'])
+@admission_controlled(_recent_items)
+def predict_recent():
+    if predictor is None:
+        return jsonify({
+            'error': 'Model not loaded'
+        }), 500
+
+    try:
+        days = int(request.args.get('days', 90))
+        limit = int(request.args.get('limit', 50))
+        top_k = int(request.args.get('top_k', 0))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'days, limit and top_k must be integers'
+        }), 400
+
+    if not 1 <= days <= MAX_RECENT_DAYS or not 1 <= limit <= MAX_RECENT_LIMIT or top_k < 0:
+        return jsonify({
+            'success': False,
+            'error': f'days must be 1-{MAX_RECENT_DAYS}, limit 1-{MAX_RECENT_LIMIT}, top_k >= 0'
+        }), 400
+
+    try:
+        # Read precomputed scores once the background worker has caught up
+        # with the current model, otherwise score live from MongoDB
+        store = get_store()
+        if store.has_version(predictor.model_version):
+            source = 'store'
+            since = datetime.utcnow() - timedelta(days=days)
+            results = store.recent(predictor.model_version, since, limit)
+        else:
+            source = 'live'
+            with time_stage('mongo_fetch'):
+                docs = fetch_recent_assessments(get_database(), days=days, limit=limit)
+            results = predictor.predict_batch([to_ml_input(doc) for doc in docs])
+            PREDICTIONS_TOTAL.inc(len(results), endpoint='/predict/recent')
+
+        probabilities = [r['conversion_probability'] for r in results]
+        avg_probability = sum(probabilities) / len(probabilities) if probabilities else 0
+        high_count = sum(1 for p in probabilities if p >= HIGH_PROBABILITY)
+
+        # Best leads first - same fields as /predict/batch items
+        top_leads = sorted(results, key=lambda r: r['conversion_probability'], reverse=True)[:top_k]
 
         return jsonify({
             'success': True,
+            'source': source,
+            'model_version': predictor.model_version,
+            'days': days,
             'count': len(results),
-            'predictions': results
+            'avg_conversion_probability': avg_probability,
+            'high_probability_threshold': HIGH_PROBABILITY,
+            'high_probability_count': high_count,
+            'top_leads': top_leads
         })
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
-    
+
+# --------- Lead index queries (precomputed scores only, no rescoring) -------
+# GET /leads/top?days=30&k=20&min_probability=0.7
+# GET /leads/buckets?days=30
+# Days are whole UTC calendar days, today included
+def _lead_query_args():
+    days = int(request.args.get('days', 30))
+    if not 1 <= days <= MAX_RECENT_DAYS:
+        raise ValueError(f'days must be 1-{MAX_RECENT_DAYS}')
+    return days
+
+@conversion_bp.route('/leads/top', methods=['GET'])
+def leads_top():
+    if predictor is None:
+        return jsonify({
+            'error': 'Model not loaded'
+        }), 500
+
+    try:
+        days = _lead_query_args()
+        k = int(request.args.get('k', 20))
+        min_probability = float(request.args.get('min_probability', 0))
+        if not 1 <= k <= MAX_RECENT_LIMIT:
+            raise ValueError(f'k must be 1-{MAX_RECENT_LIMIT}')
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    try:
+        with time_stage('lead_index'):
+            leads = get_lead_index(predictor.model_version).top(k, days, min_probability)
+        return jsonify({
+            'success': True,
+            'model_version': predictor.model_version,
+            'days': days,
+            'count': len(leads),
+            'leads': leads
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@conversion_bp.route('/leads/buckets', methods=['GET'])
+def leads_buckets():
+    if predictor is None:
+        return jsonify({
+            'error': 'Model not loaded'
+        }), 500
+
+    try:
+        days = _lead_query_args()
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+
+    try:
+        with time_stage('lead_index'):
+            counts = get_lead_index(predictor.model_version).bucket_counts(days)
+        return jsonify({
+            'success': True,
+            'model_version': predictor.model_version,
+            'days': days,
+            'high_probability_threshold': HIGH_PROBABILITY,
+            **counts
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 # ===================== Get model info endpoint ==========================
-@app.route('/model/info', methods=['GET'])
+@conversion_bp.route('/model/info', methods=['GET'])
 def model_info():
     if predictor is None:
         return jsonify({
@@ -143,12 +415,92 @@ def model_info():
         # Try to get from model's training history
         training_samples = getattr(predictor.model, 'n_training_samples_', 'N/A')
     
-    return jsonify({
-        'model_type': str(type(predictor.model).__name__),
+    # Only changes with the model artifacts - ETag = model version
+    return conditional_json({
+        'model_type': str(type(predictor.serving_model).__name__),
+        'model_version': predictor.model_version,
         'num_features': len(predictor.feature_names),
         'features': predictor.feature_names[:10],
         'training_samples': training_samples
-    })
+    }, f'"model-{predictor.model_version}"')
+
+# =================== Admission control ================================
+# Current cost estimates of THIS worker
+@conversion_bp.route('/admission', methods=['GET'])
+def admission_status():
+    return jsonify(ADMISSION.status())
+
+# =================== Drift monitor ====================================
+# Live inputs / predictions of THIS worker vs the training data
+@conversion_bp.route('/monitor/drift', methods=['GET'])
+def drift_report():
+    if predictor is None or predictor.drift is None:
+        return jsonify({
+            'error': 'Drift monitor not available'
+        }), 503
+
+    try:
+        report = predictor.drift.report()
+        # ?features=0 leaves out the per-feature table
+        if request.args.get('features') == '0':
+            report.pop('features')
+        return jsonify({'success': True, **report})
+    except Exception as e:
+        return jsonify({
+            'error': str(e)
+        }), 500
+
+
+@conversion_bp.route('/monitor/drift/reset', methods=['POST'])
+@admin_required
+def drift_reset():
+    if predictor is None or predictor.drift is None:
+        return jsonify({
+            'error': 'Drift monitor not available'
+        }), 503
+    predictor.drift.reset()
+    return jsonify({'success': True})
+
+# =================== Online model =====================================
+@conversion_bp.before_request
+def refresh_online_model():
+    # Pick up an online model updated by another worker / the CLI
+    if predictor is not None:
+        predictor.refresh_online_model()
+
+
+@conversion_bp.route('/model/online', methods=['GET'])
+def online_model_status():
+    try:
+        return jsonify(online_status())
+    except Exception as e:
+        return jsonify({
+            'error': str(e)
+        }), 500
+
+
+@conversion_bp.route('/model/online/update', methods=['POST'])
+@admin_required
+def online_model_update():
+    if predictor is None:
+        return jsonify({
+            'error': 'Model not loaded'
+        }), 500
+
+    try:
+        summary = update_online_model(predictor)
+        # Serve it right away in this worker (others follow within a second)
+        predictor._online_checked = 0.0
+        predictor.refresh_online_model()
+        summary['serving'] = predictor.online is not None
+        return jsonify({'success': True, **summary})
+    except Exception as e:
+        return jsonify({
+            'error': str(e)
+        }), 500
+
+# =================== Register routes =================================
+app.register_blueprint(conversion_bp)
 
 # =================== Start the API server =============================
 if __name__ == '__main__':
@@ -163,10 +515,21 @@ if __name__ == '__main__':
     # print("  GET  /health          - Health check")
     # print("  POST /predict         - Single prediction")
     # print("  POST /predict/batch   - Batch predictions")
+    # print("  GET  /predict/recent  - Score recent assessments from MongoDB")
     # print("  GET  /model/info      - Model information")
+    # print("  GET  /model/online    - Online model status")
+    # print("  GET  /monitor/drift   - Drift vs training data")
+    # print("  POST /model/online/update - Learn from new labels (X-Admin-Token)")
     # print(f"\nStarting server on http://0.0.0.0:{port}")
     # print("="*60 + "\n")
 
+    # Keep the prediction store up to date in the background and score
+    # new assessments as they arrive
+    # Batch scoring pool first - it's forked, so before any thread starts
+    parallel_scoring.start_pool(predictor)
+    start_scoring_worker(predictor)
+    start_pipeline(predictor)
+
     app.run(
         host='0.0.0.0',     # Listen to all network interfaces
         port=port,          # Use environment PORT or default 5001
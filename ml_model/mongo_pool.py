@@ -0,0 +1,75 @@
+# Shared MongoDB connection pool for the ML services
+# Both the conversion API (ml_api.py) and the trend API (python/app.py)
+# read from the same database. Instead of opening a new MongoClient on
+# every request, each process keeps ONE client (which is itself a pool
+# of connections) and hands out the database from it.
+#
+# The client is created lazily on first use, so with gunicorn preload_app
+# every forked worker builds its own pool (MongoClient is not fork-safe).
+#
+# Local load tests: ML_FAKE_MONGO=<n> swaps the database for an in-memory
+# stand-in holding n synthetic assessments (see synthetic_data.py).
+
+import os
+import threading
+
+# Repo root .env - same file the Node app and data_extraction.py use
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '.env')
+
+# Max connections per worker process
+POOL_SIZE = int(os.environ.get('ML_MONGO_POOL_SIZE', '10'))
+
+# Number of synthetic assessments for the in-memory stand-in (0 = real MongoDB)
+FAKE_MONGO_SIZE = int(os.environ.get('ML_FAKE_MONGO', '0'))
+
+_client = None
+_client_pid = None
+_fake_db = None
+_lock = threading.Lock()
+
+
+def get_client():
+    global _client, _client_pid
+
+    # A client inherited through fork belongs to the parent - build a new one
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+
+    with _lock:
+        if _client is None or _client_pid != os.getpid():
+            from pymongo import MongoClient
+            from dotenv import load_dotenv
+
+            load_dotenv(dotenv_path=ENV_PATH)
+            mongo_uri = os.getenv('MONGO_URI')
+            if not mongo_uri:
+                raise RuntimeError("MONGO_URI missing. Put it in .env")
+
+            _client = MongoClient(mongo_uri, maxPoolSize=POOL_SIZE)
+            _client_pid = os.getpid()
+
+    return _client
+
+
+def get_database():
+    global _fake_db
+
+    if FAKE_MONGO_SIZE:
+        with _lock:
+            if _fake_db is None:
+                from synthetic_data import make_fake_database, today
+                # Ending today, so /predict/recent and the scoring worker find data
+                _fake_db = make_fake_database(FAKE_MONGO_SIZE, end=today())
+        return _fake_db
+
+    # Database named in the connection string
+    return get_client().get_database()
+
+
+def close_client():
+    global _client, _client_pid
+    with _lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
@@ -0,0 +1,90 @@
+# Native thread pools (BLAS / OpenMP / joblib) per gunicorn worker
+# NumPy's OpenBLAS, sklearn's OpenMP code and a RandomForest with n_jobs
+# each size their thread pool to the machine's core count - in EVERY worker.
+# With 2 workers x 2 request threads on a small instance that is several
+# times more runnable threads than cores, and they spend the time switching
+# instead of scoring.
+#
+# Each worker gets an explicit budget instead:
+#   ML_NATIVE_THREADS   threads per native pool (default: cores / (workers x
+#                       (threads + scoring pool processes)), at least 1)
+#                       - use this rather than OMP_NUM_THREADS & co, which get overwritten
+#   ML_SCORING_PROCESSES  parallel_scoring.py pool processes per worker (default:
+#                       cores / workers) - each one runs the same native libraries
+#   ML_MODEL_N_JOBS     n_jobs of the loaded model (default 1 - one /predict row
+#                       is far too small to split across joblib workers)
+#
+# gunicorn_config.py sets the *_NUM_THREADS variables before the app is
+# preloaded (OpenBLAS sizes its pool when NumPy is imported) and calls
+# configure_worker() in post_fork, which applies the limit with threadpoolctl
+# to the libraries that are already loaded (the scoring pool is forked after
+# that, so its processes inherit the limit). The trend service's
+# gunicorn_config.py (python/) does the same, without a scoring pool.
+
+import os
+
+# Environment variables read by the native libraries when they load
+THREAD_ENV_VARS = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS',
+                   'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+
+def pool_processes(workers=1):
+    # ML_SCORING_PROCESSES, else this gunicorn worker's share of the cores.
+    # 1 turns parallel scoring off.
+    configured = os.environ.get('ML_SCORING_PROCESSES')
+    if configured:
+        return max(int(configured), 1)
+    return max((os.cpu_count() or 1) // max(workers, 1), 1)
+
+
+def native_thread_limit(workers=1, threads=1, processes=0):
+    # ML_NATIVE_THREADS, else an even share of the cores for each request
+    # thread and scoring pool process (processes: pool size per worker, 0 = none)
+    configured = os.environ.get('ML_NATIVE_THREADS')
+    if configured:
+        return max(int(configured), 1)
+    return max((os.cpu_count() or 1) // max(workers * (threads + processes), 1), 1)
+
+
+def scoring_pool_size(workers=1):
+    # Pool processes the native budget has to leave room for (0 when the pool is off)
+    processes = pool_processes(workers)
+    return processes if processes > 1 else 0
+
+
+def set_thread_env(limit, override=False):
+    # For libraries loaded later (and processes forked from here)
+    # Without override an already set variable wins
+    for name in THREAD_ENV_VARS:
+        if override or name not in os.environ:
+            os.environ[name] = str(limit)
+
+
+def limit_native_threads(limit):
+    # Resize the pools of already loaded libraries; returns {library: threads}
+    try:
+        from threadpoolctl import threadpool_info, threadpool_limits
+    except ImportError:  # comes with scikit-learn, but don't fail without it
+        return {}
+    threadpool_limits(limits=limit)
+    return {info['internal_api']: info['num_threads'] for info in threadpool_info()}
+
+
+def limit_model_jobs(predictor, n_jobs=None):
+    # joblib workers used by predict_proba (RandomForest / anything with n_jobs)
+    if predictor is None:
+        return None
+    n_jobs = n_jobs or int(os.environ.get('ML_MODEL_N_JOBS', '1'))
+    if hasattr(predictor.model, 'n_jobs'):
+        predictor.model.n_jobs = n_jobs
+    return n_jobs
+
+
+def configure_worker(predictor=None, workers=1, threads=1, processes=0):
+    # Called from gunicorn's post_fork - returns a small report for the log
+    limit = native_thread_limit(workers, threads, processes)
+    # The variables set before preload used the config file's worker count
+    set_thread_env(limit, override=True)
+    pools = limit_native_threads(limit)
+    n_jobs = limit_model_jobs(predictor)
+    return {'native_threads': limit, 'pools': pools, 'model_n_jobs': n_jobs}
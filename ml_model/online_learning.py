@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Online (incremental) updates for the logistic conversion model
+
+Retraining means data_extraction.py + train_model.py over the whole
+history. This keeps a logistic model that learns from new labels only:
+
+  - an assessment gets its label once its 90-day booking window has closed
+    (same rule as DataExtractor.check_conversion)
+  - each update reads the assessments that closed since the last update,
+    updates a running StandardScaler (partial_fit) and an SGD logistic
+    regression (partial_fit, log loss), and saves online_model.pkl
+  - with ML_ONLINE_MODEL=1 the predictor serves that model and picks up a
+    newer file within a second, in every gunicorn worker
+
+Features come from ConversionPredictorService.extract_features, like live
+predictions. Assessments whose id hashes into the holdout (1 in
+HOLDOUT_EVERY) are never trained on. At most every COMPARE_INTERVAL hours
+an update also fits a LogisticRegression from scratch on the same data and
+compares both on the holdout. The online model is flagged as drifted when
+it falls behind.
+
+    python3 online_learning.py update      # learn from newly labelled assessments
+    python3 online_learning.py compare     # force the full-retrain comparison
+    python3 online_learning.py status
+
+Same as POST /model/online/update (ML_ADMIN_TOKEN) - run it from cron.
+"""
+
+import argparse
+import fcntl
+import hashlib
+import os
+import sys
+import time
+import zlib
+from datetime import datetime, timedelta
+
+import joblib
+import numpy as np
+
+from assessment_source import ASSESSMENT_PROJECTION, to_ml_input
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Same window as DataExtractor.check_conversion
+LABEL_WINDOW_DAYS = 90
+ONLINE_MODEL_PATH = os.environ.get('ML_ONLINE_MODEL_PATH', os.path.join(BASE_DIR, 'online_model.pkl'))
+# Serve the online model instead of best_conversion_model.pkl
+SERVE_ONLINE_MODEL = os.environ.get('ML_ONLINE_MODEL', '0') == '1'
+# Hours between full-retrain comparisons
+COMPARE_INTERVAL = timedelta(hours=float(os.environ.get('ML_ONLINE_COMPARE_HOURS', '24')))
+# Drifted when the online model's holdout AUC is this far below the full retrain...
+MAX_AUC_GAP = float(os.environ.get('ML_ONLINE_MAX_AUC_GAP', '0.02'))
+# ...or their probabilities differ this much on average
+MAX_MEAN_DIFF = float(os.environ.get('ML_ONLINE_MAX_MEAN_DIFF', '0.05'))
+# 1 in HOLDOUT_EVERY assessments is kept for evaluation only
+HOLDOUT_EVERY = 10
+# Passes over the data for the very first update (the whole labelled history)
+BOOTSTRAP_EPOCHS = 5
+
+
+class OnlineModel:
+    # Running scaler + SGD logistic regression, pickled as one object
+    def __init__(self, feature_names):
+        from sklearn.linear_model import SGDClassifier
+        from sklearn.preprocessing import StandardScaler
+
+        self.feature_names = list(feature_names)
+        self.scaler = StandardScaler()
+        # Averaged SGD with a small adaptive step: the default 'optimal' schedule
+        # overshoots on small batches and gives 0/1-style probabilities
+        self.model = SGDClassifier(loss='log_loss', alpha=1e-4, learning_rate='adaptive', eta0=0.01,
+                                   average=True, random_state=0)
+        self.classes_ = np.array([0, 1])
+        self.class_counts = np.zeros(2, dtype=np.int64)
+        # Assessments created up to here have been learned from
+        self.labelled_until = None
+        self.samples_seen = 0
+        self.updates = 0
+        self.updated_at = None
+        self.last_comparison = None
+
+    @property
+    def version(self):
+        # Hash of what the scores depend on (SGD weights + running scaler), so
+        # a recreated or retrained model never matches an older version's
+        # stored predictions, and every update that moves a weight rescores
+        if not self.samples_seen:
+            return "online-empty"
+        digest = hashlib.sha256()
+        for part in (self.model.coef_, self.model.intercept_, self.scaler.mean_, self.scaler.scale_):
+            digest.update(np.ascontiguousarray(part, dtype=np.float64).tobytes())
+        return f"online-{digest.hexdigest()[:12]}"
+
+    def partial_update(self, X, y, epochs=1):
+        # Learn from one batch of labelled rows (X: feature table in feature_names order)
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.int64)
+        self.class_counts += np.bincount(y, minlength=2)
+        self.scaler.partial_fit(X)
+        X_scaled = self.scaler.transform(X)
+
+        # class_weight='balanced' like train_model.py, from the running class counts
+        counts = np.maximum(self.class_counts, 1)
+        weights = (self.class_counts.sum() / (2.0 * counts))[y]
+
+        rng = np.random.RandomState(self.updates)
+        for _ in range(epochs):
+            order = rng.permutation(len(y))
+            self.model.partial_fit(X_scaled[order], y[order], classes=self.classes_,
+                                   sample_weight=weights[order])
+        self.samples_seen += len(y)
+
+    def predict_proba(self, X):
+        # X: unscaled feature table, like Float32Model.predict_proba
+        # Same numbers as self.model.predict_proba, but each row is summed on
+        # its own: a BLAS matrix product rounds differently with the batch
+        # size and memory layout, and a row must score the same in any batch
+        # (or parallel_scoring chunk)
+        from scipy.special import expit
+
+        X_scaled = np.ascontiguousarray(self.scaler.transform(np.ascontiguousarray(X, dtype=np.float64)))
+        decision = (X_scaled * self.model.coef_[0]).sum(axis=1) + self.model.intercept_[0]
+        positive = expit(decision)
+        return np.column_stack([1 - positive, positive])
+
+
+# ======================== Labelled data ========================
+def is_holdout(doc):
+    return zlib.crc32(str(doc['_id']).encode()) % HOLDOUT_EVERY == 0
+
+
+def fetch_labelled(db, since, until):
+    # Assessments created in (since, until] with their 0/1 conversion label
+    query = {'createdAt': {'$lte': until}}
+    if since is not None:
+        query['createdAt']['$gt'] = since
+    projection = dict(ASSESSMENT_PROJECTION, _id=1)
+    docs = list(db.chakraassessments.find(query, projection).sort('createdAt', 1))
+    if not docs:
+        return [], np.empty(0, dtype=np.int64)
+
+    # Appointments that could fall in any of these windows, by lowercase email
+    first = docs[0]['createdAt']
+    booked = {}
+    appointments = db.appointments.find(
+        {'createdAt': {'$gte': first, '$lte': until + timedelta(days=LABEL_WINDOW_DAYS)}},
+        {'clientEmail': 1, 'createdAt': 1})
+    for appointment in appointments:
+        email = (appointment.get('clientEmail') or '').lower()
+        booked.setdefault(email, []).append(appointment['createdAt'])
+
+    labels = np.zeros(len(docs), dtype=np.int64)
+    for row, doc in enumerate(docs):
+        start = doc['createdAt']
+        end = start + timedelta(days=LABEL_WINDOW_DAYS)
+        times = booked.get((doc.get('email') or '').lower(), ())
+        labels[row] = any(start <= t <= end for t in times)
+    return docs, labels
+
+
+def feature_table(predictor, docs, feature_names):
+    import pandas as pd
+    rows = [predictor.extract_features(to_ml_input(doc)) for doc in docs]
+    return pd.DataFrame(rows).reindex(columns=feature_names, fill_value=0).to_numpy(dtype=np.float64)
+
+
+# ======================== Model file ========================
+def load_online_model(path=ONLINE_MODEL_PATH):
+    return joblib.load(path) if os.path.exists(path) else None
+
+
+def save_online_model(online, path=ONLINE_MODEL_PATH):
+    # Write then rename, so a worker never loads a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(online, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def model_mtime(path=ONLINE_MODEL_PATH):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+# ======================== Update / compare ========================
+def update_online_model(predictor, db=None, path=ONLINE_MODEL_PATH, now=None):
+    # Learn from assessments whose window closed since the last update
+    from mongo_pool import get_database
+
+    started = time.perf_counter()
+    db = db if db is not None else get_database()
+
+    # One update at a time (cron + admin endpoint) - otherwise both would learn the same rows
+    with open(f"{path}.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return _update_locked(predictor, db, path, now, started)
+
+
+def _update_locked(predictor, db, path, now, started):
+    online = load_online_model(path) or OnlineModel(predictor.feature_names)
+    first_update = online.samples_seen == 0
+
+    until = (now or datetime.utcnow()) - timedelta(days=LABEL_WINDOW_DAYS)
+    docs, labels = fetch_labelled(db, online.labelled_until, until)
+    train = np.array([not is_holdout(doc) for doc in docs], dtype=bool)
+
+    trained = int(train.sum())
+    if trained and (online.samples_seen or len(set(labels[train])) > 1):
+        X = feature_table(predictor, [doc for doc, keep in zip(docs, train) if keep], online.feature_names)
+        online.partial_update(X, labels[train], epochs=BOOTSTRAP_EPOCHS if first_update else 1)
+        online.updates += 1
+    else:
+        # First update needs both classes before SGD has anything to learn
+        trained = 0
+    if trained or online.samples_seen:
+        online.labelled_until = until
+    online.updated_at = datetime.utcnow()
+
+    comparison = None
+    last = online.last_comparison
+    if online.samples_seen and (last is None or online.updated_at - last['at'] >= COMPARE_INTERVAL):
+        comparison = online.last_comparison = compare_with_full_retrain(predictor, online, db)
+
+    save_online_model(online, path)
+    return {
+        'new_labelled': len(docs),
+        'trained_on': trained,
+        'held_out': len(docs) - int(train.sum()),
+        'positives': int(labels.sum()),
+        'samples_seen': online.samples_seen,
+        'labelled_until': online.labelled_until.isoformat() if online.labelled_until else None,
+        'model_version': online.version,
+        'seconds': round(time.perf_counter() - started, 3),
+        'comparison': comparison,
+    }
+
+
+def compare_with_full_retrain(predictor, online, db):
+    # Fit LogisticRegression from scratch on everything the online model has
+    # seen and compare both on the holdout assessments
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.metrics import roc_auc_score
+    from sklearn.preprocessing import StandardScaler
+
+    docs, labels = fetch_labelled(db, None, online.labelled_until)
+    holdout = np.array([is_holdout(doc) for doc in docs], dtype=bool)
+    report = {'at': datetime.utcnow(), 'train_rows': int((~holdout).sum()),
+              'holdout_rows': int(holdout.sum()), 'drifted': None}
+    if len(set(labels[~holdout])) < 2 or len(set(labels[holdout])) < 2:
+        report['note'] = 'need both classes in train and holdout'
+        return report
+
+    X = feature_table(predictor, docs, online.feature_names)
+    scaler = StandardScaler().fit(X[~holdout])
+    full = LogisticRegression(max_iter=1000, class_weight='balanced').fit(scaler.transform(X[~holdout]), labels[~holdout])
+
+    proba_full = full.predict_proba(scaler.transform(X[holdout]))[:, 1]
+    proba_online = online.predict_proba(X[holdout])[:, 1]
+    difference = np.abs(proba_full - proba_online)
+
+    report.update({
+        'auc_full': float(roc_auc_score(labels[holdout], proba_full)),
+        'auc_online': float(roc_auc_score(labels[holdout], proba_online)),
+        'mean_probability_diff': float(difference.mean()),
+        'max_probability_diff': float(difference.max()),
+    })
+    report['drifted'] = bool(report['auc_full'] - report['auc_online'] > MAX_AUC_GAP
+                             or report['mean_probability_diff'] > MAX_MEAN_DIFF)
+    if report['drifted']:
+        print(f"Online model drifted from a full retrain: {report} - run train_model.py")
+    return report
+
+
+def online_status(path=ONLINE_MODEL_PATH):
+    online = load_online_model(path)
+    if online is None:
+        return {'exists': False, 'serving': SERVE_ONLINE_MODEL}
+    comparison = dict(online.last_comparison) if online.last_comparison else None
+    if comparison:
+        comparison['at'] = comparison['at'].isoformat()
+    return {
+        'exists': True,
+        'serving': SERVE_ONLINE_MODEL,
+        'model_version': online.version,
+        'samples_seen': online.samples_seen,
+        'class_counts': online.class_counts.tolist(),
+        'updates': online.updates,
+        'labelled_until': online.labelled_until.isoformat() if online.labelled_until else None,
+        'updated_at': online.updated_at.isoformat() if online.updated_at else None,
+        'last_comparison': comparison,
+    }
+
+
+def main():
+    import json
+    from predict_new import ConversionPredictorService
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['update', 'compare', 'status'])
+    args = parser.parse_args()
+
+    if args.command == 'status':
+        print(json.dumps(online_status(), indent=2))
+        return
+
+    predictor = ConversionPredictorService()
+    if args.command == 'update':
+        print(json.dumps(update_online_model(predictor), indent=2, default=str))
+        return
+
+    from mongo_pool import get_database
+    online = load_online_model()
+    if online is None or not online.samples_seen:
+        print("No online model yet - run 'update' first")
+        sys.exit(1)
+    online.last_comparison = compare_with_full_retrain(predictor, online, get_database())
+    save_online_model(online)
+    print(json.dumps(online.last_comparison, indent=2, default=str))
+
+
+if __name__ == '__main__':
+    # Go through the importable module so the pickle says online_learning.OnlineModel, not __main__
+    import online_learning
+    online_learning.main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Determinism check + speedup curve for parallel batch scoring
+
+Scores the same seeded synthetic batch with 1, 2, ... N pool processes
+(see parallel_scoring.py), checks every run gives exactly the same
+probabilities as the single-process path, and prints the speedup.
+
+    python3 parallel_benchmark.py                      # 20k assessments, 1..cpu_count processes
+    python3 parallel_benchmark.py --size 50000 --max-processes 8
+    python3 parallel_benchmark.py --json curve.json    # also save the numbers
+
+Exits 1 if any run differs from the single-process result.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import parallel_scoring
+import synthetic_data
+
+
+def load_predictor():
+    from predict_new import ConversionPredictorService
+    cwd = os.getcwd()
+    os.chdir(BASE_DIR)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return ConversionPredictorService()
+    finally:
+        os.chdir(cwd)
+
+
+def time_run(fn, repeats):
+    # Best of `repeats` wall-clock runs (seconds) + the last result
+    best, result = None, None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', type=int, default=20000, help='assessments per batch (default 20000)')
+    parser.add_argument('--max-processes', type=int, default=os.cpu_count() or 1,
+                        help='largest pool to try (default: cpu count)')
+    parser.add_argument('--repeats', type=int, default=3, help='runs per pool size, best one counts')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', help='write the curve to this file')
+    args = parser.parse_args()
+
+    predictor = load_predictor()
+    payloads = [synthetic_data.to_ml_payload(a) for a in synthetic_data.make_assessments(args.size, seed=args.seed)]
+    rows = [predictor.extract_features(p) for p in payloads]
+
+    print("\n" + "=" * 64)
+    print(f"PARALLEL SCORING - {args.size} assessments, cpu_count={os.cpu_count()}")
+    print("=" * 64)
+    print(f"{'processes':>10}{'chunks':>8}{'seconds':>10}{'rows/s':>12}{'speedup':>10}{'identical':>12}")
+    print("-" * 64)
+
+    serial_seconds, expected = time_run(lambda: predictor.predict_probabilities(rows), args.repeats)
+    curve = [{'processes': 1, 'chunks': 1, 'seconds': serial_seconds, 'speedup': 1.0, 'identical': True}]
+    print(f"{1:>10}{1:>8}{serial_seconds:>10.3f}{args.size / serial_seconds:>12.0f}{1.0:>10.2f}{'yes':>12}")
+
+    failed = False
+    for processes in range(2, args.max_processes + 1):
+        # Start the pool outside the timing - gunicorn workers keep theirs
+        parallel_scoring.start_pool(predictor, processes)
+        parallel_scoring.predict_probabilities(predictor, rows[:parallel_scoring.MIN_CHUNK_ROWS * processes])
+
+        seconds, result = time_run(
+            lambda: parallel_scoring.predict_probabilities(predictor, rows), args.repeats)
+        identical = bool(np.array_equal(result, expected))
+        failed = failed or not identical
+        chunks = len(parallel_scoring.split_rows(len(rows), processes))
+        speedup = serial_seconds / seconds
+        curve.append({'processes': processes, 'chunks': chunks, 'seconds': seconds,
+                      'speedup': speedup, 'identical': identical})
+        print(f"{processes:>10}{chunks:>8}{seconds:>10.3f}{args.size / seconds:>12.0f}"
+              f"{speedup:>10.2f}{'yes' if identical else 'NO':>12}")
+
+    # Whole batch path too (bad-item skipping, PredictionBatch), with an odd size
+    # so the last chunk is short
+    odd = payloads[:parallel_scoring.PARALLEL_MIN_BATCH + 123]
+    serial_batch = predictor.predict_batch_columnar(odd)
+    pool_processes = max(args.max_processes, 2)
+    parallel_scoring.start_pool(predictor, pool_processes)
+    parallel_batch = predictor.predict_batch_columnar(odd)
+    batch_identical = parallel_batch.to_response_json() == serial_batch.to_response_json()
+    failed = failed or not batch_identical
+    print("-" * 64)
+    print(f"predict_batch_columnar ({len(odd)} items, {pool_processes} processes): "
+          f"{'identical' if batch_identical else 'DIFFERENT'} response")
+
+    parallel_scoring.shutdown_pool(wait=True)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'size': args.size, 'cpu_count': os.cpu_count(), 'curve': curve,
+                       'batch_identical': batch_identical}, f, indent=2)
+        print(f"Curve saved to {args.json}")
+    print("=" * 64 + "\n")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
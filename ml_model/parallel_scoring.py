@@ -0,0 +1,178 @@
+# Parallel scoring for very large batches
+# A /predict/batch request runs inside one gunicorn worker thread, so a
+# 50k-assessment backfill uses one core while the rest sit idle.
+#
+# Batches of at least PARALLEL_MIN_BATCH assessments are split into chunks
+# and scored on a process pool:
+#
+#   request thread: extract features -> one feature table -> split into chunks
+#   pool processes: scaler.transform + predict_proba per chunk
+#   request thread: stitch the chunks back together in order
+#
+# The pool is forked once per gunicorn worker, in post_fork before the
+# worker starts any thread (start_pool), so every pool process starts with
+# the predictor already in memory (shared copy-on-write with the gunicorn
+# worker, nothing is pickled or loaded again) and no lock can be inherited
+# in a held state. Only the feature chunks (n x 38 floats), the online
+# model when it's served (small, and it changes at runtime) and the
+# probabilities travel between processes.
+#
+# Pool processes score with scale_features + model_proba only: no metrics,
+# no drift monitor, nothing that takes a lock. If the pool breaks or a
+# batch takes longer than PARALLEL_TIMEOUT, the worker scores in-process
+# until gunicorn recycles it - forking again from a threaded worker is
+# exactly what start_pool avoids.
+#
+# Every row is scored on its own, so the result is identical to the
+# single-process path whatever the chunking (test_parallel_scoring.py checks).
+
+import atexit
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import pandas as pd
+
+from metrics import REGISTRY, time_stage
+# Pool size (ML_SCORING_PROCESSES) - lives with the native thread budget, which counts it
+from native_threads import pool_processes
+
+# Smaller batches are scored in the request thread - below this the
+# chunk round trips cost more than they save
+PARALLEL_MIN_BATCH = int(os.environ.get('ML_PARALLEL_MIN_BATCH', '2000'))
+# Don't split into chunks smaller than this
+MIN_CHUNK_ROWS = int(os.environ.get('ML_PARALLEL_MIN_CHUNK', '500'))
+# Give up on the pool (and score in-process) after this many seconds,
+# well before gunicorn's worker timeout
+PARALLEL_TIMEOUT = float(os.environ.get('ML_PARALLEL_TIMEOUT', '60'))
+
+PARALLEL_BATCHES = REGISTRY.counter(
+    'ml_parallel_batches_total', 'Batches scored on the process pool', ['result'])
+
+# Pool state (per process - a pool can't be used across fork)
+_pool = None
+_pool_pid = None
+_pool_processes = 0
+_pool_predictor = None
+
+# Set inside pool processes
+_worker_predictor = None
+
+
+# ======================== Pool processes ========================
+def _init_worker(predictor):
+    # With fork the predictor arrives as the parent's object, not a pickle
+    global _worker_predictor
+    _worker_predictor = predictor
+
+
+def _ready(_):
+    return os.getpid()
+
+
+def _score_chunk(values, online):
+    # Lock-free path: no time_stage, no drift monitor (the request thread does both)
+    if online is not None:
+        return online.predict_proba(values)
+    X = pd.DataFrame(values, columns=_worker_predictor.feature_names)
+    return _worker_predictor.model_proba(_worker_predictor.scale_features(X))
+
+
+# ======================== Pool ========================
+def start_pool(predictor, processes=None):
+    """
+    Fork the pool processes now. Call it before this process starts any
+    thread (gunicorn post_fork, before the scoring worker / pipeline /
+    self-test); otherwise the pool isn't created and batches are scored
+    in-process. Returns the number of pool processes (0 when off).
+    """
+    global _pool, _pool_pid, _pool_processes, _pool_predictor
+    processes = processes or pool_processes()
+    shutdown_pool(wait=True)
+    if processes < 2:
+        return 0
+    if threading.active_count() > 1:
+        print(f"Parallel scoring off: {threading.active_count()} threads running, not forking a pool")
+        return 0
+
+    pool = ProcessPoolExecutor(
+        max_workers=processes,
+        mp_context=multiprocessing.get_context('fork'),
+        initializer=_init_worker,
+        initargs=(predictor,),
+    )
+    # With fork every pool process is started on the first submit, before
+    # the executor's own threads - do it here, not in a request thread
+    list(pool.map(_ready, range(processes)))
+    _pool = pool
+    _pool_pid = os.getpid()
+    _pool_processes = processes
+    _pool_predictor = predictor
+    return processes
+
+
+def shutdown_pool(wait=False):
+    global _pool, _pool_predictor
+    # A pool inherited through fork belongs to the parent - just forget it
+    if _pool is not None and _pool_pid == os.getpid():
+        if not wait:
+            # a hung pool process would block shutdown - stop them outright
+            for process in list((getattr(_pool, '_processes', None) or {}).values()):
+                process.terminate()
+        _pool.shutdown(wait=wait, cancel_futures=True)
+    _pool = None
+    _pool_predictor = None
+
+
+atexit.register(shutdown_pool)
+
+
+def pool_ready(predictor):
+    # This process's own pool, started for this predictor
+    return _pool is not None and _pool_pid == os.getpid() and _pool_predictor is predictor
+
+
+def use_pool(predictor, n_rows):
+    # Only when the pool is up and it can actually help
+    return pool_ready(predictor) and n_rows >= PARALLEL_MIN_BATCH
+
+
+def split_rows(n_rows, processes):
+    # (start, stop) per chunk: one chunk per process, MIN_CHUNK_ROWS at least
+    size = max(MIN_CHUNK_ROWS, math.ceil(n_rows / processes))
+    return [(start, min(start + size, n_rows)) for start in range(0, n_rows, size)]
+
+
+# ======================== Scoring ========================
+def predict_probabilities(predictor, feature_rows):
+    # Drop-in for predictor.predict_probabilities(feature_rows), chunks scored in parallel
+    with time_stage('preprocess'):
+        X = pd.DataFrame(feature_rows).reindex(columns=predictor.feature_names, fill_value=0)
+    return predict_matrix(predictor, X)
+
+
+def predict_matrix(predictor, X):
+    # Drop-in for predictor.predict_matrix(X) (in-process when the pool isn't up)
+    if not pool_ready(predictor):
+        return predictor.predict_matrix(X)
+    values = np.asarray(X, dtype=np.float64)
+    online = predictor.online
+
+    chunks = [values[start:stop] for start, stop in split_rows(len(values), _pool_processes)]
+    try:
+        with time_stage('parallel_predict'):
+            # map() hands results back in submission order
+            parts = list(_pool.map(_score_chunk, chunks, [online] * len(chunks), timeout=PARALLEL_TIMEOUT))
+    except (BrokenProcessPool, TimeoutError) as e:
+        # A pool process died (OOM killer...) or hung - score here from now on
+        print(f"Parallel scoring failed ({type(e).__name__}: {e}), scoring in-process until restart")
+        PARALLEL_BATCHES.inc(result='fallback')
+        shutdown_pool()
+        return predictor.predict_matrix(X)
+
+    PARALLEL_BATCHES.inc(result='ok')
+    return np.concatenate(parts) if parts else np.empty((0, 2))
@@ -4,9 +4,35 @@
 
 # Import libraries
 import os
+import hashlib
+import time
 import joblib
-import pandas as pd
 import numpy as np
+# Stage timings exported on /metrics
+from metrics import time_stage
+# Columnar batch results
+from prediction_batch import PredictionBatch
+# Process pool for very large batches
+import parallel_scoring
+# Flattened trees (same probabilities as sklearn, far less per-call overhead)
+from tree_compiler import load_compiled
+# Opt-in float32 inference (ML_INFERENCE_PRECISION=float32)
+from float32_mode import load_float32
+# Online logistic model updated from new labels
+from online_learning import SERVE_ONLINE_MODEL, load_online_model, model_mtime as online_model_mtime
+# Feature / prediction drift against the training data
+from drift_monitor import build_monitor
+# Per-prediction feature attributions (?explain=1)
+from explanations import DEFAULT_TOP as EXPLAIN_TOP, build_explainer, explain_rows
+
+# Set ML_COMPILED_TREES=0 to always use sklearn's predict_proba
+USE_COMPILED_TREES = os.environ.get('ML_COMPILED_TREES', '1') != '0'
+# Above about this many rows sklearn's own C loop is faster (see benchmark.py)
+COMPILED_MAX_ROWS = int(os.environ.get('ML_COMPILED_MAX_ROWS', '1000'))
+# Seconds between checks for a newer online model file
+ONLINE_CHECK_INTERVAL = 1.0
+# pandas is imported inside preprocess_assessment - gunicorn_config.py
+# imports it during warm-up (warmup.py) so requests never pay for it
 
 # ================================== Conversion prediction service class =============================
 # This class handles loading the trained model and making prediction
@@ -22,19 +48,67 @@ class ConversionPredictorService:
         self.features_path = os.path.join(base_dir, features_path)
 
         # Load trained model
-        self.model = joblib.load(model_path)
+        self.model = joblib.load(self.model_path)
 
         # Load scaler
-        self.scaler = joblib.load(scaler_path)
+        self.scaler = joblib.load(self.scaler_path)
 
         # Load feature names
-        self.feature_names = joblib.load(features_path)
+        self.feature_names = joblib.load(self.features_path)
+
+        # Model version = hash of the three pickles, so retraining (or a new
+        # scaler) gives a new version and stored predictions get rescored
+        self.model_version = self._hash_files([self.model_path, self.scaler_path, self.features_path])
+
+        # Flattened copy of the trees for inference (None -> sklearn is used)
+        self.compiled = None
+        if USE_COMPILED_TREES:
+            self.compiled = load_compiled(self.model, self.model_path, len(self.feature_names))
+
+        # Float32 scaler + trees, only if it passes the accuracy check (None -> float64)
+        self.float32 = load_float32(self)
+        if self.float32 is not None:
+            # Different numbers than float64 -> stored predictions get rescored
+            self.model_version += '-f32'
+        # Version of the pickles alone - the online model's version is added to it
+        self.base_version = self.model_version
+
+        # Incrementally updated logistic model (online_learning.py), served when ML_ONLINE_MODEL=1
+        self.online = None
+        self._online_mtime = None
+        self._online_checked = 0.0
+        self.refresh_online_model()
+
+        # Live inputs / predictions vs the training data (None -> off)
+        self.drift = build_monitor(self)
+
+        # (model_version, explainer) - built on first ?explain=1 for each model version
+        self._explainer = (None, None)
 
         # Signal done loading model
         print("Model loaded successfully")
 
     # ============================ Preprocess assessment ================================
     def preprocess_assessment(self, assessment_data):
+        # One assessment -> one-row DataFrame in training column order
+        return self.preprocess_batch([assessment_data])
+
+    def preprocess_batch(self, assessments_list):
+        import pandas as pd
+
+        # Build every row first, then ONE DataFrame for the whole batch
+        # (creating a DataFrame per assessment was most of the batch time)
+        df = pd.DataFrame([self.extract_features(a) for a in assessments_list])
+
+        # Ensure all features present (missing ones = 0) and reorder cols
+        # to match training feature order
+        df = df.reindex(columns=self.feature_names, fill_value=0)
+
+        # Return preprocessed df ready for prediction
+        return df
+
+    # Turn one assessment into a {feature name: value} dictionary
+    def extract_features(self, assessment_data):
         # Dictionary to hold features
         features = {}
 
@@ -152,32 +226,20 @@ class ConversionPredictorService:
             if col.startswith('archetype_'):
                 archetype_value = col.replace('archetype_', '')
                 features[col] = 1 if archetype == archetype_value else 0
-        
-        # ------------------------------ Create DataFrame --------------------------------
-        df = pd.DataFrame([features])
-        
-        # Ensure all features present
-        for feature in self.feature_names:
-            if feature not in df.columns:
-                df[feature] = 0
-        
-        # Reorder cols to match training feature order
-        df = df[self.feature_names]
 
-        # Return preprocessed df ready for prediction
-        return df
+        return features
     
     # =============================== Prediction method ===================================
-    def predict_conversion_probability(self, assessment_data):
+    def predict_conversion_probability(self, assessment_data, explain=False, top=EXPLAIN_TOP):
         # Step 1: preprocess data
-        X = self.preprocess_assessment(assessment_data)
-
-        # Step 2: scale the features
-        X_scaled = self.scaler.transform(X) # Use transform (not fit_transform) bcz fit_transfrom for training data, not for new data
+        with time_stage('preprocess'):
+            X = self.preprocess_assessment(assessment_data)
 
-        # Step 3: make prediction
-        prediction = self.model.predict(X_scaled)[0]        # Return binary
-        probability = self.model.predict_proba(X_scaled)[0] # Return [proba_class_0, proba_class_1]
+        # Step 2 + 3: scale the features and make prediction (predict_matrix)
+        probabilities = self.predict_matrix(X)
+        self.observe_drift(X, probabilities, [assessment_data])
+        probability = probabilities[0]                               # Return [proba_class_0, proba_class_1]
+        prediction = self.model.classes_[np.argmax(probability)]   # Return binary (same as model.predict)
 
         # Step 4: package results in friendly format
         result = {
@@ -194,8 +256,20 @@ class ConversionPredictorService:
             'risk_level': self._get_risk_level(probability[1])
         }
 
+        # Optional: which features pushed the probability up / down
+        if explain:
+            result['explanation'] = self.explain(X, top)[0]
+
         return result
     
+    # Short sha256 of file contents
+    def _hash_files(self, paths):
+        digest = hashlib.sha256()
+        for path in paths:
+            with open(path, 'rb') as f:
+                digest.update(f.read())
+        return digest.hexdigest()[:12]
+
     # --------------------- Helper function ____________________
     # Because raw probability is difficult for non-tech people to act on
     # Risk level like High (70%+) very likely to book appt
@@ -212,27 +286,166 @@ class ConversionPredictorService:
             return "Low - Unlikely to book without intervention"
     
     # ====================== Multiple prediction at once ============================
-    # This can handle multiple new assessment result (no overhead of looping thru each data)
+    # Preprocess the whole list into one matrix, then ONE scaler.transform and
+    # ONE predict_proba call for all rows (no per-assessment model overhead)
 
     def predict_batch (self, assessments_list):
-        results = []
-
-        # Loop thru each assessment in a list
-        for assessment in assessments_list:
-            try:
-                # Get prediction for this assessment
-                result = self.predict_conversion_probability(assessment)
-
-                # Add email to result so we track which one is which
-                result['email'] = assessment.get('email', 'unknown')
-
-                # Add result to the list
-                results.append(result)
-            except Exception as e:
-                print(f"ERROR predicting for assessment: {e}")
-                continue
-        
-        return results
+        # List of result dicts (same fields as predict_conversion_probability + email)
+        return self.predict_batch_columnar(assessments_list).to_records()
+
+    # Same predictions as a PredictionBatch (NumPy columns, see prediction_batch.py)
+    # - cheaper to keep in memory and to serialize for big batches
+    def predict_batch_columnar(self, assessments_list, explain=False, top=EXPLAIN_TOP):
+        # Extract features one by one so a single bad assessment is skipped,
+        # not the whole batch
+        import pandas as pd
+
+        rows = []
+        scored = []
+        with time_stage('extract_features'):
+            for assessment in assessments_list:
+                try:
+                    rows.append(self.extract_features(assessment))
+                    # Keep the assessment (email, drift monitor) so we track which one is which
+                    scored.append(assessment)
+                except Exception as e:
+                    print(f"ERROR predicting for assessment: {e}")
+                    continue
+
+        if not rows:
+            return PredictionBatch.from_proba(np.empty((0, 2)), self.model.classes_, [])
+
+        with time_stage('preprocess'):
+            X = pd.DataFrame(rows).reindex(columns=self.feature_names, fill_value=0)
+
+        if parallel_scoring.use_pool(self, len(rows)):
+            # Big backfill: score chunks on the process pool
+            probabilities = parallel_scoring.predict_matrix(self, X)
+        else:
+            probabilities = self.predict_matrix(X)
+
+        self.observe_drift(X, probabilities, scored)
+        emails = [assessment.get('email', 'unknown') for assessment in scored]
+        batch = PredictionBatch.from_proba(probabilities, self.model.classes_, emails)
+        if explain:
+            batch.explanations = self.explain(X, top)
+        return batch
+
+    # ======================== Explanations ========================
+    # Explainer for the serving model (explanations.py), None if unsupported
+    def get_explainer(self):
+        version, explainer = self._explainer
+        if version != self.model_version:
+            # New model (or online update): expected values are computed once here
+            explainer = build_explainer(self)
+            self._explainer = (self.model_version, explainer)
+        return explainer
+
+    # One explanation dict per row of the feature table X
+    def explain(self, X, top=EXPLAIN_TOP):
+        explainer = self.get_explainer()
+        if explainer is None:
+            raise ValueError(f"Explanations not supported for {type(self.serving_model).__name__}")
+        with time_stage('explain'):
+            return explain_rows(explainer, X, top)
+
+    # Feed the drift monitor (drift_monitor.py) - live predictions only
+    def observe_drift(self, X, probabilities, assessments):
+        if self.drift is not None:
+            with time_stage('drift_monitor'):
+                self.drift.observe(X, probabilities[:, 1], assessments)
+
+    # Conversion probability (class 1) for a list of feature dictionaries
+    def predict_probabilities(self, feature_rows):
+        import pandas as pd
+
+        with time_stage('preprocess'):
+            X = pd.DataFrame(feature_rows).reindex(columns=self.feature_names, fill_value=0)
+
+        return self.predict_matrix(X)
+
+    # Same as predict_probabilities but for an already built feature table
+    # (DataFrame, or 2-D array with columns in feature_names order)
+    def predict_matrix(self, X):
+        import pandas as pd
+
+        online = self.online
+        if online is not None:
+            # Online logistic model: its own running scaler + SGD weights
+            with time_stage('predict_proba'):
+                return online.predict_proba(X)
+
+        if not isinstance(X, pd.DataFrame):
+            # The scaler was fitted on a DataFrame - keep the column names
+            X = pd.DataFrame(X, columns=self.feature_names)
+
+        with time_stage('scaler_transform'):
+            X_scaled = self.scale_features(X) # Use transform (not fit_transform) bcz fit_transfrom for training data, not for new data
+
+        with time_stage('predict_proba'):
+            probability = self.model_proba(X_scaled)
+
+        # Return [proba_class_0, proba_class_1] per row
+        return probability
+
+    # Model actually answering predictions (the online model when it's served)
+    @property
+    def serving_model(self):
+        online = self.online
+        return online.model if online is not None else self.model
+
+    # Switch to a newer online_model.pkl (ML_ONLINE_MODEL=1)
+    # Cheap enough for every request: at most one stat() per second
+    def refresh_online_model(self):
+        if not SERVE_ONLINE_MODEL:
+            return False
+        now = time.monotonic()
+        if now - self._online_checked < ONLINE_CHECK_INTERVAL:
+            return False
+        self._online_checked = now
+
+        mtime = online_model_mtime()
+        if mtime is None or mtime == self._online_mtime:
+            return False
+        self._online_mtime = mtime
+        online = load_online_model()
+        if online is None or not online.samples_seen or online.feature_names != list(self.feature_names):
+            print("Online model not usable (empty or different features) - keeping the current model")
+            return False
+
+        # One attribute swap, so a request never mixes two models
+        self.online = online
+        # Served model + the files it sits on ('-f32' suffix included)
+        self.model_version = f"{online.version}+{self.base_version}"
+        return True
+
+    # scaler.transform (float32 parameters in float32 mode)
+    def scale_features(self, X):
+        if self.float32 is not None:
+            return self.float32.scaler.transform(X)
+        return self.scaler.transform(X)
+
+    # predict_proba through the flattened trees when available (small batches)
+    def model_proba(self, X_scaled):
+        if self.float32 is not None:
+            # Every batch size, so one assessment always gets the same score
+            return self.float32.compiled.predict_proba(X_scaled)
+        if self.compiled is not None and len(X_scaled) <= COMPILED_MAX_ROWS:
+            return self.compiled.predict_proba(X_scaled)
+        return self.model.predict_proba(X_scaled)
+
+    # Package one row of predict_proba output
+    def format_result(self, probability, email=None):
+        result = {
+            # model.predict() picks the class with the highest probability
+            'will_convert': bool(self.model.classes_[np.argmax(probability)]),
+            'conversion_probability': float(probability[1]),
+            'confidence': float(max(probability)),
+            'risk_level': self._get_risk_level(probability[1])
+        }
+        if email is not None:
+            result['email'] = email
+        return result
     
 
 #######################################
@@ -0,0 +1,131 @@
+# Columnar result for batch predictions
+# predict_batch used to build one dict per assessment, each holding its own
+# copy of a long risk_level string ("Medium - May book with followup"), and
+# jsonify then walked all of them. For big batches PredictionBatch keeps the
+# same information as a few NumPy arrays:
+#
+#   probability   float64   conversion probability (class 1)
+#   will_convert  bool      model.predict() label
+#   confidence    float64   max class probability
+#   risk_code     uint8     index into RISK_LEVELS
+#   email_code    uint32    index into the interned `emails` table
+#
+# and writes JSON / NDJSON straight from them. to_records() gives the old
+# list of dicts for callers that still want it.
+# With ?explain=1 `explanations` holds one explanation dict per row
+# (explanations.py) and every item gets an "explanation" field.
+
+import json
+
+import numpy as np
+
+# Same labels and thresholds as ConversionPredictorService._get_risk_level
+RISK_LEVELS = (
+    "High - Very likely to book",
+    "Medium-High - Likely to book",
+    "Medium - May book with followup",
+    "Low - Unlikely to book without intervention",
+)
+RISK_THRESHOLDS = (0.7, 0.5, 0.3)
+
+# Each risk label encoded to JSON once
+_RISK_JSON = tuple(json.dumps(level) for level in RISK_LEVELS)
+# Same compact separators as the rest of the hand-built body
+_COMPACT = (',', ':')
+
+
+def risk_codes(probability):
+    # 0 = High ... 3 = Low, vectorized version of _get_risk_level
+    probability = np.asarray(probability)
+    codes = np.full(probability.shape, len(RISK_LEVELS) - 1, dtype=np.uint8)
+    # Walk from the lowest threshold up so higher buckets overwrite lower ones
+    for code in range(len(RISK_THRESHOLDS) - 1, -1, -1):
+        codes[probability >= RISK_THRESHOLDS[code]] = code
+    return codes
+
+
+class PredictionBatch:
+    def __init__(self, probability, will_convert, confidence, risk_code, email_code, emails):
+        self.probability = probability
+        self.will_convert = will_convert
+        self.confidence = confidence
+        self.risk_code = risk_code
+        self.email_code = email_code
+        self.emails = emails
+        # Set by predict_batch_columnar(explain=True)
+        self.explanations = None
+
+    @classmethod
+    def from_proba(cls, proba, classes, emails):
+        # proba: predict_proba output (n x 2), classes: model.classes_, emails: one per row
+        proba = np.asarray(proba, dtype=np.float64).reshape(-1, 2)
+        probability = proba[:, 1].copy()
+
+        # Intern emails: repeated addresses share one table entry
+        table, index = [], {}
+        email_code = np.empty(len(emails), dtype=np.uint32)
+        for row, email in enumerate(emails):
+            code = index.get(email)
+            if code is None:
+                code = index[email] = len(table)
+                table.append(email)
+            email_code[row] = code
+
+        return cls(
+            probability=probability,
+            will_convert=np.asarray(classes)[np.argmax(proba, axis=1)].astype(bool),
+            confidence=proba.max(axis=1),
+            risk_code=risk_codes(probability),
+            email_code=email_code,
+            emails=table,
+        )
+
+    def __len__(self):
+        return len(self.probability)
+
+    def nbytes(self):
+        # Array memory (the email table is counted separately by callers if needed)
+        return sum(a.nbytes for a in (self.probability, self.will_convert, self.confidence,
+                                      self.risk_code, self.email_code))
+
+    # ======================== Output ========================
+    def to_records(self):
+        # Same list of dicts predict_batch always returned
+        records = [{
+            'will_convert': bool(label),
+            'conversion_probability': float(probability),
+            'confidence': float(confidence),
+            'risk_level': RISK_LEVELS[code],
+            'email': self.emails[email],
+        } for probability, label, confidence, code, email in zip(
+            self.probability.tolist(), self.will_convert.tolist(), self.confidence.tolist(),
+            self.risk_code.tolist(), self.email_code.tolist())]
+        if self.explanations is not None:
+            for record, explanation in zip(records, self.explanations):
+                record['explanation'] = explanation
+        return records
+
+    def _json_items(self):
+        # One JSON object per row; floats use repr() exactly like json.dumps
+        emails = [json.dumps(email) for email in self.emails]
+        explanations = self.explanations or [None] * len(self)
+        for probability, label, confidence, code, email, explanation in zip(
+                self.probability.tolist(), self.will_convert.tolist(), self.confidence.tolist(),
+                self.risk_code.tolist(), self.email_code.tolist(), explanations):
+            extra = '' if explanation is None else f'"explanation":{json.dumps(explanation, sort_keys=True, separators=_COMPACT)},'
+            yield (f'{{"confidence":{confidence!r},"conversion_probability":{probability!r},'
+                   f'"email":{emails[email]},{extra}"risk_level":{_RISK_JSON[code]},'
+                   f'"will_convert":{"true" if label else "false"}}}')
+
+    def to_json(self):
+        # JSON array of prediction objects
+        return '[' + ','.join(self._json_items()) + ']'
+
+    def to_response_json(self):
+        # Full /predict/batch response body
+        return f'{{"count":{len(self)},"predictions":{self.to_json()},"success":true}}'
+
+    def iter_ndjson(self):
+        # One prediction per line - lets big responses stream
+        for item in self._json_items():
+            yield item + '\n'
@@ -0,0 +1,208 @@
+# Persisted conversion predictions
+# One row per (assessment _id, model version) in a local SQLite file, so the
+# admin portal can read precomputed scores instead of rescoring the same
+# assessments on every view. Filled by scoring_worker.py.
+#
+# Each model version also keeps a watermark: the (updatedAt, _id) of the
+# last assessment already scored with it, in the order the worker reads
+# them. A new model version starts without a watermark, so everything gets
+# rescored automatically.
+#
+# Deleted assessments are removed with delete_assessments(); each removal
+# is also written to `removals` so the per-process lead indexes can drop
+# them too (lead_index.py tails it like it tails scored_at).
+
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+# Store location (one file per deploy - predictions can always be rebuilt)
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'predictions.sqlite3')
+STORE_PATH = os.environ.get('ML_PREDICTION_DB', DEFAULT_PATH)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS predictions (
+    assessment_id TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    email TEXT,
+    created_at TEXT,
+    updated_at TEXT,
+    conversion_probability REAL NOT NULL,
+    will_convert INTEGER NOT NULL,
+    confidence REAL NOT NULL,
+    risk_level TEXT NOT NULL,
+    scored_at TEXT NOT NULL,
+    PRIMARY KEY (assessment_id, model_version)
+);
+CREATE INDEX IF NOT EXISTS idx_predictions_created ON predictions (model_version, created_at);
+CREATE INDEX IF NOT EXISTS idx_predictions_scored ON predictions (model_version, scored_at, assessment_id);
+CREATE TABLE IF NOT EXISTS watermarks (
+    model_version TEXT PRIMARY KEY,
+    updated_at TEXT NOT NULL,
+    assessment_id TEXT
+);
+CREATE TABLE IF NOT EXISTS removals (
+    assessment_id TEXT NOT NULL,
+    model_version TEXT NOT NULL,
+    removed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_removals_removed ON removals (model_version, removed_at);
+"""
+
+# Rows per DELETE statement (SQLite's bound-parameter limit is 999 on old builds)
+DELETE_CHUNK = 500
+# How long removals are kept for the lead indexes (an index that hasn't
+# refreshed for longer rebuilds from scratch, see lead_index.py)
+REMOVAL_RETENTION = timedelta(days=1)
+
+
+def _iso(value):
+    # datetimes are stored as ISO text so they sort and compare correctly
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+class PredictionStore:
+    def __init__(self, path=STORE_PATH):
+        self.path = path
+        # sqlite3 connections can't be shared between threads - one per thread
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            # Stores created before the compound watermark
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(watermarks)')}
+            if 'assessment_id' not in columns:
+                conn.execute('ALTER TABLE watermarks ADD COLUMN assessment_id TEXT')
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        # A connection inherited through fork belongs to the parent
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30)
+            # WAL lets request threads read while the worker writes
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    # ======================== Writes ========================
+    def upsert_many(self, model_version, rows):
+        # rows: dicts with assessment_id, email, created_at, updated_at + predictor result fields
+        scored_at = datetime.utcnow().isoformat()
+        with self._connect() as conn:
+            conn.executemany(
+                """INSERT OR REPLACE INTO predictions
+                   (assessment_id, model_version, email, created_at, updated_at,
+                    conversion_probability, will_convert, confidence, risk_level, scored_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(str(row['assessment_id']), model_version, row.get('email'),
+                  _iso(row.get('created_at')), _iso(row.get('updated_at')),
+                  row['conversion_probability'], int(row['will_convert']),
+                  row['confidence'], row['risk_level'], scored_at)
+                 for row in rows]
+            )
+
+    def set_watermark(self, model_version, updated_at, assessment_id=None):
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO watermarks (model_version, updated_at, assessment_id) '
+                         'VALUES (?, ?, ?)',
+                         (model_version, _iso(updated_at), None if assessment_id is None else str(assessment_id)))
+
+    def prune_other_versions(self, model_version):
+        # Drop predictions made by older models once the current one has caught up
+        with self._connect() as conn:
+            conn.execute('DELETE FROM predictions WHERE model_version != ?', (model_version,))
+            conn.execute('DELETE FROM watermarks WHERE model_version != ?', (model_version,))
+            conn.execute('DELETE FROM removals WHERE model_version != ?', (model_version,))
+
+    def delete_assessments(self, assessment_ids):
+        # Forget deleted assessments (every model version); returns rows removed
+        ids = [str(assessment_id) for assessment_id in assessment_ids]
+        now = datetime.utcnow()
+        removed_at = now.isoformat()
+        removed = 0
+        with self._connect() as conn:
+            conn.execute('DELETE FROM removals WHERE removed_at < ?', ((now - REMOVAL_RETENTION).isoformat(),))
+            for start in range(0, len(ids), DELETE_CHUNK):
+                chunk = ids[start:start + DELETE_CHUNK]
+                marks = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f'SELECT assessment_id, model_version FROM predictions WHERE assessment_id IN ({marks})',
+                    chunk).fetchall()
+                if not rows:
+                    continue
+                conn.execute(f'DELETE FROM predictions WHERE assessment_id IN ({marks})', chunk)
+                conn.executemany('INSERT INTO removals (assessment_id, model_version, removed_at) VALUES (?, ?, ?)',
+                                 [(assessment_id, version, removed_at) for assessment_id, version in rows])
+                removed += len(rows)
+        return removed
+
+    # ======================== Reads ========================
+    def get_watermark(self, model_version):
+        # (updatedAt, assessment _id as text or None) of the last scored assessment, or None
+        row = self._connect().execute(
+            'SELECT updated_at, assessment_id FROM watermarks WHERE model_version = ?',
+            (model_version,)).fetchone()
+        return (datetime.fromisoformat(row[0]), row[1]) if row else None
+
+    def assessment_ids(self, model_version):
+        # Every assessment _id (as text) with a stored prediction
+        rows = self._connect().execute(
+            'SELECT assessment_id FROM predictions WHERE model_version = ?', (model_version,)).fetchall()
+        return {row[0] for row in rows}
+
+    def removed_since(self, model_version, removed_at):
+        # (assessment_id, removed_at) removed at or after `removed_at` - feeds lead_index.py
+        return self._connect().execute(
+            """SELECT assessment_id, removed_at FROM removals
+               WHERE model_version = ? AND removed_at >= ?
+               ORDER BY removed_at""",
+            (model_version, removed_at)).fetchall()
+
+    def has_version(self, model_version):
+        # True once the worker finished at least one full pass for this model
+        return self.get_watermark(model_version) is not None
+
+    def count(self, model_version):
+        return self._connect().execute(
+            'SELECT COUNT(*) FROM predictions WHERE model_version = ?', (model_version,)).fetchone()[0]
+
+    def scored_since(self, model_version, scored_at, assessment_id='', limit=5000):
+        # Rows (re)scored after (scored_at, assessment_id), oldest first - feeds
+        # lead_index.py. A whole batch shares one scored_at, so pages continue
+        # from the last row's id like the (updatedAt, _id) watermark
+        return self._connect().execute(
+            """SELECT assessment_id, email, created_at, conversion_probability, scored_at
+               FROM predictions
+               WHERE model_version = ? AND (scored_at, assessment_id) > (?, ?)
+               ORDER BY scored_at, assessment_id LIMIT ?""",
+            (model_version, scored_at, assessment_id, limit)).fetchall()
+
+    def recent(self, model_version, since, limit):
+        # Newest `limit` predictions for assessments created since `since`
+        rows = self._connect().execute(
+            """SELECT email, conversion_probability, will_convert, confidence, risk_level
+               FROM predictions
+               WHERE model_version = ? AND created_at >= ?
+               ORDER BY created_at DESC LIMIT ?""",
+            (model_version, _iso(since), limit)).fetchall()
+        return [{
+            'email': email,
+            'conversion_probability': probability,
+            'will_convert': bool(will_convert),
+            'confidence': confidence,
+            'risk_level': risk_level,
+        } for email, probability, will_convert, confidence, risk_level in rows]
+
+
+# ======================== Shared instance ========================
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PredictionStore()
+    return _store
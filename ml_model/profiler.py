@@ -0,0 +1,246 @@
+# On-demand profiling of a live worker (admin only)
+#   POST /debug/profile?seconds=10&mode=wall|cpu&interval_ms=5
+#       samples the Python stacks of every thread in THIS worker and returns
+#       them as collapsed stacks ("root;caller;callee count" per line), ready
+#       for flamegraph.pl, speedscope or inferno
+#   POST /debug/allocations?seconds=10&top=25
+#       traces allocations with tracemalloc for the window and returns the
+#       lines that allocated the most (plus collapsed stacks weighted by bytes)
+#
+# Nothing runs until one of the endpoints is called: no profiler hook, no
+# tracemalloc, no background thread. The request thread itself takes the
+# samples (sys._current_frames) and tracemalloc is stopped again when the
+# window ends, so normal traffic pays nothing.
+#
+# mode=wall counts every sample of every thread (where time goes, waiting
+# included). mode=cpu weights each sample by the CPU time the thread used
+# since the previous sample (/proc/self/task/<tid>/stat, Linux only), so idle
+# threads drop out.
+#
+# A profile occupies one request thread for its duration and only sees the
+# worker that answered; with several gunicorn workers call it a few times.
+
+import math
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Longest window (gunicorn's timeout is 120 s)
+MAX_SECONDS = 60
+DEFAULT_INTERVAL_MS = 5
+MAX_STACK_DEPTH = 128
+# Only one profile / trace per process at a time
+_busy = threading.Lock()
+# CPU ticks per second in /proc stat files
+_CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+# ======================== Stack sampling ========================
+def _location(filename, lineno):
+    # "predict_new.py:356" - ';' separates frames in collapsed stacks
+    return f"{os.path.basename(filename)}:{lineno}".replace(';', ':')
+
+
+def _frame_label(filename, function, lineno):
+    # "predict_matrix (predict_new.py:356)"
+    return f"{function.replace(';', ':')} ({_location(filename, lineno)})"
+
+
+def _stack(frame):
+    # Root-first labels for one thread's current Python stack
+    labels = []
+    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        labels.append(_frame_label(code.co_filename, code.co_name, code.co_firstlineno))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _thread_cpu_ticks(native_id):
+    # utime + stime of one thread, None when unavailable (not Linux)
+    try:
+        with open(f'/proc/self/task/{native_id}/stat') as f:
+            # Field 2 (comm) may contain spaces - split after its closing ')'
+            fields = f.read().rsplit(')', 1)[1].split()
+        return int(fields[11]) + int(fields[12])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def sample_stacks(seconds, interval=DEFAULT_INTERVAL_MS / 1000, mode='wall'):
+    # {collapsed stack: weight} for every thread except the caller
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running in this worker")
+    try:
+        me = threading.get_ident()
+        counts = Counter()
+        last_ticks = {}
+        samples = 0
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            threads = {t.ident: t for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                thread = threads.get(ident)
+                name = thread.name if thread is not None else f'thread-{ident}'
+
+                weight = 1
+                if mode == 'cpu':
+                    native_id = getattr(thread, 'native_id', None)
+                    ticks = _thread_cpu_ticks(native_id) if native_id else None
+                    previous = last_ticks.get(ident)
+                    last_ticks[ident] = ticks
+                    if ticks is None or previous is None:
+                        continue
+                    # CPU time (in ms) used since the last sample goes to this stack
+                    weight = (ticks - previous) * 1000 // _CLOCK_TICKS
+                    if weight <= 0:
+                        continue
+
+                counts[';'.join([f'thread:{name}'] + _stack(frame))] += weight
+            samples += 1
+            time.sleep(interval)
+        return counts, samples
+    finally:
+        _busy.release()
+
+
+def collapsed(counts):
+    # Brendan Gregg's folded format, heaviest stacks first
+    return ''.join(f'{stack} {count}\n' for stack, count in counts.most_common())
+
+
+def top_functions(counts, top=20):
+    # Leaf frames with the most weight ("self" time)
+    leaves = Counter()
+    for stack, count in counts.items():
+        leaves[stack.rsplit(';', 1)[-1]] += count
+    total = sum(leaves.values()) or 1
+    return [{'function': name, 'weight': count, 'share': round(count / total, 4)}
+            for name, count in leaves.most_common(top)]
+
+
+# ======================== Allocations ========================
+def trace_allocations(seconds, top=25, frames=10):
+    # tracemalloc for `seconds`: biggest growth by line + byte-weighted stacks
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running in this worker")
+    try:
+        # Someone else (e.g. PYTHONTRACEMALLOC) already traces - leave it running
+        started_here = not tracemalloc.is_tracing()
+        if started_here:
+            tracemalloc.start(frames)
+        try:
+            ignore = [tracemalloc.Filter(False, tracemalloc.__file__),
+                      tracemalloc.Filter(False, __file__),
+                      tracemalloc.Filter(False, '<frozen importlib._bootstrap>')]
+            before = tracemalloc.take_snapshot().filter_traces(ignore)
+            tracemalloc.reset_peak()
+            time.sleep(seconds)
+            after = tracemalloc.take_snapshot().filter_traces(ignore)
+            current, peak = tracemalloc.get_traced_memory()
+        finally:
+            if started_here:
+                tracemalloc.stop()
+
+        by_line = after.compare_to(before, 'lineno')
+        lines = [{
+            'location': _location(stat.traceback[0].filename, stat.traceback[0].lineno),
+            'size_diff_kb': round(stat.size_diff / 1024, 1),
+            'count_diff': stat.count_diff,
+            'size_kb': round(stat.size / 1024, 1),
+        } for stat in by_line[:top]]
+
+        # Bytes still held at the end that were allocated during the window
+        stacks = Counter()
+        for stat in after.compare_to(before, 'traceback'):
+            if stat.size_diff > 0:
+                # Traceback frames are oldest first, like collapsed stacks
+                labels = [_location(f.filename, f.lineno) for f in stat.traceback]
+                stacks[';'.join(labels)] += stat.size_diff
+
+        return {
+            'seconds': seconds,
+            'traced_current_kb': round(current / 1024, 1),
+            'traced_peak_kb': round(peak / 1024, 1),
+            'top_allocations': lines,
+            'collapsed': collapsed(stacks),
+        }
+    finally:
+        _busy.release()
+
+
+# ======================== Flask routes ========================
+def _number_arg(request, name, default):
+    # float query param; ValueError (-> 400) for text and nan / inf, which
+    # get through min/max clamps and time.sleep() rejects
+    value = float(request.args.get(name, default))
+    if not math.isfinite(value):
+        raise ValueError(f'{name} must be a finite number')
+    return value
+
+
+def _window_seconds(request):
+    # ?seconds=, clamped to (0.1, MAX_SECONDS)
+    return min(max(_number_arg(request, 'seconds', 10), 0.1), MAX_SECONDS)
+
+
+def register_profiler_routes(target):
+    # /debug/profile + /debug/allocations on a Flask app or blueprint (X-Admin-Token)
+    from flask import Response, jsonify, request
+    from admin_auth import admin_required
+
+    @target.route('/debug/profile', methods=['POST'])
+    @admin_required
+    def debug_profile():
+        try:
+            seconds = _window_seconds(request)
+            interval = max(_number_arg(request, 'interval_ms', DEFAULT_INTERVAL_MS), 1) / 1000
+            mode = request.args.get('mode', 'wall')
+        except ValueError:
+            return jsonify({'error': 'seconds and interval_ms must be finite numbers'}), 400
+        if mode not in ('wall', 'cpu'):
+            return jsonify({'error': "mode must be 'wall' or 'cpu'"}), 400
+
+        try:
+            counts, samples = sample_stacks(seconds, interval, mode)
+        except ProfilerBusy as e:
+            return jsonify({'error': str(e)}), 409
+
+        # ?format=json adds a per-function summary; default is the plain folded file
+        if request.args.get('format') == 'json':
+            return jsonify({
+                'mode': mode, 'seconds': seconds, 'samples': samples, 'pid': os.getpid(),
+                'top_functions': top_functions(counts),
+                'collapsed': collapsed(counts),
+            })
+        response = Response(collapsed(counts), mimetype='text/plain')
+        response.headers['X-Profile-Samples'] = str(samples)
+        response.headers['X-Profile-Pid'] = str(os.getpid())
+        return response
+
+    @target.route('/debug/allocations', methods=['POST'])
+    @admin_required
+    def debug_allocations():
+        try:
+            seconds = _window_seconds(request)
+            top = max(int(request.args.get('top', 25)), 1)
+        except ValueError:
+            return jsonify({'error': 'seconds must be a finite number and top an integer'}), 400
+
+        try:
+            report = trace_allocations(seconds, top)
+        except ProfilerBusy as e:
+            return jsonify({'error': str(e)}), 409
+        return jsonify({'pid': os.getpid(), **report})
+
+    return target
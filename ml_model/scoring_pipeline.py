@@ -0,0 +1,264 @@
+# Real-time scoring pipeline for new assessments
+# Follows chakraassessments as they are written and scores them within
+# about PIPELINE_MAX_WAIT seconds, instead of waiting for the next
+# scoring_worker.py pass or for an admin to open the dashboard.
+#
+#   source (change stream / polling) -> micro-batch -> predictor -> prediction store
+#
+# - Change stream: needs a replica set (Atlas is one). Inserts, updates and
+#   replaces arrive with the full document; deletes remove the assessment's
+#   predictions from the store right away.
+# - Polling fallback: standalone MongoDB or the ML_FAKE_MONGO stand-in.
+#   Follows updatedAt (set on insert and update by mongoose timestamps).
+#   It can't see deletes - scoring_worker.py's periodic prune handles those.
+#
+# A micro-batch is published when it holds PIPELINE_MAX_BATCH assessments
+# or its oldest assessment has waited PIPELINE_MAX_WAIT seconds, whichever
+# comes first. Lag and throughput go to /metrics (on the worker process
+# that holds the pipeline lock).
+
+import os
+import threading
+import time
+from datetime import datetime
+
+from assessment_source import ASSESSMENT_PROJECTION
+from metrics import REGISTRY
+from mongo_pool import get_database
+from prediction_store import get_store
+from scoring_worker import acquire_store_lock, score_documents
+
+# Publish a micro-batch at this many assessments...
+PIPELINE_MAX_BATCH = int(os.environ.get('ML_PIPELINE_MAX_BATCH', '100'))
+# ...or once its oldest assessment has waited this long (seconds)
+PIPELINE_MAX_WAIT = float(os.environ.get('ML_PIPELINE_MAX_WAIT', '0.5'))
+# How often the polling fallback queries for new documents (seconds)
+POLL_INTERVAL = float(os.environ.get('ML_PIPELINE_POLL_INTERVAL', '1.0'))
+# Set ML_SCORING_PIPELINE=0 to turn the pipeline off
+PIPELINE_ENABLED = os.environ.get('ML_SCORING_PIPELINE', '1') != '0'
+
+# Fields the predictor needs + updatedAt for lag
+PROJECTION = dict(ASSESSMENT_PROJECTION, updatedAt=1)
+
+# ======================== Metrics ========================
+LAG_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+PIPELINE_EVENTS = REGISTRY.counter(
+    'ml_pipeline_events_total', 'Assessments received by the scoring pipeline', ['source'])
+PIPELINE_SCORED = REGISTRY.counter(
+    'ml_pipeline_scored_total', 'Assessments scored and published by the pipeline')
+PIPELINE_ERRORS = REGISTRY.counter(
+    'ml_pipeline_errors_total', 'Pipeline source or publish errors', ['stage'])
+PIPELINE_BATCH_SIZE = REGISTRY.histogram(
+    'ml_pipeline_batch_size', 'Assessments per published micro-batch',
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500))
+PIPELINE_QUEUE_SECONDS = REGISTRY.histogram(
+    'ml_pipeline_queue_seconds', 'Time from receiving an assessment to publishing its score',
+    buckets=LAG_BUCKETS)
+PIPELINE_LAG_SECONDS = REGISTRY.histogram(
+    'ml_pipeline_end_to_end_seconds', 'Time from the assessment write (updatedAt) to its published score',
+    buckets=LAG_BUCKETS)
+
+
+# ======================== Sources ========================
+class ChangeStreamSource:
+    name = 'change_stream'
+
+    def __init__(self, collection, resume_token=None):
+        pipeline = [{'$match': {'operationType': {'$in': ['insert', 'update', 'replace', 'delete']}}}]
+        self.stream = collection.watch(
+            pipeline, full_document='updateLookup', resume_after=resume_token,
+            max_await_time_ms=int(PIPELINE_MAX_WAIT * 1000))
+        # _ids of deleted assessments not handed to the pipeline yet
+        self.deleted = []
+
+    @property
+    def resume_token(self):
+        return self.stream.resume_token
+
+    def poll(self, timeout):
+        # Whatever arrives within `timeout` seconds (try_next waits at most max_await_time_ms)
+        docs = []
+        deadline = time.monotonic() + timeout
+        while len(docs) < PIPELINE_MAX_BATCH:
+            change = self.stream.try_next()
+            if change is not None and change.get('operationType') == 'delete':
+                self.deleted.append(change['documentKey']['_id'])
+            elif change is not None:
+                doc = change.get('fullDocument')
+                if doc:  # None when the document was deleted before the lookup
+                    docs.append({key: doc.get(key) for key in list(PROJECTION) + ['_id']})
+            elif time.monotonic() >= deadline:
+                break
+        return docs
+
+    def take_deleted(self):
+        deleted, self.deleted = self.deleted, []
+        return deleted
+
+    def close(self):
+        self.stream.close()
+
+
+class PollingSource:
+    name = 'polling'
+
+    def __init__(self, collection, after=None):
+        self.collection = collection
+        # Start at the newest existing updatedAt - older ones belong to scoring_worker.py
+        if after is None:
+            newest = list(collection.find({}, {'updatedAt': 1}).sort('updatedAt', -1).limit(1))
+            after = (newest[0].get('updatedAt') if newest else None, set())
+        # (updatedAt watermark, _ids already seen at exactly that time)
+        self.watermark, self.seen = after
+        if self.watermark is not None:
+            self.seen = self.seen or {d['_id'] for d in collection.find({'updatedAt': self.watermark}, {'_id': 1})}
+        self.next_poll = 0.0
+
+    @property
+    def resume_token(self):
+        return (self.watermark, set(self.seen))
+
+    def poll(self, timeout):
+        # Sleep until the next poll (or the timeout) then read anything written since the watermark
+        wait = self.next_poll - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            if wait > timeout:
+                return []
+        self.next_poll = time.monotonic() + POLL_INTERVAL
+
+        # $gte + seen-set, like scoring_worker.py: several writes can share one updatedAt
+        query = {'updatedAt': {'$gte': self.watermark}} if self.watermark is not None else {}
+        docs = self.collection.find(query, PROJECTION).sort('updatedAt', 1).limit(PIPELINE_MAX_BATCH + len(self.seen))
+        docs = [d for d in docs if not (d.get('updatedAt') == self.watermark and d['_id'] in self.seen)]
+        docs = docs[:PIPELINE_MAX_BATCH]
+        for doc in docs:
+            if doc.get('updatedAt') != self.watermark:
+                self.watermark, self.seen = doc.get('updatedAt'), set()
+            self.seen.add(doc['_id'])
+        return docs
+
+    def take_deleted(self):
+        return []
+
+    def close(self):
+        pass
+
+
+def open_source(collection, resume_token=None):
+    # Change stream when the server supports it, otherwise poll
+    if hasattr(collection, 'watch'):
+        try:
+            return ChangeStreamSource(collection, resume_token)
+        except Exception as e:
+            # e.g. standalone server: "The $changeStream stage is only supported on replica sets"
+            print(f"Scoring pipeline: change stream unavailable ({e}), polling instead")
+    # A change-stream token means nothing to the poller - start from the newest write
+    return PollingSource(collection, resume_token if isinstance(resume_token, tuple) else None)
+
+
+# ======================== Pipeline ========================
+class ScoringPipeline(threading.Thread):
+    def __init__(self, predictor, db=None, store=None):
+        super().__init__(name='scoring-pipeline', daemon=True)
+        self.predictor = predictor
+        self.db = db
+        self.store = store
+        self.stop_event = threading.Event()
+        self._lock_file = None
+        self.pid = os.getpid()
+
+    def publish(self, batch):
+        # batch: [(document, time received)]
+        docs = [doc for doc, _ in batch]
+        rows = score_documents(self.predictor, docs)
+        self.store.upsert_many(self.predictor.model_version, rows)
+
+        now = time.monotonic()
+        wall_now = datetime.utcnow()
+        PIPELINE_SCORED.inc(len(rows))
+        PIPELINE_BATCH_SIZE.observe(len(batch))
+        for doc, received in batch:
+            PIPELINE_QUEUE_SECONDS.observe(now - received)
+            written = doc.get('updatedAt') or doc.get('createdAt')
+            if isinstance(written, datetime):
+                PIPELINE_LAG_SECONDS.observe(max((wall_now - written).total_seconds(), 0.0))
+
+    def run_once(self, source, batch):
+        # One poll + maybe one publish; returns the batch still waiting
+        if batch:
+            timeout = max(PIPELINE_MAX_WAIT - (time.monotonic() - batch[0][1]), 0.0)
+        else:
+            timeout = PIPELINE_MAX_WAIT
+
+        docs = source.poll(timeout)
+        received = time.monotonic()
+
+        deleted = source.take_deleted()
+        if deleted:
+            # An update still waiting in the batch would bring it back
+            gone = set(deleted)
+            batch = [(doc, at) for doc, at in batch if doc['_id'] not in gone]
+            try:
+                self.store.delete_assessments(deleted)
+            except Exception as e:
+                PIPELINE_ERRORS.inc(stage='delete')
+                print(f"Scoring pipeline delete error: {e}")
+        PIPELINE_EVENTS.inc(len(docs), source=source.name)
+        batch.extend((doc, received) for doc in docs)
+
+        if batch and (len(batch) >= PIPELINE_MAX_BATCH or time.monotonic() - batch[0][1] >= PIPELINE_MAX_WAIT):
+            try:
+                self.publish(batch)
+            except Exception as e:
+                PIPELINE_ERRORS.inc(stage='publish')
+                print(f"Scoring pipeline publish error: {e}")
+            return []
+        return batch
+
+    def run(self):
+        # Only one process per store follows the stream
+        while self._lock_file is None and not self.stop_event.is_set():
+            self._lock_file = acquire_store_lock('pipeline')
+            if self._lock_file is None:
+                self.stop_event.wait(60)
+
+        self.db = self.db if self.db is not None else get_database()
+        self.store = self.store or get_store()
+
+        resume_token = None
+        while not self.stop_event.is_set():
+            source = None
+            try:
+                source = open_source(self.db.chakraassessments, resume_token)
+                print(f"Scoring pipeline: following new assessments ({source.name})")
+                batch = []
+                while not self.stop_event.is_set():
+                    batch = self.run_once(source, batch)
+                    resume_token = source.resume_token
+            except Exception as e:
+                # Lost the stream / Mongo down - reopen from the last position
+                PIPELINE_ERRORS.inc(stage='source')
+                print(f"Scoring pipeline source error: {e}")
+                self.stop_event.wait(5)
+            finally:
+                if source is not None:
+                    source.close()
+
+    def stop(self):
+        self.stop_event.set()
+
+
+_pipeline = None
+
+
+def start_pipeline(predictor):
+    # Call once per process AFTER forking (gunicorn post_fork, or __main__)
+    global _pipeline
+    if not PIPELINE_ENABLED or predictor is None:
+        return None
+    if _pipeline is None or not _pipeline.is_alive() or _pipeline.pid != os.getpid():
+        _pipeline = ScoringPipeline(predictor)
+        _pipeline.start()
+    return _pipeline
@@ -0,0 +1,199 @@
+# Background scoring of new / changed assessments (write-behind)
+# Every SCORING_INTERVAL seconds: read assessments past the store watermark
+# for the current model version, score them in bulk and write the results
+# to prediction_store.py. When the model version changes there is no
+# watermark yet, so the first pass rescores everything.
+#
+# Assessments are read in (updatedAt, _id) order and the watermark is the
+# last pair scored, so a bulk import with thousands of documents sharing
+# one updatedAt is still paged through chunk by chunk.
+#
+# Every PRUNE_INTERVAL seconds the worker also compares the stored _ids
+# with the collection and removes predictions of deleted assessments
+# (the pipeline removes them right away when it has a change stream).
+#
+# With several gunicorn workers only one of them scores: the worker thread
+# takes a non-blocking file lock next to the store, the others just retry.
+
+import fcntl
+import os
+import threading
+import time
+from datetime import datetime
+
+from bson import ObjectId
+
+from assessment_source import ASSESSMENT_PROJECTION, to_ml_input
+from metrics import time_stage
+from mongo_pool import get_database
+from prediction_store import get_store
+
+# Seconds between scoring passes
+SCORING_INTERVAL = float(os.environ.get('ML_SCORING_INTERVAL', '60'))
+
+# Assessments per Mongo read / predict_proba call
+SCORING_CHUNK = int(os.environ.get('ML_SCORING_CHUNK', '500'))
+
+# Set ML_SCORING_WORKER=0 to turn background scoring off
+SCORING_ENABLED = os.environ.get('ML_SCORING_WORKER', '1') != '0'
+
+# Seconds between passes that drop predictions of deleted assessments
+PRUNE_INTERVAL = float(os.environ.get('ML_SCORING_PRUNE_INTERVAL', '3600'))
+
+# Anything older than this counts as "never scored"
+EPOCH = datetime(1970, 1, 1)
+
+
+# ====================== One scoring pass ======================
+def score_documents(predictor, docs):
+    # Mongo documents -> store rows (bad documents are skipped, like predict_batch)
+    rows, kept = [], []
+    for doc in docs:
+        try:
+            rows.append(predictor.extract_features(to_ml_input(doc)))
+            kept.append(doc)
+        except Exception as e:
+            print(f"ERROR scoring assessment {doc.get('_id')}: {e}")
+    if not rows:
+        return []
+
+    probabilities = predictor.predict_probabilities(rows)
+    results = []
+    for doc, probability in zip(kept, probabilities):
+        result = predictor.format_result(probability, doc.get('email') or '')
+        result['assessment_id'] = doc['_id']
+        result['created_at'] = doc.get('createdAt')
+        result['updated_at'] = doc.get('updatedAt')
+        results.append(result)
+    return results
+
+
+def _object_id(text):
+    # _ids are stored as text; Mongo compares ObjectIds, not their strings
+    return ObjectId(text) if ObjectId.is_valid(text) else text
+
+
+def _after(updated_at, assessment_id):
+    # Everything after (updatedAt, _id) in the worker's read order
+    if assessment_id is None:
+        return {'updatedAt': {'$gt': updated_at}}
+    return {'$or': [{'updatedAt': {'$gt': updated_at}},
+                    {'updatedAt': updated_at, '_id': {'$gt': assessment_id}}]}
+
+
+def score_pending(predictor, db=None, store=None, chunk=SCORING_CHUNK):
+    # Score everything changed since the watermark; returns how many were scored
+    db = db if db is not None else get_database()
+    store = store or get_store()
+    version = predictor.model_version
+    first_pass = not store.has_version(version)
+
+    watermark = store.get_watermark(version)
+    if watermark is None:
+        updated_at, last_id = EPOCH, None
+        query = {'updatedAt': {'$gte': EPOCH}}
+    else:
+        updated_at, last_id = watermark[0], watermark[1] and _object_id(watermark[1])
+        query = _after(updated_at, last_id)
+    scored = 0
+
+    projection = dict(ASSESSMENT_PROJECTION, updatedAt=1)
+    while True:
+        with time_stage('mongo_fetch'):
+            docs = list(db.chakraassessments.find(query, projection)
+                        .sort([('updatedAt', 1), ('_id', 1)]).limit(chunk))
+        if not docs:
+            break
+
+        store.upsert_many(version, score_documents(predictor, docs))
+        scored += len(docs)
+
+        # Next page starts after the last (updatedAt, _id) of this one
+        updated_at, last_id = docs[-1]['updatedAt'], docs[-1]['_id']
+        query = _after(updated_at, last_id)
+        # On the first pass the watermark is written only at the end, so the
+        # API keeps scoring live until the store holds every assessment
+        if not first_pass:
+            store.set_watermark(version, updated_at, last_id)
+
+        if len(docs) < chunk:
+            break
+
+    if first_pass:
+        store.set_watermark(version, updated_at, last_id)
+        store.prune_other_versions(version)
+    return scored
+
+
+def prune_deleted(predictor, db=None, store=None):
+    # Remove predictions of assessments that no longer exist; returns how many
+    db = db if db is not None else get_database()
+    store = store or get_store()
+    with time_stage('mongo_fetch'):
+        existing = {str(doc['_id']) for doc in db.chakraassessments.find({}, {'_id': 1})}
+    deleted = store.assessment_ids(predictor.model_version) - existing
+    return store.delete_assessments(deleted) if deleted else 0
+
+
+# ====================== Background thread ======================
+def acquire_store_lock(name):
+    # Non-blocking per-store file lock; returns the open file (keep it!) or None
+    lock_file = open(f"{get_store().path}.{name}.lock", 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+class ScoringWorker(threading.Thread):
+    def __init__(self, predictor, interval=SCORING_INTERVAL):
+        super().__init__(name='scoring-worker', daemon=True)
+        self.predictor = predictor
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self._lock_file = None
+        self._last_prune = time.monotonic()
+        # Threads don't survive fork - remember which process started us
+        self.pid = os.getpid()
+
+    def _acquire_lock(self):
+        # Only one process per store scores; the lock is released when it exits
+        if self._lock_file is None:
+            self._lock_file = acquire_store_lock('scoring')
+        return self._lock_file is not None
+
+    def run(self):
+        while not self.stop_event.is_set():
+            try:
+                if self._acquire_lock():
+                    scored = score_pending(self.predictor)
+                    if scored:
+                        print(f"Scoring worker: scored {scored} assessments (model {self.predictor.model_version})")
+                    if time.monotonic() - self._last_prune >= PRUNE_INTERVAL:
+                        self._last_prune = time.monotonic()
+                        removed = prune_deleted(self.predictor)
+                        if removed:
+                            print(f"Scoring worker: removed {removed} predictions of deleted assessments")
+            except Exception as e:
+                # Mongo down / not configured - try again next interval
+                print(f"Scoring worker error: {e}")
+            self.stop_event.wait(self.interval)
+
+    def stop(self):
+        self.stop_event.set()
+
+
+_worker = None
+
+
+def start_scoring_worker(predictor):
+    # Call once per process AFTER forking (gunicorn post_fork, or __main__)
+    global _worker
+    if not SCORING_ENABLED or predictor is None:
+        return None
+    if _worker is None or not _worker.is_alive() or _worker.pid != os.getpid():
+        _worker = ScoringWorker(predictor)
+        _worker.start()
+    return _worker
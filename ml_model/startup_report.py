@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Startup report for the ML services
+
+Shows where cold-start time goes and what the first request costs:
+1. `python -X importtime` of the app module - total import time and the
+   slowest top-level packages
+2. Cold start vs first/second request latency, once without warm-up and
+   once with the warm-up the gunicorn hooks run (warmup.py)
+
+    python3 startup_report.py                      # conversion API (ml_api.py)
+    python3 startup_report.py --service trend      # python/app.py
+    python3 startup_report.py --service combined   # combined_api.py
+
+No Mongo is needed: the trend history loader is swapped for a synthetic one
+that builds the same pandas pivot.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TREND_DIR = os.path.join(BASE_DIR, '..', 'python')
+
+# service -> (module to import, working directory)
+SERVICES = {
+    'conversion': ('ml_api', BASE_DIR),
+    'trend': ('app', TREND_DIR),
+    'combined': ('combined_api', BASE_DIR),
+}
+
+# Runs inside a fresh interpreter and prints one JSON line
+PROBE = '''
+import json, sys, time
+t0 = time.perf_counter()
+import {module} as service
+t_import = time.perf_counter() - t0
+
+sys.path.append({base_dir!r})
+from warmup import CANNED_ASSESSMENT, warm_up
+
+# Stand-in for the Mongo read: same pivot shape the trend handler builds
+def fake_history():
+    import numpy as np
+    import pandas as pd
+    index = pd.date_range("2024-01-01", periods=24, freq="MS")
+    counts = np.random.default_rng(0).poisson(5, size=(24, 7)).astype(float)
+    return pd.DataFrame(counts, index=index, columns=[f"chakra{{i}}" for i in range(7)]), None
+
+predict_trend = sys.modules.get("predict_trend")
+if predict_trend is not None:
+    predict_trend.load_trend_history = fake_history
+    predict_trend.CACHE_TTL_SECONDS = 0  # measure the work, not the cache
+
+ml_api = sys.modules.get("ml_api")
+predictor = getattr(ml_api, "predictor", None)
+
+t_warm = 0.0
+if {warm}:
+    t0 = time.perf_counter()
+    warm_up(predictor=predictor, trend=predict_trend is not None)
+    t_warm = time.perf_counter() - t0
+
+client = service.app.test_client()
+
+def hit():
+    t0 = time.perf_counter()
+    if ml_api is not None:
+        client.post("/predict", json=CANNED_ASSESSMENT)
+    if predict_trend is not None:
+        client.get("/api/predict_trend?horizon=3")
+    return time.perf_counter() - t0
+
+first = hit()
+second = hit()
+print("PROBE=" + json.dumps({{
+    "import_ms": t_import * 1000, "warm_ms": t_warm * 1000,
+    "first_ms": first * 1000, "second_ms": second * 1000,
+}}))
+'''
+
+
+def import_time_report(module, cwd, top=12):
+    # Parse `-X importtime` output: "import time: self [us] | cumulative | imported package"
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        self_us, cumulative_us, package = line[len('import time:'):].split('|')
+        package = package.rstrip()
+        # Nesting is shown by indentation (2 spaces per level)
+        depth = len(package) - len(package.lstrip())
+        rows.append((depth, package.strip(), int(self_us), int(cumulative_us)))
+
+    if not rows:
+        raise RuntimeError(f"importtime failed:\n{result.stderr[-2000:]}")
+
+    total_us = max(row[3] for row in rows)
+    # Direct imports of the app module sit one level (2 spaces) deeper than it
+    module_depth = next((row[0] for row in rows if row[1] == module), 1)
+    top_level = sorted(
+        (row for row in rows if row[0] == module_depth + 2),
+        key=lambda row: row[3], reverse=True,
+    )[:top]
+    return total_us, top_level
+
+
+def probe(module, cwd, warm):
+    code = PROBE.format(module=module, base_dir=BASE_DIR, warm=warm)
+    result = subprocess.run(
+        [sys.executable, '-c', code], cwd=cwd, capture_output=True, text=True,
+        env={**os.environ, 'NODE_ENV': 'development'},
+    )
+    for line in result.stdout.splitlines():
+        if line.startswith('PROBE='):
+            return json.loads(line[len('PROBE='):])
+    raise RuntimeError(f"Probe failed:\n{result.stderr[-2000:]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--service', choices=SERVICES, default='conversion')
+    args = parser.parse_args()
+
+    module, cwd = SERVICES[args.service]
+
+    print("\n" + "=" * 60)
+    print(f"STARTUP REPORT - {args.service} ({module})")
+    print("=" * 60)
+
+    total_us, top_level = import_time_report(module, cwd)
+    print(f"\n-X importtime: {total_us / 1000:.1f} ms to import {module}")
+    print(f"{'package':<40}{'cumulative ms':>15}")
+    for _, package, _, cumulative in top_level:
+        print(f"{package:<40}{cumulative / 1000:>15.1f}")
+
+    print(f"\n{'':<16}{'import':>10}{'warm-up':>10}{'1st req':>10}{'2nd req':>10}  (ms)")
+    for label, warm in (('no warm-up', False), ('with warm-up', True)):
+        r = probe(module, cwd, warm)
+        print(f"{label:<16}{r['import_ms']:>10.1f}{r['warm_ms']:>10.1f}{r['first_ms']:>10.1f}{r['second_ms']:>10.1f}")
+    print("\nWith warm-up the 1st request should cost about the same as the 2nd;")
+    print("gunicorn pays the warm-up in when_ready/post_fork instead of on traffic.")
+    print("=" * 60 + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,216 @@
+# Synthetic data for benchmarks and local load tests
+# Generates chakra assessments with the same shape the Node app stores in
+# the chakraassessments collection (scoredChakras / scoredLifeQuadrants maps
+# of {answer, score}), matching appointments, and a small in-memory stand-in
+# for the pymongo database so nothing needs a live MongoDB.
+#
+# Everything is seeded, so the same arguments always give the same data.
+
+import random
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+CHAKRAS = [
+    'rootChakra', 'sacralChakra', 'solarPlexusChakra',
+    'heartChakra', 'throatChakra', 'thirdEyeChakra', 'crownChakra'
+]
+QUADRANTS = ['healthWellness', 'loveRelationships', 'careerJob', 'timeMoney']
+AGE_BRACKETS = ['20-30', '30-40', '40-50', '50+']
+HEALTHCARE_YEARS = ['0-3 years', '4-7 years', '8-11 years', '12-16 years', '16+ years']
+ARCHETYPES = ['innerChild', 'martyr', 'saboteur', 'workerBee', 'victim']
+CHALLENGES = ['stress', 'anxiety', 'burnout', 'sleep', 'relationships', 'focus']
+PRACTICES = ['meditation', 'yoga', 'reiki', 'breathwork', 'journaling']
+
+
+def _object_id(rng, created_at):
+    # Deterministic ObjectId that still sorts by creation time like real ones
+    seconds = int(created_at.timestamp())
+    return ObjectId(seconds.to_bytes(4, 'big') + rng.getrandbits(64).to_bytes(8, 'big'))
+
+
+def _scored_section(rng, questions):
+    return {
+        f'q{q + 1}': {'answer': f'option{q}', 'score': rng.randint(1, 5)}
+        for q in range(questions)
+    }
+
+
+def make_assessment(rng, created_at):
+    # One assessment document - same fields transformAssessmentForML reads
+    scored_chakras = {chakra: _scored_section(rng, 7) for chakra in CHAKRAS}
+    scored_quadrants = {quadrant: _scored_section(rng, 5) for quadrant in QUADRANTS}
+
+    totals = {chakra: sum(item['score'] for item in answers.values())
+              for chakra, answers in scored_chakras.items()}
+    healthcare = rng.random() < 0.4
+
+    return {
+        '_id': _object_id(rng, created_at),
+        'email': f'user{rng.randint(0, 10 ** 6)}@example.com',
+        'ageBracket': rng.choice(AGE_BRACKETS),
+        'healthcareWorker': 'Yes' if healthcare else 'No',
+        'healthcareYears': rng.choice(HEALTHCARE_YEARS) if healthcare else '',
+        'challenges': rng.sample(CHALLENGES, rng.randint(0, 3)),
+        'familiarWith': rng.sample(PRACTICES, rng.randint(0, 3)),
+        'goals': 'Find balance' if rng.random() < 0.7 else '',
+        'focusChakra': min(totals, key=totals.get),
+        'archetype': rng.choice(ARCHETYPES),
+        'scoredChakras': scored_chakras,
+        'scoredLifeQuadrants': scored_quadrants,
+        'results': {
+            chakra: {'total': total, 'average': str(round(total / 7, 2))}
+            for chakra, total in totals.items()
+        },
+        'createdAt': created_at,
+        'updatedAt': created_at,
+    }
+
+
+# Fixed default end date, so the same arguments give the same data on any day
+DEFAULT_END = datetime(2025, 10, 1)
+
+
+def today():
+    # Midnight today - pass as end= where "recent" queries must find data
+    return datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def make_assessments(n, seed=42, days=365, end=None):
+    # n assessments spread evenly-ish over the `days` days before `end`
+    # (default DEFAULT_END), oldest first
+    rng = random.Random(seed)
+    end = end or DEFAULT_END
+    start = end - timedelta(days=days)
+    span = (end - start).total_seconds()
+    times = sorted(start + timedelta(seconds=rng.random() * span) for _ in range(n))
+    return [make_assessment(rng, created_at) for created_at in times]
+
+
+def make_appointments(assessments, conversion_rate=0.3, seed=42):
+    # Book an appointment within 90 days for roughly conversion_rate of assessments
+    rng = random.Random(seed)
+    appointments = []
+    for assessment in assessments:
+        if rng.random() < conversion_rate:
+            appointments.append({
+                '_id': _object_id(rng, assessment['createdAt']),
+                'clientEmail': assessment['email'],
+                'createdAt': assessment['createdAt'] + timedelta(days=rng.randint(0, 90), hours=1),
+            })
+    return appointments
+
+
+def to_ml_payload(assessment):
+    # Same fields the Node transformAssessmentForML sends to /predict
+    keys = ['email', 'ageBracket', 'healthcareWorker', 'healthcareYears', 'challenges',
+            'familiarWith', 'goals', 'focusChakra', 'archetype', 'scoredChakras', 'scoredLifeQuadrants']
+    return {key: assessment.get(key) for key in keys}
+
+
+# ======================== In-memory Mongo stand-in =======================
+# Only what our services use: find() with simple filters and projections,
+# sort/limit on the result, insert, count. Not a general Mongo emulator.
+
+def _matches(doc, query):
+    for field, condition in (query or {}).items():
+        if field == '$or':
+            if not any(_matches(doc, branch) for branch in condition):
+                return False
+            continue
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            for op, target in condition.items():
+                if value is None:
+                    return False
+                if op == '$gte' and not value >= target:
+                    return False
+                if op == '$gt' and not value > target:
+                    return False
+                if op == '$lte' and not value <= target:
+                    return False
+                if op == '$lt' and not value < target:
+                    return False
+                if op == '$in' and value not in target:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection:
+        return dict(doc)
+    included = [field for field, keep in projection.items() if keep]
+    out = {field: doc[field] for field in included if field in doc}
+    if projection.get('_id', 1) and '_id' in doc:
+        out['_id'] = doc['_id']
+    return out
+
+
+class FakeCursor(list):
+    def sort(self, key, direction=1):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        # Stable sorts, least significant key first
+        for field, field_direction in reversed(keys):
+            super().sort(key=lambda doc: doc.get(field), reverse=field_direction < 0)
+        return self
+
+    def limit(self, n):
+        if n:
+            del self[n:]
+        return self
+
+
+class FakeCollection:
+    def __init__(self, docs=None):
+        self.docs = list(docs or [])
+
+    def find(self, query=None, projection=None):
+        return FakeCursor(_project(doc, projection) for doc in self.docs if _matches(doc, query))
+
+    def find_one(self, query=None, projection=None):
+        found = self.find(query, projection)
+        return found[0] if found else None
+
+    def insert_many(self, docs):
+        self.docs.extend(docs)
+
+    def insert_one(self, doc):
+        self.docs.append(doc)
+
+    def count_documents(self, query):
+        return sum(1 for doc in self.docs if _matches(doc, query))
+
+
+class FakeDatabase:
+    # Attribute and item access both return a collection, like pymongo
+    def __init__(self, name='fake', **collections):
+        self.name = name
+        self._collections = {key: FakeCollection(docs) for key, docs in collections.items()}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = FakeCollection()
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    def list_collection_names(self):
+        return list(self._collections)
+
+    def command(self, name):
+        # Only what the health checks use
+        if name != 'ping':
+            raise NotImplementedError(name)
+        return {'ok': 1.0}
+
+
+def make_fake_database(n_assessments=500, seed=42, conversion_rate=0.3, end=None):
+    # Database with chakraassessments + appointments ready to use
+    assessments = make_assessments(n_assessments, seed=seed, end=end)
+    appointments = make_appointments(assessments, conversion_rate=conversion_rate, seed=seed)
+    return FakeDatabase(chakraassessments=assessments, appointments=appointments)
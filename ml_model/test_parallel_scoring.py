@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Parallel batch scoring gives exactly the single-process result
+
+    cd ml_model && python3 -m pytest -q test_parallel_scoring.py
+
+parallel_benchmark.py prints the speedup curve; this only checks the numbers.
+"""
+
+import contextlib
+import io
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import parallel_scoring
+import synthetic_data
+
+SIZE = parallel_scoring.PARALLEL_MIN_BATCH + 123  # odd size: the last chunk is short
+
+
+@pytest.fixture(scope='module')
+def predictor():
+    from predict_new import ConversionPredictorService
+    with contextlib.redirect_stdout(io.StringIO()):
+        service = ConversionPredictorService()
+    yield service
+    parallel_scoring.shutdown_pool(wait=True)
+
+
+@pytest.fixture(scope='module')
+def payloads():
+    return [synthetic_data.to_ml_payload(a) for a in synthetic_data.make_assessments(SIZE, seed=7)]
+
+
+def test_parallel_matches_serial(predictor, payloads):
+    rows = [predictor.extract_features(p) for p in payloads]
+    parallel_scoring.shutdown_pool(wait=True)
+    expected = predictor.predict_probabilities(rows)
+    serial_batch = predictor.predict_batch_columnar(payloads).to_response_json()
+
+    assert parallel_scoring.start_pool(predictor, 2) == 2
+    assert parallel_scoring.use_pool(predictor, len(rows))
+    assert np.array_equal(parallel_scoring.predict_probabilities(predictor, rows), expected)
+    assert predictor.predict_batch_columnar(payloads).to_response_json() == serial_batch
+
+
+def test_online_model_travels_with_chunks(predictor, payloads):
+    from online_learning import OnlineModel
+
+    rows = [predictor.extract_features(p) for p in payloads]
+    X = np.asarray(predictor.preprocess_batch(payloads), dtype=np.float64)
+    online = OnlineModel(predictor.feature_names)
+    online.partial_update(X, np.arange(len(X)) % 2)
+
+    # pool forked before the online model existed - it still scores with it
+    assert parallel_scoring.start_pool(predictor, 2) == 2
+    predictor.online = online
+    try:
+        expected = predictor.predict_probabilities(rows)
+        assert np.array_equal(parallel_scoring.predict_probabilities(predictor, rows), expected)
+    finally:
+        predictor.online = None
+
+
+def test_no_pool_forked_from_threaded_process(predictor, payloads):
+    stop = threading.Event()
+    thread = threading.Thread(target=stop.wait, daemon=True)
+    thread.start()
+    try:
+        assert parallel_scoring.start_pool(predictor, 2) == 0
+    finally:
+        stop.set()
+        thread.join()
+    assert not parallel_scoring.use_pool(predictor, SIZE)
+    # and the batch is still scored, in-process
+    assert len(predictor.predict_batch_columnar(payloads[:10]).to_records()) == 10
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Background scoring pages through assessments by the (updatedAt, _id)
+watermark: incremental passes leave the store like one full pass, also
+when thousands of documents share one updatedAt, and deleted assessments
+are pruned
+
+    cd ml_model && python3 -m pytest -q test_scoring_worker.py
+"""
+
+import contextlib
+import io
+import os
+import sys
+from datetime import timedelta
+
+import pytest
+from bson import ObjectId
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+
+import synthetic_data
+from prediction_store import PredictionStore
+from scoring_worker import prune_deleted, score_pending
+
+CHUNK = 100
+
+
+@pytest.fixture(scope='module')
+def predictor():
+    from predict_new import ConversionPredictorService
+    with contextlib.redirect_stdout(io.StringIO()):
+        return ConversionPredictorService()
+
+
+@pytest.fixture
+def db():
+    # a bulk import: 250 documents with the same updatedAt, more than 2 pages
+    docs = synthetic_data.make_assessments(250, seed=1)
+    imported_at = docs[-1]['createdAt'] + timedelta(days=1)
+    for doc in docs:
+        doc['updatedAt'] = imported_at
+    return synthetic_data.FakeDatabase(chakraassessments=docs)
+
+
+def _stored(store, version):
+    return dict(store._connect().execute(
+        'SELECT assessment_id, conversion_probability FROM predictions WHERE model_version = ?',
+        (version,)).fetchall())
+
+
+def test_pages_through_one_updated_at(predictor, db, tmp_path):
+    store = PredictionStore(str(tmp_path / 'predictions.sqlite3'))
+    assert score_pending(predictor, db, store, chunk=CHUNK) == 250
+    assert store.count(predictor.model_version) == 250
+    last = max(db.chakraassessments.docs, key=lambda doc: (doc['updatedAt'], doc['_id']))
+    assert store.get_watermark(predictor.model_version) == (last['updatedAt'], str(last['_id']))
+    assert score_pending(predictor, db, store, chunk=CHUNK) == 0
+
+
+def test_incremental_matches_full_pass(predictor, db, tmp_path):
+    version = predictor.model_version
+    store = PredictionStore(str(tmp_path / 'incremental.sqlite3'))
+    score_pending(predictor, db, store, chunk=CHUNK)
+
+    collection = db.chakraassessments
+    imported_at = collection.docs[0]['updatedAt']
+    new = synthetic_data.make_assessments(30, seed=2)
+    for index, doc in enumerate(new):
+        # written after the import: newer _ids, 10 of them in the same millisecond
+        doc['_id'] = ObjectId()
+        doc['updatedAt'] = imported_at if index < 10 else imported_at + timedelta(minutes=index)
+    collection.insert_many(new)
+    for doc in collection.docs[:5]:
+        # edited assessments move past the watermark
+        doc['updatedAt'] = imported_at + timedelta(hours=1)
+        doc['challenges'] = ['burnout']
+
+    assert score_pending(predictor, db, store, chunk=CHUNK) == 35
+    assert score_pending(predictor, db, store, chunk=CHUNK) == 0
+
+    full = PredictionStore(str(tmp_path / 'full.sqlite3'))
+    assert score_pending(predictor, db, full, chunk=CHUNK) == 280
+    assert _stored(store, version) == _stored(full, version)
+    assert store.get_watermark(version) == full.get_watermark(version)
+
+
+def test_prune_deleted(predictor, db, tmp_path):
+    version = predictor.model_version
+    store = PredictionStore(str(tmp_path / 'predictions.sqlite3'))
+    score_pending(predictor, db, store, chunk=CHUNK)
+
+    collection = db.chakraassessments
+    deleted = {str(doc['_id']) for doc in collection.docs[:7]}
+    del collection.docs[:7]
+
+    assert prune_deleted(predictor, db, store) == 7
+    assert store.count(version) == 243
+    assert {assessment_id for assessment_id, _ in store.removed_since(version, '')} == deleted
+    assert prune_deleted(predictor, db, store) == 0
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+TrendCube.refresh: incremental updates give exactly the counts of a full
+rebuild, also for documents created at the watermark instant itself
+
+    cd ml_model && python3 -m pytest -q test_trend_cube.py
+"""
+
+import os
+import sys
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BASE_DIR)
+# The trend service lives in python/ (see combined_api.py)
+sys.path.append(os.path.join(BASE_DIR, '..', 'python'))
+
+import synthetic_data
+from trend_cube import SEGMENT_FIELDS, TrendCube
+
+
+def _full_build(collection):
+    cube = TrendCube(lambda: synthetic_data.FakeDatabase(chakraassessments=list(collection.docs)))
+    cube.refresh()
+    return cube
+
+
+@pytest.fixture
+def db():
+    return synthetic_data.FakeDatabase(
+        chakraassessments=synthetic_data.make_assessments(2000, seed=5, days=730))
+
+
+def test_incremental_matches_full_rebuild(db):
+    cube = TrendCube(lambda: db)
+    assert cube.refresh() == 2000
+    watermark = cube.watermark
+
+    # 300 newer documents, one of them created exactly at the watermark
+    new = synthetic_data.make_assessments(300, seed=6, days=30, end=watermark + timedelta(days=30))
+    new[0]['createdAt'] = watermark
+    db.chakraassessments.insert_many(new)
+
+    assert cube.refresh() == 300
+    # nothing new: the documents at the watermark are not counted again
+    assert cube.refresh() == 0
+
+    full = _full_build(db.chakraassessments)
+    assert cube.counts == full.counts
+    assert cube.documents == full.documents == 2300
+    assert cube.pivot().equals(full.pivot())
+    for field in SEGMENT_FIELDS:
+        months, chakras, Y, segments = cube.slices(segment_by=(field,))
+        full_months, full_chakras, full_Y, full_segments = full.slices(segment_by=(field,))
+        assert (months, chakras, segments) == (full_months, full_chakras, full_segments)
+        assert np.array_equal(Y, full_Y)
+
+
+def test_reset_rebuilds(db):
+    cube = TrendCube(lambda: db)
+    cube.refresh()
+    counts = dict(cube.counts)
+    cube.reset()
+    assert cube.refresh() == 2000
+    assert cube.counts == counts
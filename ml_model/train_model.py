@@ -34,6 +34,7 @@ from sklearn.metrics import (
 )
 
 import joblib                       # Save/load trained model to disk
+from tree_compiler import export_compiled  # Flatten tree models for predict_new.py
 import warnings                     # Control warning message
 
 # Hide warnings to keep output clean
@@ -235,6 +236,9 @@ class ConversionPredictor:
         joblib.dump(self.scaler, scaler_path)
         joblib.dump(self.feature_names, features_path)
 
+        # Flat tree arrays for fast inference (tree_compiler.py) - skipped for LogisticRegression
+        export_compiled(model, model_path)
+
     def train_all_models(self):
         # print(f"\n" + "="*60)
         # print("Training conversion prediction model")
@@ -0,0 +1,28 @@
+# Training dataset (chakra_conversion_dataset.csv) as the predictor sees it
+# Used by checks that compare live behaviour with training time
+# (float32_mode.py validation, drift_monitor.py baselines).
+
+import os
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'chakra_conversion_dataset.csv')
+
+# Raw categorical columns of the CSV -> assessment payload field
+CATEGORICAL_FIELDS = {'focus_chakra': 'focusChakra', 'archetype': 'archetype'}
+
+
+def load_training_frame(feature_names, path=DATASET_PATH):
+    # (features in feature_names order, converted labels or None, raw DataFrame)
+    # or (None, None, None) when the CSV is missing
+    import pandas as pd
+
+    if not os.path.exists(path):
+        return None, None, None
+
+    # Same encoding as train_model.py preprocess_data
+    df = pd.read_csv(path)
+    features = df.drop(['email', 'assessment_date', 'converted'], axis=1, errors='ignore')
+    categorical = features.select_dtypes(include=['object']).columns
+    encoded = pd.get_dummies(features, columns=categorical, drop_first=True).fillna(0)
+    X = encoded.reindex(columns=feature_names, fill_value=0).astype(float)
+    labels = df['converted'].to_numpy() if 'converted' in df else None
+    return X, labels, df
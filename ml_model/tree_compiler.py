@@ -0,0 +1,278 @@
+# Flattened tree ensembles for fast inference
+# sklearn's predict_proba on a 100-tree forest validates the input and then
+# walks every tree in its own call (plus joblib dispatch) - for one /predict
+# row that overhead is most of the request.
+#
+# compile_model() copies every tree of the trained RandomForest /
+# GradientBoosting into one set of flat arrays:
+#
+#   feature[node]    feature index compared at the node
+#   threshold[node]  go left when x[feature] <= threshold
+#   child[node]      left child; the right child is always child + 1
+#                    (nodes are renumbered breadth-first), leaves point to themselves
+#   leaf_value       forest:   class probabilities of the node (n_nodes x n_classes)
+#                    boosting: learning_rate * node value (n_nodes)
+#                    kept for internal nodes too - contributions() needs them
+#   roots[tree]      first node of each tree
+#
+# CompiledEnsemble.predict_proba() then moves a whole batch through all the
+# trees together: `depth` vectorized steps of
+#   node = child[node] + (x[feature[node]] > threshold[node])
+# then one leaf lookup and one sum.
+#
+# That wins for small batches (one /predict row: ~2.6 ms -> ~0.06 ms in
+# predict_proba) but sklearn's C loop is faster for big ones, so the
+# predictor only uses it up to COMPILED_MAX_ROWS rows.
+# Input is cast to float32 and trees are summed in order, exactly like
+# sklearn, so probabilities are bit-identical (verify() checks this before
+# the compiled model is used).
+#
+# train_model.py exports the arrays next to the pickle
+# (best_conversion_model.trees.npz); predict_new.py loads them, or compiles
+# from the pickle when the file is missing or belongs to another model.
+
+import hashlib
+import os
+
+import numpy as np
+from scipy.special import expit
+
+# Number of random rows verify() compares against sklearn
+VERIFY_ROWS = 512
+
+
+class CompiledEnsemble:
+    def __init__(self, kind, feature, threshold, child, leaf_value, roots, depth,
+                 classes, init_raw=0.0, model_sha=''):
+        self.kind = kind                # 'forest' or 'boosting'
+        self.feature = feature
+        self.threshold = threshold
+        self.child = child
+        self.leaf_value = leaf_value
+        self.roots = roots
+        self.depth = depth              # deepest tree = steps needed to reach every leaf
+        self.classes_ = classes
+        self.init_raw = init_raw        # boosting only: prior log-odds
+        self.model_sha = model_sha      # sha of the pickle these arrays came from
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    # ======================== Inference ========================
+    def apply(self, X):
+        # Leaf index reached in every tree: (n_rows, n_trees)
+        # sklearn trees compare float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if np.isnan(X).any():
+            # sklearn refuses NaN too (and leaves would stop pointing to themselves)
+            raise ValueError("Input contains NaN")
+        flat = X.ravel()
+        row_start = (np.arange(len(X)) * X.shape[1])[:, None]
+        node = np.broadcast_to(self.roots, (len(X), self.n_trees))
+        for _ in range(self.depth):
+            go_right = flat[row_start + self.feature[node]] > self.threshold[node]
+            node = self.child[node] + go_right
+        return node
+
+    def predict_proba(self, X):
+        leaves = self.apply(X)
+
+        if self.kind == 'forest':
+            # Trees added one after another from zero (cumsum keeps that order),
+            # then averaged - RandomForestClassifier.predict_proba does the same
+            per_tree = self.leaf_value[leaves]                  # (n, trees, classes)
+            return np.cumsum(per_tree, axis=1)[:, -1] / self.n_trees
+
+        # Boosting: prior log-odds + learning_rate * leaf values, stage by stage
+        per_stage = self.leaf_value[leaves]                     # (n, stages)
+        start = np.full((len(per_stage), 1), self.init_raw, dtype=per_stage.dtype)
+        raw = np.cumsum(np.hstack([start, per_stage]), axis=1)[:, -1]
+        proba = np.ones((len(raw), 2), dtype=per_stage.dtype)
+        proba[:, 1] = expit(raw)
+        proba[:, 0] -= proba[:, 1]
+        return proba
+
+    def contributions(self, X, column=1):
+        # Saabas path attribution: walking a tree from root to leaf, every
+        # split adds value[child] - value[node] to the feature it tested.
+        # Returns (bias, (n_rows, n_features)) with
+        #   bias + contributions.sum(axis=1) == predicted value
+        # (class `column` probability for a forest, log-odds for boosting)
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if np.isnan(X).any():
+            raise ValueError("Input contains NaN")
+        value = self.leaf_value[:, column] if self.kind == 'forest' else self.leaf_value
+        n_rows, n_features = X.shape
+        flat = X.ravel()
+        row_start = (np.arange(n_rows) * n_features)[:, None]
+        node = np.broadcast_to(self.roots, (n_rows, self.n_trees))
+        totals = np.zeros(n_rows * n_features)
+        for _ in range(self.depth):
+            index = row_start + self.feature[node]
+            next_node = self.child[node] + (flat[index] > self.threshold[node])
+            # Leaves point to themselves -> difference 0, nothing added
+            totals += np.bincount(index.ravel(), weights=(value[next_node] - value[node]).ravel(),
+                                  minlength=n_rows * n_features)
+            node = next_node
+
+        if self.kind == 'forest':
+            # Average of the trees
+            return float(value[self.roots].mean()), totals.reshape(n_rows, n_features) / self.n_trees
+        return float(self.init_raw + value[self.roots].sum()), totals.reshape(n_rows, n_features)
+
+    def to_float32(self):
+        # Copy with float32 thresholds / leaf values (opt-in reduced precision, see float32_mode.py)
+        # Thresholds are rounded DOWN to float32, so x <= threshold gives the
+        # same answer as the float64 threshold for every float32 input x
+        threshold = self.threshold.astype(np.float32)
+        too_high = threshold.astype(np.float64) > self.threshold
+        threshold[too_high] = np.nextafter(threshold[too_high], np.float32(-np.inf))
+        return CompiledEnsemble(self.kind, self.feature, threshold, self.child,
+                                self.leaf_value.astype(np.float32), self.roots, self.depth,
+                                self.classes_, np.float32(self.init_raw), self.model_sha)
+
+    def predict(self, X):
+        return self.classes_[np.argmax(self.predict_proba(X), axis=1)]
+
+    # ======================== Files ========================
+    def save(self, path):
+        np.savez(path, kind=self.kind, feature=self.feature, threshold=self.threshold,
+                 child=self.child, leaf_value=self.leaf_value, roots=self.roots,
+                 depth=self.depth, classes=self.classes_, init_raw=self.init_raw,
+                 model_sha=self.model_sha)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls(kind=str(data['kind']), feature=data['feature'], threshold=data['threshold'],
+                       child=data['child'], leaf_value=data['leaf_value'],
+                       roots=data['roots'], depth=int(data['depth']), classes=data['classes'],
+                       init_raw=float(data['init_raw']), model_sha=str(data['model_sha']))
+
+
+# ======================== Compile ========================
+def _breadth_first(tree):
+    # Node ids in an order where every node's two children sit next to each other
+    order = [0]
+    for node in order:
+        if tree.children_left[node] != -1:
+            order.extend((tree.children_left[node], tree.children_right[node]))
+    return np.asarray(order)
+
+
+def _flatten(trees, leaf_values):
+    # Concatenate the sklearn Tree objects; leaf_values(tree) gives per-node leaf output
+    feature, threshold, child, values, roots = [], [], [], [], []
+    offset = 0
+    depth = 0
+    for tree in trees:
+        order = _breadth_first(tree)
+        # sklearn node id -> position in the flat arrays
+        position = np.empty(tree.node_count, dtype=np.intp)
+        position[order] = np.arange(offset, offset + tree.node_count)
+
+        is_leaf = tree.children_left[order] == -1
+        feature.append(np.where(is_leaf, 0, tree.feature[order]))
+        # +inf: a leaf never goes right, so it keeps pointing at itself and
+        # extra steps for shallower trees are harmless
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold[order]))
+        child.append(np.where(is_leaf, position[order], position[tree.children_left[order]]))
+        values.append(leaf_values(tree)[order])
+        roots.append(offset)
+
+        depth = max(depth, tree.max_depth)
+        offset += tree.node_count
+
+    return dict(
+        feature=np.concatenate(feature).astype(np.intp),
+        threshold=np.concatenate(threshold).astype(np.float64),
+        child=np.concatenate(child).astype(np.intp),
+        leaf_value=np.concatenate(values),
+        roots=np.asarray(roots, dtype=np.intp),
+        depth=depth,
+    )
+
+
+def _forest_leaf_proba(tree):
+    # DecisionTreeClassifier.predict_proba: leaf class weights / their sum
+    proba = tree.value[:, 0, :].copy()
+    normalizer = proba.sum(axis=1)[:, np.newaxis]
+    normalizer[normalizer == 0.0] = 1.0
+    proba /= normalizer
+    return proba
+
+
+def compile_model(model, model_sha=''):
+    # Flatten a fitted RandomForestClassifier / GradientBoostingClassifier
+    # Returns None for anything else (the caller keeps using sklearn)
+    from sklearn.dummy import DummyClassifier
+    from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+
+    if isinstance(model, RandomForestClassifier) and model.n_outputs_ == 1:
+        arrays = _flatten([est.tree_ for est in model.estimators_], _forest_leaf_proba)
+        return CompiledEnsemble('forest', classes=model.classes_, model_sha=model_sha, **arrays)
+
+    if (isinstance(model, GradientBoostingClassifier) and model.n_classes_ == 2
+            and (model.init_ == 'zero' or isinstance(model.init_, DummyClassifier))):
+        rate = model.learning_rate
+        arrays = _flatten([stage[0].tree_ for stage in model.estimators_],
+                          lambda tree: rate * tree.value[:, 0, 0])
+        # Prior log-odds - the same for every row with a Dummy / zero init
+        init_raw = float(model._raw_predict_init(np.zeros((1, model.n_features_in_)))[0, 0])
+        return CompiledEnsemble('boosting', classes=model.classes_, init_raw=init_raw,
+                                model_sha=model_sha, **arrays)
+
+    return None
+
+
+def verify(compiled, model, n_features, rows=VERIFY_ROWS):
+    # True when the compiled arrays give exactly sklearn's probabilities
+    # (random rows on the scaled feature range, fixed seed)
+    sample = np.random.RandomState(0).standard_normal((rows, n_features)) * 1.5
+    return np.array_equal(compiled.predict_proba(sample), model.predict_proba(sample))
+
+
+def compiled_path(model_path):
+    # best_conversion_model.pkl -> best_conversion_model.trees.npz
+    return os.path.splitext(model_path)[0] + '.trees.npz'
+
+
+def file_sha(path):
+    # Short sha256 of the pickle (same format as the predictor's model_version)
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:12]
+
+
+def export_compiled(model, model_path):
+    # Called by train_model.py after saving the pickle
+    compiled = compile_model(model, file_sha(model_path))
+    if compiled is None:
+        return None
+    compiled.save(compiled_path(model_path))
+    return compiled
+
+
+def load_compiled(model, model_path, n_features):
+    # Exported arrays for this exact pickle, else compile now; None if the
+    # model can't be compiled or doesn't match sklearn
+    model_sha = file_sha(model_path)
+    compiled = None
+    path = compiled_path(model_path)
+    if os.path.exists(path):
+        try:
+            compiled = CompiledEnsemble.load(path)
+        except Exception as e:
+            print(f"Could not read {os.path.basename(path)}: {e}")
+        if compiled is not None and compiled.model_sha != model_sha:
+            compiled = None  # left over from an older model
+
+    if compiled is None:
+        compiled = compile_model(model, model_sha)
+        if compiled is None:
+            return None
+
+    if not verify(compiled, model, n_features):
+        print("Compiled trees differ from sklearn - using sklearn predict_proba")
+        return None
+    return compiled
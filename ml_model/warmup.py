@@ -0,0 +1,114 @@
+# Warm-up for the ML services
+# The request handlers import their heavy libraries lazily (pandas in
+# preprocess_assessment, pandas/pymongo in the trend forecast). Without a
+# warm-up, the first request after every worker (re)start - gunicorn
+# recycles workers every max_requests - pays those imports plus the first
+# trip through sklearn/numpy.
+#
+# The gunicorn hooks call this module on purpose instead:
+# - when_ready (master, preload_app): import everything once, so forked
+#   workers inherit the loaded modules
+# - post_fork (each worker): push a canned assessment / history through the
+#   hot paths so the first real request finds everything touched (without
+#   counting it in the drift monitor or the request metrics)
+#
+# Nothing in here opens a Mongo connection - MongoClient is not fork-safe,
+# so the pool is created lazily inside each worker (see mongo_pool.py).
+
+import importlib
+import time
+
+# Modules the request handlers import lazily
+# (sklearn/joblib are already loaded when the conversion model is unpickled,
+# and the trend service doesn't need them at all)
+HOT_MODULES = [
+    'numpy',
+    'pandas',
+    'pymongo',
+    'dotenv',
+]
+
+# Small but complete assessment - same shape as the Node transformAssessmentForML output
+CANNED_ASSESSMENT = {
+    'email': 'warmup@example.com',
+    'ageBracket': '30-40',
+    'healthcareWorker': 'Yes',
+    'healthcareYears': '4-7 years',
+    'challenges': ['stress', 'anxiety'],
+    'familiarWith': ['meditation'],
+    'goals': 'Find balance',
+    'focusChakra': 'heartChakra',
+    'archetype': 'martyr',
+    'scoredChakras': {
+        'rootChakra': {'q1': {'answer': 'a', 'score': 3}, 'q2': {'answer': 'b', 'score': 4}},
+        'heartChakra': {'q1': {'answer': 'a', 'score': 5}},
+    },
+    'scoredLifeQuadrants': {
+        'healthWellness': {'q1': {'answer': 'a', 'score': 3}},
+    },
+}
+
+
+def import_hot_modules():
+    # Import every hot-path module, returning how long each took (ms)
+    timings = {}
+    for name in HOT_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            # Optional for this service (e.g. pymongo in a predict-only setup)
+            continue
+        timings[name] = round((time.perf_counter() - start) * 1000, 2)
+    return timings
+
+
+def warm_conversion(predictor):
+    # Run the scoring path once for one row and for a small batch.
+    # Not through predict_conversion_probability / predict_batch: those feed
+    # the drift monitor and the stage metrics, and warm-up runs in every
+    # worker (re)start - canned rows would pile up in both. Same idea as the
+    # /readyz self-test, minus predict_matrix's timings.
+    if predictor is None:
+        return
+    from prediction_batch import PredictionBatch
+
+    X = predictor.preprocess_batch([CANNED_ASSESSMENT, CANNED_ASSESSMENT])
+    for rows in (X.iloc[:1], X):
+        probabilities = predictor.model_proba(predictor.scale_features(rows))
+        if predictor.online is not None:
+            probabilities = predictor.online.predict_proba(rows)
+        emails = [CANNED_ASSESSMENT['email']] * len(rows)
+        PredictionBatch.from_proba(probabilities, predictor.model.classes_, emails).to_response_json()
+
+
+def warm_trend():
+    # Fit every forecasting backend on a small synthetic history
+    try:
+        import numpy as np
+        from forecast_models import FORECAST_MODELS, forecast_with_intervals
+    except ImportError:
+        # Trend service not on the path (conversion-only deployment)
+        return
+    history = np.arange(24 * 7, dtype=float).reshape(24, 7) % 5
+    for name in FORECAST_MODELS:
+        forecast_with_intervals(name, history, horizon=3)
+
+
+def warm_up(predictor=None, trend=True):
+    # Full warm-up, returns a small report for the gunicorn log
+    start = time.perf_counter()
+    imports = import_hot_modules()
+    import_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    warm_conversion(predictor)
+    if trend:
+        warm_trend()
+    touch_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        'import_ms': round(import_ms, 2),
+        'touch_ms': round(touch_ms, 2),
+        'modules': imports,
+    }
@@ -60,4 +60,8 @@ const chakraAssessmentSchema = new mongoose.Schema({
 
 }, { timestamps: true });
 
+// the trend service reads only assessments newer than its last refresh
+// (createdAt >= watermark) and /predict/recent filters on createdAt too
+chakraAssessmentSchema.index({ createdAt: 1 });
+
 module.exports = mongoose.model("ChakraAssessment", chakraAssessmentSchema);
\ No newline at end of file
@@ -64,7 +64,7 @@
         ${renderAverageConversionWindow(stats)}
       </div>
       ${renderKeyInsights(stats)}
-      ${renderMLPredictions(predictions)}
+      ${renderMLPredictions(predictions, highProbLeads)}
     `;
 
     container.innerHTML = html;
@@ -163,7 +163,7 @@
   /**
    * Render ML predictions section
    */
-  function renderMLPredictions(predictions) {
+  function renderMLPredictions(predictions, highProbLeads) {
     if (!predictions || predictions.length === 0) {
       return '';
     }
@@ -197,7 +197,11 @@
       })
       .join('');
 
-    const totalHighProb = predictions.filter(p => p.conversion_probability >= 0.7).length;
+    // The server only sends the top leads; the total comes from its count
+    const totalHighProb = Math.max(
+      highProbLeads || 0,
+      predictions.filter(p => p.conversion_probability >= 0.7).length
+    );
     const showMoreMessage = totalHighProb > 9 
       ? `<p style="margin-top: 20px; color: #6b7280; text-align: center; font-size: 0.95rem;">
            Showing top 9 high-probability leads out of ${totalHighProb} total.
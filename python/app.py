@@ -1,16 +1,94 @@
-from flask import Flask, jsonify
-from predict_trend import get_prediction
+from flask import Blueprint, Flask, jsonify, request
+from predict_trend import get_prediction, compare_models
+from trend_cube import SEGMENT_FIELDS
+from forecast_models import DEFAULT_MODEL, FORECAST_MODELS
+# shared with the conversion API (ml_model/metrics.py, on the path via predict_trend)
+from metrics import instrument_app
+# orjson-backed jsonify when installed, NumPy-safe either way (ml_model/json_provider.py)
+from json_provider import install_json_provider
+# ETag / 304 + gzip (ml_model/http_cache.py)
+from http_cache import conditional_json, content_etag, install_compression
+# /livez + /readyz backed by a background self-test (ml_model/health_check.py)
+from health_check import SelfTest, mongo_ping, register_health_routes
+# admin-only /debug/profile + /debug/allocations (ml_model/profiler.py)
+from profiler import register_profiler_routes
+
+# Longest forecast we serve (months)
+MAX_HORIZON = 24
+
+def _list_arg(name):
+    # ?name=a,b and ?name=a&name=b both give ["a", "b"]
+    return [value for raw in request.args.getlist(name) for value in raw.split(",") if value]
+
+# Trend routes live on a blueprint so ml_model/combined_api.py can mount them
+# next to the conversion routes in a single process
+trend_bp = Blueprint("trend", __name__)
+
+@trend_bp.route("/api/predict_trend")
+def predict_route():
+    # ?model=linear | holt_winters | seasonal_naive
+    model = request.args.get("model", DEFAULT_MODEL)
+    if model not in FORECAST_MODELS:
+        return jsonify({"ok": False, "error": f"Unknown model '{model}'", "models": list(FORECAST_MODELS)}), 400
+
+    # ?horizon=N months ahead (default 1) and ?level=0.8 / 0.95 prediction interval
+    try:
+        horizon = int(request.args.get("horizon", 1))
+        level = float(request.args.get("level", 0.95))
+    except ValueError:
+        return jsonify({"ok": False, "error": "horizon must be an integer and level a number"}), 400
+    if not 1 <= horizon <= MAX_HORIZON:
+        return jsonify({"ok": False, "error": f"horizon must be between 1 and {MAX_HORIZON}"}), 400
+    if not 0 < level < 1:
+        return jsonify({"ok": False, "error": "level must be between 0 and 1"}), 400
+
+    # ?segment_by=archetype,ageBracket,healthcareWorker -> one forecast per segment
+    # ?archetype=martyr&healthcareWorker=Yes -> only those assessments
+    segment_by = _list_arg("segment_by")
+    unknown = [field for field in segment_by if field not in SEGMENT_FIELDS]
+    if unknown or len(set(segment_by)) != len(segment_by):
+        return jsonify({"ok": False, "error": f"segment_by must be distinct fields from {list(SEGMENT_FIELDS)}"}), 400
+    filters = {field: _list_arg(field) for field in SEGMENT_FIELDS if _list_arg(field)}
+
+    result = get_prediction(model=model, horizon=horizon, level=level, segment_by=segment_by, filters=filters)
+    # Same forecast snapshot -> same ETag (fit timings don't count), so the
+    # admin portal gets a 304 until the data or the cached forecast changes
+    return conditional_json(result, content_etag(result, exclude=("timings",)))
+
+@trend_bp.route("/api/predict_trend/models")
+def compare_models_route():
+    # backtest accuracy + fit/predict time for every backend
+    return jsonify(compare_models())
+
+def forecast_canned_history():
+    # default backend on a small synthetic history (same shape as the real one)
+    import numpy as np
+    from forecast_models import forecast_with_intervals
+
+    history = np.arange(24 * 7, dtype=float).reshape(24, 7) % 5
+    forecast_with_intervals(DEFAULT_MODEL, history, horizon=1)
+    return {"model": DEFAULT_MODEL}
+
+def add_trend_checks(self_test):
+    self_test.add_check("trend_forecast", forecast_canned_history)
+    return self_test
 
 app = Flask(__name__)
+app.register_blueprint(trend_bp)
+instrument_app(app)
+install_json_provider(app)
+install_compression(app)
 
+# every forecast reads MongoDB, so here it is a critical check
+SELF_TEST = add_trend_checks(SelfTest())
+SELF_TEST.add_check("mongo", mongo_ping)
+register_health_routes(app, SELF_TEST)
+register_profiler_routes(app)
+
+# kept for older callers - /livez and /readyz replace it
 @app.get("/health")
 def health():
     return jsonify({"status": "ok"})
 
-@app.route("/api/predict_trend")
-def predict_route():
-    result = get_prediction()
-    return jsonify(result)
-
 if __name__ == "__main__":
     app.run(debug=True)
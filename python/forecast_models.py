@@ -0,0 +1,270 @@
+"""
+Forecasting backends for the chakra trend service.
+
+Every backend works on the whole history matrix at once:
+    Y has shape (n_months, n_chakras) - one column per chakra series
+so a single fit covers every chakra instead of looping one model per chakra.
+
+Backends
+- linear          straight line per chakra (the original trend model)
+- holt_winters    additive exponential smoothing (level + trend + season)
+- seasonal_naive  repeat the value from the same month last season
+
+evaluate_models() is the shared backtest harness: it runs each backend over
+the same rolling-origin splits and reports accuracy plus fit/predict time,
+so we can pick the most accurate model that fits our latency budget.
+
+Each backend also keeps the spread of its in-sample one-step errors (sigma)
+and knows how that spread grows with the horizon, so a single fit gives the
+point forecast and prediction interval for every future month at once.
+"""
+
+import time
+from statistics import NormalDist
+import numpy as np
+
+# Monthly data -> one season is a year
+SEASON_LENGTH = 12
+
+
+# ====================== Linear trend ======================
+class LinearTrendModel:
+    name = "linear"
+
+    def fit(self, Y):
+        Y = np.asarray(Y, dtype=float)
+        n = Y.shape[0]
+        t = np.arange(n, dtype=float)
+
+        # closed-form least squares for every column together
+        t_mean = t.mean()
+        y_mean = Y.mean(axis=0)
+        t_dev = t - t_mean
+        var_t = (t_dev ** 2).sum()
+
+        if var_t > 0:
+            self.slope = (t_dev[:, None] * (Y - y_mean)).sum(axis=0) / var_t
+        else:
+            # a single month: flat line at the last value
+            self.slope = np.zeros(Y.shape[1])
+        self.intercept = y_mean - self.slope * t_mean
+        self.n_obs = n
+        self.t_mean = t_mean
+        self.var_t = var_t
+
+        # residual standard error (2 parameters used by the fit)
+        residuals = Y - (self.intercept + self.slope * t[:, None])
+        dof = max(n - 2, 1)
+        self.sigma = np.sqrt((residuals ** 2).sum(axis=0) / dof) if n > 2 else np.zeros(Y.shape[1])
+        return self
+
+    def predict(self, horizon=1):
+        steps = self.n_obs + np.arange(horizon, dtype=float)
+        return self.intercept + self.slope * steps[:, None]
+
+    def interval_scale(self, horizon=1):
+        # OLS prediction interval: uncertainty grows the further we are from the data
+        steps = self.n_obs + np.arange(horizon, dtype=float)
+        if self.var_t == 0:
+            return np.ones(horizon)
+        return np.sqrt(1 + 1 / self.n_obs + (steps - self.t_mean) ** 2 / self.var_t)
+
+
+# ====================== Holt-Winters (additive) ======================
+class HoltWintersModel:
+    name = "holt_winters"
+
+    def __init__(self, alpha=0.5, beta=0.1, gamma=0.1, season_length=SEASON_LENGTH):
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.season_length = season_length
+
+    def fit(self, Y):
+        Y = np.asarray(Y, dtype=float)
+        n, k = Y.shape
+        m = self.season_length
+
+        # need two full seasons to estimate seasonality, otherwise Holt's linear
+        self.seasonal = n >= 2 * m
+
+        if self.seasonal:
+            first = Y[:m].mean(axis=0)
+            second = Y[m:2 * m].mean(axis=0)
+            level = first
+            trend = (second - first) / m
+            season = Y[:m] - first
+            start = m
+        else:
+            level = Y[0].copy()
+            trend = Y[1] - Y[0] if n >= 2 else np.zeros(k)
+            season = np.zeros((m, k))
+            start = 1
+
+        # smooth through the history - one vector update per month
+        errors = []
+        for t in range(start, n):
+            s = t % m
+            # one-step-ahead error before we update with this month
+            errors.append(Y[t] - (level + trend + season[s]))
+            prev_level = level
+            level = self.alpha * (Y[t] - season[s]) + (1 - self.alpha) * (level + trend)
+            trend = self.beta * (level - prev_level) + (1 - self.beta) * trend
+            if self.seasonal:
+                season[s] = self.gamma * (Y[t] - level) + (1 - self.gamma) * season[s]
+
+        self.level = level
+        self.trend = trend
+        self.season = season
+        self.n_obs = n
+        self.sigma = np.sqrt((np.asarray(errors) ** 2).mean(axis=0)) if errors else np.zeros(k)
+        return self
+
+    def predict(self, horizon=1):
+        steps = np.arange(1, horizon + 1)
+        season_idx = (self.n_obs + steps - 1) % self.season_length
+        return self.level + steps[:, None] * self.trend + self.season[season_idx]
+
+    def interval_scale(self, horizon=1):
+        # additive Holt-Winters variance: 1 + sum_j (alpha*(1 + j*beta) + gamma*[j % m == 0])^2
+        j = np.arange(1, horizon)
+        c = self.alpha * (1 + j * self.beta)
+        if self.seasonal:
+            c = c + self.gamma * (j % self.season_length == 0)
+        return np.sqrt(1 + np.concatenate([[0.0], np.cumsum(c ** 2)]))
+
+
+# ====================== Seasonal naive ======================
+class SeasonalNaiveModel:
+    name = "seasonal_naive"
+
+    def __init__(self, season_length=SEASON_LENGTH):
+        self.season_length = season_length
+
+    def fit(self, Y):
+        Y = np.asarray(Y, dtype=float)
+        # less than a season of data -> plain naive (repeat last month)
+        self.period = self.season_length if Y.shape[0] >= self.season_length else 1
+        self.last_season = Y[-self.period:]
+        self.n_obs = Y.shape[0]
+
+        # spread of the "same month last season" errors on the history
+        diffs = Y[self.period:] - Y[:-self.period]
+        self.sigma = np.sqrt((diffs ** 2).mean(axis=0)) if len(diffs) else np.zeros(Y.shape[1])
+        return self
+
+    def predict(self, horizon=1):
+        steps = np.arange(horizon)
+        return self.last_season[steps % self.period]
+
+    def interval_scale(self, horizon=1):
+        # every full season we reach further back adds another error term
+        steps = np.arange(horizon)
+        return np.sqrt(steps // self.period + 1)
+
+
+# Registry used by the API ?model= parameter
+FORECAST_MODELS = {
+    LinearTrendModel.name: LinearTrendModel,
+    HoltWintersModel.name: HoltWintersModel,
+    SeasonalNaiveModel.name: SeasonalNaiveModel,
+}
+
+DEFAULT_MODEL = LinearTrendModel.name
+
+
+def get_model(name):
+    """Build a forecasting backend by name (raises ValueError for unknown names)."""
+    if name not in FORECAST_MODELS:
+        raise ValueError(
+            f"Unknown model '{name}'. Choose one of: {', '.join(FORECAST_MODELS)}"
+        )
+    return FORECAST_MODELS[name]()
+
+
+def fit_predict(name, Y, horizon=1):
+    """Fit one backend on Y and forecast, timing both steps in milliseconds."""
+    model = get_model(name)
+
+    start = time.perf_counter()
+    model.fit(Y)
+    fit_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    forecast = model.predict(horizon)
+    predict_ms = (time.perf_counter() - start) * 1000
+
+    return model, forecast, {"fit_ms": round(fit_ms, 3), "predict_ms": round(predict_ms, 3)}
+
+
+def forecast_with_intervals(name, Y, horizon=1, level=0.95):
+    """
+    Fit once and return point forecasts plus lower/upper prediction bounds
+    for every step 1..horizon. Each array has shape (horizon, n_series).
+    Counts can't go negative, so point and lower bound are clipped at 0.
+    """
+    model, point, timings = fit_predict(name, Y, horizon=horizon)
+
+    z = NormalDist().inv_cdf((1 + level) / 2)
+    half_width = z * model.interval_scale(horizon)[:, None] * model.sigma
+
+    lower = np.maximum(point - half_width, 0.0)
+    upper = np.maximum(point + half_width, 0.0)
+    point = np.maximum(point, 0.0)
+
+    return point, lower, upper, timings
+
+
+# ====================== Shared evaluation harness ======================
+def backtest(name, Y, min_train=2):
+    """
+    Rolling-origin backtest: fit on months [0, t) and score the forecast for
+    month t, for every t from min_train to the end. All chakras are scored
+    together, so the cost is one fit per origin, not one per chakra.
+
+    Returns per-series MSE (NaN when there is not enough history) and the
+    total fit/predict time spent.
+    """
+    Y = np.asarray(Y, dtype=float)
+    n, k = Y.shape
+
+    errors = []
+    fit_ms = 0.0
+    predict_ms = 0.0
+
+    for origin in range(min_train, n):
+        _, forecast, timing = fit_predict(name, Y[:origin], horizon=1)
+        errors.append(Y[origin] - forecast[0])
+        fit_ms += timing["fit_ms"]
+        predict_ms += timing["predict_ms"]
+
+    if errors:
+        mse = (np.asarray(errors) ** 2).mean(axis=0)
+    else:
+        mse = np.full(k, np.nan)
+
+    return {
+        "mse": mse,
+        "n_origins": len(errors),
+        "fit_ms": round(fit_ms, 3),
+        "predict_ms": round(predict_ms, 3),
+    }
+
+
+def evaluate_models(Y, names=None, min_train=2):
+    """Backtest every backend (or the given names) on the same history."""
+    names = names or list(FORECAST_MODELS)
+    report = {}
+
+    for name in names:
+        result = backtest(name, Y, min_train=min_train)
+        mse = result["mse"]
+        report[name] = {
+            "mse_mean": None if np.isnan(mse).all() else round(float(np.nanmean(mse)), 4),
+            "mse": [None if np.isnan(v) else round(float(v), 4) for v in mse],
+            "n_origins": result["n_origins"],
+            "fit_ms": result["fit_ms"],
+            "predict_ms": result["predict_ms"],
+        }
+
+    return report
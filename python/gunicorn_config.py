@@ -3,8 +3,14 @@ Gunicorn Configuration for Production ML API Deployment on Render
 """
 
 import os
+import sys
 import multiprocessing
 
+# warmup.py and native_threads.py live next to the conversion API
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ml_model'))
+
+from native_threads import configure_worker, native_thread_limit, set_thread_env
+
 # Server socket
 # Render sets PORT environment variable, default to 5000 for local testing
 ml_port = os.environ.get('ML_PORT', '5000')
@@ -16,6 +22,11 @@ workers = 2
 worker_class = "sync"  # Synchronous workers work well for ML predictions
 threads = 2  # 2 threads per worker
 
+# Native thread pools (BLAS / OpenMP) used by the forecasting backends: size
+# them before the app is preloaded, post_fork applies the final per-worker
+# limit (ML_NATIVE_THREADS, ml_model/native_threads.py)
+set_thread_env(native_thread_limit(workers, threads))
+
 # Timeouts
 timeout = 120  # 2 minutes - ML predictions can take time
 keepalive = 5  # Keep-alive connections for 5 seconds
@@ -68,6 +79,7 @@ def on_starting(server):
     print("="*60)
     print(f"Workers: {workers}")
     print(f"Threads per worker: {threads}")
+    print(f"Native threads per worker: {native_thread_limit(server.cfg.workers, server.cfg.threads)}")
     print(f"Binding to: {bind}")
     print(f"Timeout: {timeout}s")
     print(f"Preload app: {preload_app}")
@@ -82,7 +94,12 @@ def on_reload(server):
 def when_ready(server):
     """
     Called just after the server is started
+    With preload_app the app is already imported in the master, so importing
+    the hot-path modules here means every forked worker inherits them
     """
+    from warmup import warm_up
+    report = warm_up(predictor=None)
+    print(f"Warm-up (master): imports {report['import_ms']}ms, hot paths {report['touch_ms']}ms")
     print("Server is ready. Accepting connections.")
 
 def pre_fork(server, worker):
@@ -94,8 +111,15 @@ def pre_fork(server, worker):
 def post_fork(server, worker):
     """
     Called just after a worker has been forked
-    """
-    print(f"Worker spawned (pid: {worker.pid})")
+    Limit the native thread pools, then run the hot paths once so the first
+    real request isn't the cold one
+    """
+    from warmup import warm_up
+    threading_report = configure_worker(None, server.cfg.workers, server.cfg.threads)
+    print(f"Worker {worker.pid} native threads: {threading_report['native_threads']} "
+          f"{threading_report['pools']}")
+    report = warm_up(predictor=None)
+    print(f"Worker spawned (pid: {worker.pid}) - warm-up {report['touch_ms']}ms")
 
 def pre_exec(server):
     """
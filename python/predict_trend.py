@@ -1,143 +1,151 @@
-def get_prediction():
-    import os, json, warnings 
-    from pymongo import MongoClient
-    import pandas as pd
-    from dotenv import load_dotenv
-    from sklearn.linear_model import LinearRegression
-    import numpy as np
-    from sklearn.model_selection import train_test_split
-    from sklearn.model_selection import KFold
-    from sklearn.metrics import mean_squared_error
-
-    warnings.filterwarnings("ignore")
-
-    # 1) connect to Mongo using root .env
-    load_dotenv(dotenv_path="../.env")
-    MONGO_URI = os.getenv("MONGO_URI")
-    if not MONGO_URI:
-        raise RuntimeError("MONGO_URI missing. Put it in .env")
-
-    client = MongoClient(MONGO_URI)
-
-    db = client.get_database()
-    collection = db["chakraassessments"]
-
-    # 2) fetch minimal fields
-    docs = list(collection.find(
-        {},
-        {"createdAt": 1, "focusChakra": 1, "results": 1}
-    ))
-
-    if not docs:
-        print(json.dumps({"ok": True, "message": "No data yet", "forecast_counts": {}, "predicted_next_month": None}))
-        raise SystemExit
-
-    df = pd.DataFrame(docs)
-    df["createdAt"] = pd.to_datetime(df["createdAt"], errors="coerce")
-    df = df.dropna(subset=["createdAt"])
-
-    # 3) ensure we have a 'closed' chakra per row
-    # prefer provided focusChakra; fallback: choose min-total from results.*
-    def infer_focus(row):
-        if isinstance(row.get("focusChakra"), str) and len(row["focusChakra"]) > 0:
-            return row["focusChakra"]
-
-        res = row.get("results") or {}
-        # results structure: { rootChakra: {total, average}, ... }
-        # build a {chakraLabel: totalScore} dict; lower total => more closed
-        totals = {}
-        mapping = {
-            "Root Chakra": "rootChakra",
-            "Sacral Chakra": "sacralChakra",
-            "Solar Plexus Chakra": "solarPlexusChakra",
-            "Heart Chakra": "heartChakra",
-            "Throat Chakra": "throatChakra",
-            "Third Eye Chakra": "thirdEyeChakra",
-            "Crown Chakra": "crownChakra",
-        }
-        for label, key in mapping.items():
-            part = res.get(key) or {}
-            t = part.get("total")
-            if t is not None:
-                try:
-                    totals[label] = float(t)
-                except Exception:
-                    pass
-        if totals:
-            # closed = minimum total
-            return min(totals, key=totals.get)
+import os
+import sys
+import threading
+import time
+
+# Shared helpers (Mongo pool, ...) live next to the conversion API in ml_model/
+ML_MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "ml_model")
+if ML_MODEL_DIR not in sys.path:
+    sys.path.append(ML_MODEL_DIR)
+
+from mongo_pool import get_database
+from metrics import time_stage
+from forecast_models import DEFAULT_MODEL, forecast_with_intervals, evaluate_models
+from trend_cube import TrendCube
+
+# ---------------- Forecast cache ----------------
+# The dashboard asks for the same forecast on every view and the history only
+# changes when new assessments arrive, so keep finished results for a while.
+# Keyed by (model, horizon, level); entries expire after TREND_CACHE_TTL seconds.
+CACHE_TTL_SECONDS = float(os.environ.get("TREND_CACHE_TTL", "300"))
+_forecast_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _cache_get(key):
+    with _cache_lock:
+        entry = _forecast_cache.get(key)
+        if entry and time.monotonic() - entry[0] < CACHE_TTL_SECONDS:
+            return entry[1]
+        _forecast_cache.pop(key, None)
         return None
 
-    df["closedChakra"] = df.apply(infer_focus, axis=1)
-    df = df.dropna(subset=["closedChakra"])
 
-    # 4) group by month
-    df["month"] = df["createdAt"].dt.to_period("M")
-    trend = (
-        df.groupby(["month", "closedChakra"])
-        .size()
-        .reset_index(name="count")
-    )
+def _cache_put(key, value):
+    with _cache_lock:
+        _forecast_cache[key] = (time.monotonic(), value)
+
+
+def clear_forecast_cache():
+    with _cache_lock:
+        _forecast_cache.clear()
+
+
+def _cube_database():
+    # looked up on every refresh so get_database can be swapped (benchmarks)
+    return get_database()
+
+
+# month x chakra x segment counts, kept up to date incrementally (trend_cube.py)
+TREND_CUBE = TrendCube(_cube_database)
+
+
+def load_trend_history(filters=None):
+    """
+    Steps 1-5: bring the count cube up to date with Mongo (only the new
+    assessments are read) and sum it into the month x chakra table, for the
+    assessments matching filters ({field: [values]}) when given.
+    Returns (pivot, message) - pivot is None when there is nothing to
+    forecast yet.
+    """
+    with time_stage("trend_cube_refresh"):
+        TREND_CUBE.refresh(metrics_stage=time_stage)
+
+    pivot = TREND_CUBE.pivot(filters=filters)
+    if pivot is None:
+        return None, "No data for this segment" if filters and TREND_CUBE.documents else "No data yet"
+    return pivot, None
+
+
+def _cache_key(model, horizon, level, segment_by, filters):
+    return (model, horizon, level, tuple(segment_by),
+            tuple(sorted((field, tuple(sorted(values))) for field, values in (filters or {}).items())))
+
+
+def _future_months(last_month, horizon):
+    # month labels for each forecast step after the last month of history
+    import pandas as pd
+    return pd.date_range(last_month, periods=horizon + 1, freq="MS")[1:]
+
+
+def _forecast_slice(chakras, months, point, lower, upper, mse):
+    # response fields for one (horizon, n_chakras) forecast
+    forecast = {chakra: round(float(point[0, i]), 2) for i, chakra in enumerate(chakras)}
+    forecast_horizon = [
+        {
+            "month": month.strftime("%Y-%m"),
+            "counts": {chakra: round(float(point[step, i]), 2) for i, chakra in enumerate(chakras)},
+            "lower": {chakra: round(float(lower[step, i]), 2) for i, chakra in enumerate(chakras)},
+            "upper": {chakra: round(float(upper[step, i]), 2) for i, chakra in enumerate(chakras)},
+        }
+        for step, month in enumerate(months)
+    ]
+    return {
+        "forecast_counts": forecast,
+        # pick the predicted dominant (highest forecast count)
+        "predicted_next_month": max(forecast, key=forecast.get) if forecast else None,
+        "forecast_horizon": forecast_horizon,
+        "mse": dict(zip(chakras, mse)),
+    }
 
-    if trend.empty:
-        print(json.dumps({"ok": True, "message": "Insufficient data after grouping", "forecast_counts": {}, "predicted_next_month": None}))
-        raise SystemExit
-
-    # 5) pivot to get a time series per chakra
-    pivot = trend.pivot(index="month", columns="closedChakra", values="count").fillna(0)
-    pivot.index = pivot.index.to_timestamp()  # PeriodIndex -> TimestampIndex
-
-    # 6) tiny forecast: linear trend per chakra -> next month index = len(series)
-    forecast = {}
-    mse_results = {}
-
-    for chakra in pivot.columns:
-        y = pivot[chakra].values
-        if len(y) < 2:
-            # not enough history; predict the last value
-            forecast[chakra] = float(y[-1]) if len(y) == 1 else 0.0
-            mse_results[chakra] = None
-            continue
-
-        X = np.arange(len(y)).reshape(-1, 1)
-
-        # --- a) Train/Test Split ---
-        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, shuffle=False)
-        base_model = LinearRegression().fit(X_train, y_train)
-        y_pred = base_model.predict(X_test)
-        base_mse = mean_squared_error(y_test, y_pred)
-
-        # --- b) KFold Cross Validation ---
-        avg_mse = None
-        
-        if len(y) >= 5:
-            kf = KFold(n_splits=5)
-            scores = []
-            for train_idx, test_idx in kf.split(X):
-                model = LinearRegression().fit(X[train_idx], y[train_idx])
-                y_pred = model.predict(X[test_idx])
-                mse = mean_squared_error(y[test_idx], y_pred)
-                scores.append(mse)
-            avg_mse = np.mean(scores)
-            mse_results[chakra] = round(avg_mse, 4)
-        else:
-            mse_results[chakra] = None
-
-
-        # --- c) Final model trained on all data ---
-        final_model = LinearRegression().fit(X, y)
-        next_val = final_model.predict([[len(y)]])[0]
-        forecast[chakra] = round(float(max(next_val, 0.0)), 2)
-
-    # 7) pick the predicted dominant (highest forecast count)
-    predicted = max(forecast, key=forecast.get) if forecast else None
+
+def get_prediction(model=DEFAULT_MODEL, horizon=1, level=0.95, segment_by=(), filters=None):
+    """
+    Forecast closed-chakra counts. filters ({field: [values]}, fields from
+    trend_cube.SEGMENT_FIELDS) restricts the history to matching assessments;
+    segment_by (a list of those fields) returns one forecast per segment
+    instead - see get_segmented_prediction.
+    """
+    import json
+
+    if segment_by:
+        return get_segmented_prediction(model, horizon, level, segment_by, filters)
+
+    cache_key = _cache_key(model, horizon, level, (), filters)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    pivot, message = load_trend_history(filters)
+    if pivot is None:
+        out = {"ok": True, "message": message, "model": model, "forecast_counts": {}, "predicted_next_month": None}
+        print(json.dumps(out))
+        return out
+
+    # 6) forecast every chakra for every month of the horizon in one pass
+    #    with the chosen backend, and backtest it so the response carries its accuracy
+    with time_stage("trend_fit"):
+        point, lower, upper, timings = forecast_with_intervals(model, pivot.values, horizon=horizon, level=level)
+    with time_stage("trend_backtest"):
+        evaluation = evaluate_models(pivot.values, names=[model])[model]
+
+    # 7) labelled forecast, intervals and dominant chakra
+    chakras = list(pivot.columns)
+    forecast = _forecast_slice(chakras, _future_months(pivot.index[-1], horizon),
+                               point, lower, upper, evaluation["mse"])
 
     # 8) respond as JSON for Express
     out = {
         "ok": True,
         "message": "Forecast computed",
-        "forecast_counts": forecast,
-        "predicted_next_month": predicted,
+        "model": model,
+        "forecast_counts": forecast["forecast_counts"],
+        "predicted_next_month": forecast["predicted_next_month"],
+        "horizon": horizon,
+        "interval_level": level,
+        "forecast_horizon": forecast["forecast_horizon"],
+        "mse": forecast["mse"],
+        "timings": timings,
         # for debugging/display
         "history_last_rows": (
             pivot.tail(6)
@@ -147,6 +155,97 @@ def get_prediction():
             .to_dict(orient="records")
         )
     }
+    if filters:
+        out["filters"] = {field: sorted(values) for field, values in filters.items()}
     print(json.dumps(out, default=str))
 
-    return out
\ No newline at end of file
+    _cache_put(cache_key, out)
+    return out
+
+
+def get_segmented_prediction(model=DEFAULT_MODEL, horizon=1, level=0.95, segment_by=("archetype",), filters=None):
+    """
+    One forecast per segment (e.g. segment_by=["archetype", "healthcareWorker"]
+    -> one per archetype x Yes/No seen in the data), optionally within filters.
+    Every slice of every chakra is a column of one history matrix, so the
+    backend is fitted and backtested once for all of them.
+    """
+    import pandas as pd
+
+    segment_by = list(segment_by)
+    cache_key = _cache_key(model, horizon, level, segment_by, filters)
+    cached = _cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    with time_stage("trend_cube_refresh"):
+        TREND_CUBE.refresh(metrics_stage=time_stage)
+    months, chakras, Y, segments = TREND_CUBE.slices(segment_by, filters)
+
+    out = {
+        "ok": True,
+        "model": model,
+        "horizon": horizon,
+        "interval_level": level,
+        "segment_by": segment_by,
+        "filters": {field: sorted(values) for field, values in (filters or {}).items()},
+    }
+    if not segments:
+        out.update(message="No data for this segment" if TREND_CUBE.documents else "No data yet", segments=[])
+        return out
+
+    # (n_months, n_segments, n_chakras) -> one column per segment x chakra
+    n_months, n_segments, n_chakras = Y.shape
+    history = Y.reshape(n_months, n_segments * n_chakras)
+    with time_stage("trend_fit"):
+        point, lower, upper, timings = forecast_with_intervals(model, history, horizon=horizon, level=level)
+    with time_stage("trend_backtest"):
+        mse = evaluate_models(history, names=[model])[model]["mse"]
+
+    future = _future_months(pd.Timestamp(year=months[-1][0], month=months[-1][1], day=1), horizon)
+    slices = []
+    for s, segment in enumerate(segments):
+        columns = slice(s * n_chakras, (s + 1) * n_chakras)
+        slices.append({
+            "segment": dict(zip(segment_by, segment)),
+            "history_total": int(Y[:, s, :].sum()),
+            "last_month_counts": {chakra: int(Y[-1, s, i]) for i, chakra in enumerate(chakras)},
+            **_forecast_slice(chakras, future, point[:, columns], lower[:, columns], upper[:, columns],
+                              mse[columns]),
+        })
+
+    out.update(
+        message="Forecast computed",
+        months=n_months,
+        last_month=f"{months[-1][0]:04d}-{months[-1][1]:02d}",
+        segments=slices,
+        timings=timings,
+    )
+    _cache_put(cache_key, out)
+    return out
+
+
+def compare_models():
+    """Backtest every forecasting backend on the current history."""
+    pivot, message = load_trend_history()
+    if pivot is None:
+        return {"ok": True, "message": message, "models": {}}
+
+    report = evaluate_models(pivot.values)
+    for name, result in report.items():
+        # label per-chakra errors so they're readable on the dashboard
+        result["mse"] = dict(zip(pivot.columns, result["mse"]))
+
+    # most accurate first so the caller can walk down until the latency budget fits
+    ranking = sorted(
+        report,
+        key=lambda name: float("inf") if report[name]["mse_mean"] is None else report[name]["mse_mean"],
+    )
+
+    return {
+        "ok": True,
+        "message": "Models compared",
+        "months": len(pivot),
+        "ranking": ranking,
+        "models": report,
+    }
@@ -0,0 +1,236 @@
+"""
+Month x closed chakra x segment count cube for the trend service.
+
+Every forecast used to pull the whole chakraassessments collection and
+rebuild the month x chakra table with pandas. The cube keeps those counts
+in memory at the finest grain we serve
+
+    (month, closed chakra, archetype, ageBracket, healthcareWorker) -> count
+
+and only reads what is new since the last refresh: documents with
+createdAt >= the newest createdAt already counted (the _ids seen at exactly
+that instant are skipped, so nothing is counted twice). Any breakdown the
+API asks for is a sum over this table, never a second trip to Mongo.
+
+Documents edited or deleted after they were counted, or inserted with an
+older createdAt, are only picked up by a full rebuild, which happens every
+TREND_CUBE_REBUILD seconds (and on reset()).
+
+Segment slices are returned stacked as one (n_months, n_slices * n_chakras)
+matrix, so the forecast_models backends fit and backtest every slice of
+every chakra in a single vectorized pass.
+"""
+
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+
+# Seconds between full rebuilds (picks up edits / deletes / late inserts)
+REBUILD_SECONDS = float(os.environ.get("TREND_CUBE_REBUILD", "3600"))
+
+# ?segment_by= / filter parameter -> assessment field, in cube key order
+SEGMENT_FIELDS = ("archetype", "ageBracket", "healthcareWorker")
+# value used when a document doesn't have the field
+UNKNOWN_SEGMENT = "unknown"
+# incremental reads start here when nothing dated has been counted yet
+# (keeps string createdAt values, counted by the full read, out of them)
+EPOCH = datetime(1970, 1, 1)
+
+# results.* key for every chakra label we report
+CHAKRA_RESULT_KEYS = {
+    "Root Chakra": "rootChakra",
+    "Sacral Chakra": "sacralChakra",
+    "Solar Plexus Chakra": "solarPlexusChakra",
+    "Heart Chakra": "heartChakra",
+    "Throat Chakra": "throatChakra",
+    "Third Eye Chakra": "thirdEyeChakra",
+    "Crown Chakra": "crownChakra",
+}
+
+CUBE_PROJECTION = {"createdAt": 1, "focusChakra": 1, "results": 1,
+                   **{field: 1 for field in SEGMENT_FIELDS}}
+
+
+def closed_chakra(doc):
+    # prefer provided focusChakra; fallback: choose min-total from results.*
+    focus = doc.get("focusChakra")
+    if isinstance(focus, str) and len(focus) > 0:
+        return focus
+
+    res = doc.get("results") or {}
+    # results structure: { rootChakra: {total, average}, ... }
+    # lower total => more closed
+    totals = {}
+    for label, key in CHAKRA_RESULT_KEYS.items():
+        part = res.get(key) or {}
+        t = part.get("total")
+        if t is not None:
+            try:
+                totals[label] = float(t)
+            except Exception:
+                pass
+    if totals:
+        return min(totals, key=totals.get)
+    return None
+
+
+def _created_at(value):
+    # datetime from Mongo; strings from old imports go through pandas like before
+    if isinstance(value, datetime):
+        return value
+    if value is None:
+        return None
+    import pandas as pd
+    parsed = pd.to_datetime(value, errors="coerce")
+    return None if pd.isna(parsed) else parsed.to_pydatetime()
+
+
+def _segment_value(doc, field):
+    value = doc.get(field)
+    if value is None or value == "":
+        return UNKNOWN_SEGMENT
+    return str(value)
+
+
+class TrendCube:
+    def __init__(self, get_db, collection="chakraassessments"):
+        # get_db is called on every refresh (the pool / test stand-in may change)
+        self.get_db = get_db
+        self.collection = collection
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # drop everything - the next refresh reads the whole collection
+        with self._lock:
+            self.counts = Counter()
+            self.documents = 0
+            self.watermark = None
+            self._ids_at_watermark = set()
+            self._built_at = None
+
+    # ======================== Updates ========================
+    def add(self, doc):
+        # count one assessment; returns False when it can't be placed
+        created = _created_at(doc.get("createdAt"))
+        chakra = closed_chakra(doc) if created is not None else None
+        if chakra is None:
+            return False
+        key = ((created.year, created.month), chakra) + tuple(_segment_value(doc, f) for f in SEGMENT_FIELDS)
+        self.counts[key] += 1
+        self.documents += 1
+        return True
+
+    def refresh(self, metrics_stage=None):
+        """
+        Bring the cube up to date with Mongo. Returns the number of new
+        documents counted. metrics_stage(name) is an optional context manager
+        factory (metrics.time_stage) for the Mongo read.
+        """
+        with self._lock:
+            full = self._built_at is None or time.monotonic() - self._built_at > REBUILD_SECONDS
+            if full:
+                self.counts = Counter()
+                self.documents = 0
+                self.watermark = None
+                self._ids_at_watermark = set()
+
+            query = {} if full else {"createdAt": {"$gte": self.watermark or EPOCH}}
+            collection = self.get_db()[self.collection]
+            if metrics_stage is not None:
+                with metrics_stage("mongo_fetch"):
+                    docs = list(collection.find(query, CUBE_PROJECTION))
+            else:
+                docs = list(collection.find(query, CUBE_PROJECTION))
+
+            added = 0
+            for doc in docs:
+                if doc.get("_id") in self._ids_at_watermark:
+                    continue
+                if self.add(doc):
+                    added += 1
+                created = doc.get("createdAt")
+                if not isinstance(created, datetime):
+                    # only real dates take part in the $gte watermark
+                    continue
+                if self.watermark is None or created > self.watermark:
+                    self.watermark = created
+                    self._ids_at_watermark = {doc.get("_id")}
+                elif created == self.watermark:
+                    self._ids_at_watermark.add(doc.get("_id"))
+
+            if full:
+                self._built_at = time.monotonic()
+            return added
+
+    # ======================== Queries ========================
+    def _snapshot(self):
+        with self._lock:
+            return list(self.counts.items())
+
+    def months(self, items=None):
+        # every month with at least one assessment, oldest first
+        items = self._snapshot() if items is None else items
+        return sorted({key[0] for key, _ in items})
+
+    def pivot(self, filters=None):
+        """
+        Month x chakra table (pandas DataFrame of counts, month start
+        Timestamps as index) for the documents matching filters - without
+        filters the same table load_trend_history used to build from the raw
+        documents. None when nothing matches.
+        """
+        import pandas as pd
+
+        months, chakras, Y, segments = self.slices(filters=filters)
+        if not segments:
+            return None
+        index = pd.DatetimeIndex([pd.Timestamp(year=y, month=m, day=1) for y, m in months])
+        return pd.DataFrame(Y[:, 0, :], index=index, columns=pd.Index(chakras, name="closedChakra"))
+
+    def slices(self, segment_by=(), filters=None):
+        """
+        Counts broken down by the segment_by fields, keeping only documents
+        that match filters ({field: value or [values]}).
+
+        Returns (months, chakras, Y, segments) with Y of shape
+        (n_months, n_segments, n_chakras) and segments a list of value tuples
+        in segment_by order. Months are the cube's months (shared by every
+        slice, zero where a slice had nothing).
+        """
+        items = self._snapshot()
+        filters = {field: {v} if isinstance(v, str) else set(v) for field, v in (filters or {}).items()}
+        positions = [SEGMENT_FIELDS.index(field) for field in segment_by]
+        checks = [(SEGMENT_FIELDS.index(field), allowed) for field, allowed in filters.items()]
+
+        months = self.months(items)
+        chakras = sorted({key[1] for key, _ in items})
+        month_index = {month: i for i, month in enumerate(months)}
+        chakra_index = {chakra: i for i, chakra in enumerate(chakras)}
+
+        # one pass: pick the matching cells and their segment
+        cells = []
+        for key, count in items:
+            segment_values = key[2:]
+            if any(segment_values[pos] not in allowed for pos, allowed in checks):
+                continue
+            cells.append((month_index[key[0]], chakra_index[key[1]],
+                          tuple(segment_values[pos] for pos in positions), count))
+
+        segments = sorted({cell[2] for cell in cells})
+        segment_index = {segment: i for i, segment in enumerate(segments)}
+        Y = np.zeros((len(months), len(segments), len(chakras)), dtype=np.int64)
+        for month, chakra, segment, count in cells:
+            Y[month, segment_index[segment], chakra] += count
+        return months, chakras, Y, segments
+
+    def status(self):
+        return {
+            "documents": self.documents,
+            "cells": len(self.counts),
+            "watermark": self.watermark.isoformat() if self.watermark is not None else None,
+        }
@@ -1,34 +1,42 @@
 const express = require("express");
 const router = express.Router();
 const axios = require("axios");
+// reuses the last forecast while the service answers 304 (same ETag)
+const { getWithETag } = require("../services/mlApiCache");
 
 // point to your Flask service (env var OR default)
 const ML_API_URL2 =
   process.env.ML_API_URL2 || "http://127.0.0.1:5000/api/predict_trend";
-const ML_HEALTH_URL =
-  process.env.ML_HEALTH_URL || "http://127.0.0.1:5000/health";
+
+// segment filters the trend service understands (?archetype=martyr&healthcareWorker=Yes)
+const TREND_SEGMENT_FIELDS = ["archetype", "ageBracket", "healthcareWorker"];
+
+function trendSegmentParams(query) {
+  const params = {};
+  for (const field of TREND_SEGMENT_FIELDS) {
+    if (typeof query[field] === "string" && query[field]) {
+      params[field] = query[field];
+    }
+  }
+  return params;
+}
+
+// no response at all (down, refused, timed out) or 503 from the service
+function mlServiceUnavailable(err) {
+  return !err.response || err.response.status === 503;
+}
 
 router.get("/adminportal/predict-chakra", async (req, res) => {
   try {
-    // optional: quick health check so we can surface a nice error
-    try {
-      const health = await axios.get(ML_HEALTH_URL, { timeout: 2000 });
-      if (health.data?.status !== "ok") {
-        throw new Error("Flask ML API not ready");
-      }
-    } catch (e) {
-      return res.render("chakra-forecast", {
-        errorMessage: "ML service unavailable (health check failed).",
-        predicted: null,
-        counts: null,
-        layout: false,
-      });
-    }
+    // no health check round trip first - the service monitors itself
+    // (/readyz) and a failed call below tells us everything we need
 
-    // fetch forecast JSON from Flask
-    const { data } = await axios.get(ML_API_URL2, {
+    // fetch forecast JSON from Flask (conditional GET, gzip accepted)
+    // (optionally narrowed to one segment of the assessments)
+    const data = await getWithETag(ML_API_URL2, {
+      params: trendSegmentParams(req.query),
       timeout: 10000,
-      headers: { Accept: "application/json" },
+      headers: { Accept: "application/json", "Accept-Encoding": "gzip" },
     });
 
     return res.render("chakra-forecast", {
@@ -40,7 +48,9 @@ router.get("/adminportal/predict-chakra", async (req, res) => {
   } catch (err) {
     console.error("Error fetching ML forecast:", err.message);
     return res.render("chakra-forecast", {
-      errorMessage: "Prediction failed.",
+      errorMessage: mlServiceUnavailable(err)
+        ? "ML service unavailable."
+        : "Prediction failed.",
       predicted: null,
       counts: null,
       layout: false,
@@ -0,0 +1,69 @@
+// services/mlApiCache.js
+// Conditional GET for the Flask ML services.
+// /api/predict_trend and /model/info send an ETag; we remember the last
+// body per URL and send If-None-Match next time. While nothing changed the
+// service answers 304 with an empty body and we reuse what we have.
+//
+// The key includes the query params (e.g. trend segment filters taken from
+// the admin's query string), so the cache is bounded: at most
+// ML_ETAG_CACHE_MAX entries (least recently used dropped first), each kept
+// for ML_ETAG_CACHE_TTL_MS at most.
+const axios = require("axios");
+
+const MAX_ENTRIES = parseInt(process.env.ML_ETAG_CACHE_MAX || "100", 10);
+const TTL_MS = parseInt(process.env.ML_ETAG_CACHE_TTL_MS || String(10 * 60 * 1000), 10);
+
+// url (with query string) -> { etag, data, storedAt }
+// Map keeps insertion order: first key = least recently used
+const cache = new Map();
+
+function lookup(key) {
+  const entry = cache.get(key);
+  if (!entry) {
+    return null;
+  }
+  cache.delete(key);
+  if (Date.now() - entry.storedAt > TTL_MS) {
+    return null;
+  }
+  // re-insert as most recently used
+  cache.set(key, entry);
+  return entry;
+}
+
+function remember(key, etag, data) {
+  cache.delete(key);
+  cache.set(key, { etag, data, storedAt: Date.now() });
+  while (cache.size > MAX_ENTRIES) {
+    cache.delete(cache.keys().next().value);
+  }
+}
+
+async function getWithETag(url, options = {}) {
+  const key = url + JSON.stringify(options.params || {});
+  const cached = lookup(key);
+
+  const response = await axios.get(url, {
+    ...options,
+    headers: {
+      ...(options.headers || {}),
+      ...(cached ? { "If-None-Match": cached.etag } : {}),
+    },
+    // 304 is a normal answer here, not an error
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+  });
+
+  if (response.status === 304 && cached) {
+    // still current - counts as fresh again
+    remember(key, cached.etag, cached.data);
+    return cached.data;
+  }
+
+  const etag = response.headers.etag;
+  if (etag) {
+    remember(key, etag, response.data);
+  }
+  return response.data;
+}
+
+module.exports = { getWithETag };
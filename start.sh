@@ -2,8 +2,13 @@
 set -e
 
 # starts gunicorn
+# ML_SINGLE_SERVICE=1 serves the conversion AND trend routes from one process
 cd /app/ml_model
-gunicorn -c gunicorn_config.py ml_api:app &
+if [ "$ML_SINGLE_SERVICE" = "1" ]; then
+  gunicorn -c gunicorn_config.py combined_api:app &
+else
+  gunicorn -c gunicorn_config.py ml_api:app &
+fi
 
 # start node in main app
 cd /app